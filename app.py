@@ -2,17 +2,30 @@ import logging
 import os
 from functools import wraps
 
-from flask import Flask, session, request, redirect, render_template, jsonify
+from flask import Flask, Response, session, request, redirect, render_template, jsonify
 import spotipy
 from werkzeug.exceptions import abort
 import git
 import hmac
 import hashlib
 import json
+from typing import Optional
 
 from recommendation_engine import playlist
+from recommendation_engine.mood_pools import MoodCandidatePools
+from recommendation_engine.top_artists_cache import TopArtistsCache
 from recommendation_engine.mood_track_finder import MoodTrackFinder
 from search.autocomplete import search_tracks
+from search.autocomplete_cache import AutocompleteCache
+from search.local_index import LocalTrackSearchIndex
+from spotify_service.batching import InFlightRequests, SpotifyBatchLoader
+from spotify_service.cache import CachingSpotify, SpotifyResponseCache
+from spotify_service.client_factory import SpotifyClientFactory
+from spotify_service.scheduler import BATCH, INTERACTIVE, LANE_NAMES, ScheduledSpotify, SpotifyScheduler
+from spotify_service.track_store import TrackStore
+from utils.jobs import JobQueue, JobStore
+from utils.request_log import RequestLog
+from utils.tracing import configure_trace_logging, tracer
 from utils.validators import validate_new_playlist_request
 
 # Top level entry point for wave-guide flask application
@@ -28,6 +41,8 @@ def create_app():
     # .env file loaded in wsgi.py
     # NOTE: THIS IS CASE SENSITIVE
     # THE USER MUST INPUT THEIR EMAIL THE SAME AS IT LOOKS ON SPOTIFY DEVELOPER DASHBOARD
+    # every spotify client in the worker shares one keep-alive connection pool
+    spotify_clients = SpotifyClientFactory(api_url=os.getenv("SPOTIFY_API_URL"))
     auth_manager = spotipy.oauth2.SpotifyOAuth(
         cache_handler=cache_handler,
         client_id=os.getenv('SPOTIPY_CLIENT_ID'),
@@ -35,12 +50,61 @@ def create_app():
         redirect_uri=os.getenv('SPOTIPY_REDIRECT_URI'),
         scope=scopes,
         open_browser=False,
+        requests_session=spotify_clients.session,
     )
-    spotify = spotipy.Spotify(auth_manager=auth_manager, requests_timeout=45, retries=0)
+    client_credentials_manager = spotipy.oauth2.SpotifyClientCredentials(
+        client_id=os.getenv('SPOTIPY_CLIENT_ID'),
+        client_secret=os.getenv('SPOTIPY_CLIENT_SECRET'),
+        requests_session=spotify_clients.session,
+    )
+    # stand-in for accounts.spotify.com, used with SPOTIFY_API_URL by the load test harness
+    accounts_url = os.getenv("SPOTIFY_ACCOUNTS_URL")
+    if accounts_url:
+        for manager in (auth_manager, client_credentials_manager):
+            manager.OAUTH_TOKEN_URL = accounts_url.rstrip("/") + "/api/token"
     app.cache_handler = cache_handler
     app.auth_manager = auth_manager
-    app.spotify = spotify
-    app.config["SECRET_KEY"] = os.urandom(64)
+    app.spotify_clients = spotify_clients
+    # rate limits every spotify call made by the worker, to its share of the app's limits.
+    # gunicorn reads its default worker count from WEB_CONCURRENCY too
+    app.spotify_scheduler = SpotifyScheduler(workers=int(os.getenv("WEB_CONCURRENCY", "1")))
+    # shared by every request in this worker
+    app.spotify_cache = SpotifyResponseCache()
+    # shared by every worker on the host
+    app.track_store = TrackStore(os.getenv("TRACK_STORE_PATH", "./.track_store.sqlite3"))
+    app.spotify_in_flight = InFlightRequests()
+    # autocomplete results are the same for every user
+    app.autocomplete_cache = AutocompleteCache()
+    # offline AcousticBrainz search, replaces spotify search when configured
+    local_search_index_dir = os.getenv("LOCAL_SEARCH_INDEX_DIR")
+    app.local_search_index = LocalTrackSearchIndex.load(local_search_index_dir) if local_search_index_dir else None
+    if app.local_search_index is not None and not app.local_search_index.has_spotify_ids:
+        # suggestions are sent back as seed ids and playlists are built with spotify ids, musicbrainz ids can't seed one
+        app.logger.warning("%s has no spotify ids, autocomplete stays on spotify search", local_search_index_dir)
+        app.local_search_index = None
+    # mood candidates are the same for every user, refreshed with an app token off the request path.
+    # the refresh starts with the first mood request in each worker, importing the app makes no spotify calls
+    app.mood_pools = MoodCandidatePools(
+        ScheduledSpotify(
+            spotify_clients.client(auth_manager=client_credentials_manager),
+            app.spotify_scheduler,
+            BATCH,
+        ),
+        start_on_first_use=True,
+    )
+    # top artists per user, shared by every MoodTrackFinder in the worker
+    app.top_artists_cache = TopArtistsCache()
+    # playlist builds that run after the request that started them has returned.
+    # a build runs on the worker that queued it, the store lets polls and event streams land on any worker
+    app.playlist_jobs = JobQueue(store=JobStore(os.getenv("JOB_STORE_PATH", "./.playlist_jobs.sqlite3")))
+    # spans and spotify call metrics, served on /metrics and logged per playlist build
+    tracer.enabled = os.getenv("TRACING_ENABLED", "1") == "1"
+    configure_trace_logging()
+    # recorded traffic for benchmarks.replay
+    request_log_path = os.getenv("REQUEST_LOG_PATH")
+    app.request_log = RequestLog(request_log_path) if request_log_path else None
+    # gunicorn workers only share sessions when the key is configured, otherwise each worker signs its own
+    app.config["SECRET_KEY"] = os.getenv("FLASK_SECRET_KEY") or os.urandom(64)
     app.config["SESSION_TYPE"] = "filesystem"
     app.config["SESSION_FILE_DIR"] = "./.flask_session/"
 
@@ -57,11 +121,33 @@ app = create_app()
 # ===========================================
 
 
+@app.before_request
+def record_request():
+    # recorded on arrival so a replay reproduces the original timing
+    if app.request_log is not None:
+        app.request_log.record(request.method, request.path, request.args.to_dict(), request.get_json(silent=True))
+
 def validate_token():
     if not app.auth_manager.validate_token(app.cache_handler.get_cached_token()):
         return False
     return True
 
+def get_user_spotify(lane: int = BATCH, access_token: Optional[str] = None) -> ScheduledSpotify:
+    """uncached client for the signed in user, the auth manager reads the token from the flask session.
+    Calls are rate limited by the worker's scheduler in the given lane.
+    Pass access_token for clients used after the request ends, when the session is no longer available."""
+    if access_token is None:
+        sp = app.spotify_clients.client(auth_manager=app.auth_manager)
+    else:
+        sp = app.spotify_clients.client(auth=access_token)
+    return ScheduledSpotify(sp, app.spotify_scheduler, lane, user_key=session.get("user_id"))
+
+def get_spotify(lane: int = BATCH, access_token: Optional[str] = None):
+    """spotify client for the current request, backed by the worker's shared response cache
+    and the host's persistent track store. Call once per request, track lookups are batched per client."""
+    sp = CachingSpotify(get_user_spotify(lane, access_token), app.spotify_cache, user_key=session.get("user_id"), store=app.track_store)
+    return SpotifyBatchLoader(sp, app.spotify_in_flight)
+
 def login_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
@@ -83,13 +169,12 @@ def index():
         return render_template("login.html", auth_url=auth_url)
 
     # Step 3. Signed in, display data
-    app.spotify = spotipy.Spotify(auth_manager=app.auth_manager)
     user_name = session.get('user_name')
 
-    if not user_name:
+    if not user_name or not session.get('user_id'):
         app.logger.debug("calling spotify.me()")
         try:
-            user_name = app.spotify.me()["display_name"]
+            me = get_user_spotify(INTERACTIVE).me()
         except spotipy.exceptions.SpotifyException as e:
             if e.http_status == 403:
                 app.logger.info("User not in beta access group")
@@ -97,7 +182,9 @@ def index():
             # Re-raise any other Spotify exceptions
             raise
 
+        user_name = me["display_name"]
         session['user_name'] = user_name
+        session['user_id'] = me["id"]
         app.logger.info(f"user {user_name} logged in")
 
     return render_template("index.html", user_name=user_name)
@@ -106,6 +193,7 @@ def index():
 @app.route("/log_out")
 def log_out():
     session.pop("token_info", None)
+    session.pop("user_id", None)
     return redirect("/")
 
 
@@ -120,7 +208,10 @@ def autocomplete():
         return jsonify({"message": "Include a query parameter"}), 400
     query = request.json["query"]
     limit = 4
-    suggestions = search_tracks(app.spotify, query, limit)
+    if app.local_search_index is not None:
+        suggestions = app.local_search_index.search(query, limit)
+    else:
+        suggestions = search_tracks(get_spotify(INTERACTIVE), query, limit, cache=app.autocomplete_cache)
     if not suggestions:
         return jsonify({"message": "No suggestions found"}), 404
     return jsonify(suggestions)
@@ -130,9 +221,127 @@ def autocomplete():
 @login_required
 def new_playlist():
     validate_new_playlist_request(request.json)
-    resp = playlist.create_playlist(request, app.spotify, session)
+    resp = playlist.create_playlist(
+        request.json,
+        get_spotify(),
+        session,
+        mood_pools=app.mood_pools,
+        top_artists_cache=app.top_artists_cache,
+    )
     return jsonify(resp)
 
+
+@app.route("/playlist_cover/<playlist_id>", methods=["GET"])
+@login_required
+def get_playlist_cover(playlist_id):
+    """the modal asks for the cover after the playlist is written, spotify generates it asynchronously"""
+    return jsonify({"image": playlist.playlist_cover(get_user_spotify(INTERACTIVE), playlist_id)})
+
+
+# stats() keys that count lookups, and the result label each is reported under
+CACHE_LOOKUP_RESULTS = {"hits": "hit", "exact_hits": "exact_hit", "prefix_hits": "prefix_hit", "stale_hits": "stale_hit", "misses": "miss"}
+
+
+def _cache_metric_lines(caches):
+    """caches are (prometheus labels, stats()) pairs"""
+    lookups = ["# TYPE waveguide_cache_lookups_total counter"]
+    entries = ["# TYPE waveguide_cache_entries gauge"]
+    hit_ratios = ["# TYPE waveguide_cache_hit_ratio gauge"]
+    for labels, stats in caches:
+        for key, result in CACHE_LOOKUP_RESULTS.items():
+            if key in stats:
+                lookups.append(f'waveguide_cache_lookups_total{{{labels},result="{result}"}} {stats[key]}')
+        entries.append(f"waveguide_cache_entries{{{labels}}} {stats['entries']}")
+        hit_ratios.append(f"waveguide_cache_hit_ratio{{{labels}}} {stats['hit_ratio']:.4f}")
+    return lookups + entries + hit_ratios
+
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    """prometheus scrape endpoint for span, spotify call, pool and cache metrics of this worker"""
+    lines = [tracer.prometheus().rstrip("\n")]
+    scheduler_stats = app.spotify_scheduler.stats()
+    lines.append("# TYPE waveguide_spotify_scheduler_shed_total counter")
+    for lane, shed in scheduler_stats["shed"].items():
+        lines.append(f'waveguide_spotify_scheduler_shed_total{{lane="{LANE_NAMES[lane]}"}} {shed}')
+    lines.append("# TYPE waveguide_spotify_rate_limited_total counter")
+    lines.append(f"waveguide_spotify_rate_limited_total {scheduler_stats['rate_limited']}")
+    pool_stats = app.spotify_clients.stats()
+    lines.append("# TYPE waveguide_spotify_requests_in_flight gauge")
+    lines.append(f"waveguide_spotify_requests_in_flight {pool_stats['in_flight']}")
+    lines.append("# TYPE waveguide_spotify_pool_idle_connections gauge")
+    for host, host_stats in pool_stats["pools"].items():
+        lines.append(f'waveguide_spotify_pool_idle_connections{{host="{host}"}} {host_stats["idle"]}')
+    caches = [(f'cache="spotify",endpoint="{endpoint}"', stats) for endpoint, stats in sorted(app.spotify_cache.stats().items())]
+    caches.append(('cache="autocomplete"', app.autocomplete_cache.stats()))
+    caches.append(('cache="top_artists"', app.top_artists_cache.stats()))
+    lines.extend(_cache_metric_lines(caches))
+    return Response("\n".join(lines) + "\n", mimetype="text/plain; version=0.0.4")
+
+# how long an events stream waits for the next event before sending a keep-alive comment
+JOB_EVENTS_KEEPALIVE_SECONDS = 15
+
+
+@app.route("/playlist_jobs", methods=["POST"])
+@login_required
+def new_playlist_job():
+    """queues a /new_playlist/ build and returns its job id right away"""
+    validate_new_playlist_request(request.json)
+    payload = request.json
+    user_key = session.get("user_id")
+    # the build outlives the request, so it uses a snapshot of the access token instead of the session
+    token_info = app.auth_manager.validate_token(app.cache_handler.get_cached_token())
+    sp = get_spotify(access_token=token_info["access_token"])
+
+    def build(progress):
+        return playlist.create_playlist(
+            payload,
+            sp,
+            mood_pools=app.mood_pools,
+            top_artists_cache=app.top_artists_cache,
+            user_key=user_key,
+            progress=progress,
+        )
+
+    job = app.playlist_jobs.submit(build, owner=user_key)
+    return jsonify({"id": job.id, "status": job.status}), 202
+
+
+def _get_owned_job(job_id: str):
+    job = app.playlist_jobs.get(job_id)
+    if job is None or job.owner != session.get("user_id"):
+        abort(404)
+    return job
+
+
+@app.route("/playlist_jobs/<job_id>", methods=["GET"])
+@login_required
+def get_playlist_job(job_id):
+    return jsonify(_get_owned_job(job_id).to_dict())
+
+
+@app.route("/playlist_jobs/<job_id>/events", methods=["GET"])
+@login_required
+def playlist_job_events(job_id):
+    """server-sent events, one per build stage. The stream ends after the succeeded or failed event."""
+    job = _get_owned_job(job_id)
+    # event ids are positions in job.events so a reconnecting EventSource resumes where it left off
+    last_event_id = request.headers.get("Last-Event-ID", "")
+    since = int(last_event_id) + 1 if last_event_id.isdigit() else 0
+
+    def stream(since):
+        while True:
+            events, finished = app.playlist_jobs.wait_for_events(job, since, JOB_EVENTS_KEEPALIVE_SECONDS)
+            for event in events:
+                yield f"id: {since}\ndata: {json.dumps(event)}\n\n"
+                since += 1
+            if finished:
+                return
+            if not events:
+                yield ": keep-alive\n\n"
+
+    return Response(stream(since), mimetype="text/event-stream", headers={"Cache-Control": "no-cache"})
+
 # utility to update pythonanywhere code with latest main branch ===
 # =================================================================
 # https://medium.com/@aadibajpai/deploying-to-pythonanywhere-via-github-6f967956e664
@@ -207,7 +416,15 @@ def get_tracks():
     mood = request.args.get('mood')
     if not mood:
         abort(400, "Include a mood query paramater. Example: /tracks?mood=calm")
-    track_finder = MoodTrackFinder(app.spotify, mood, 3)
+    sp = get_spotify()
+    track_finder = MoodTrackFinder(
+        sp,
+        mood,
+        3,
+        pools=app.mood_pools,
+        top_artists_cache=app.top_artists_cache,
+        user_key=session.get("user_id"),
+    )
     recs = track_finder.find()
     wg_resp = {}
     track_ids = []
@@ -220,7 +437,7 @@ def get_tracks():
         wg_resp[track["id"]] = simplified_track
         track_ids.append(track["id"])
     print("getting track features")
-    track_features = app.spotify.audio_features(track_ids)
+    track_features = sp.audio_features(track_ids)
     print("got features")
     for features in track_features:
         wg_resp[features["id"]]["features"] = {
@@ -0,0 +1,74 @@
+"""
+recall@k and queries per second of IVFTrackIndex against the ExactTrackIndex baseline
+for a sweep of nprobe values, to pick an operating point.
+
+Uses synthetic clustered vectors shaped like the AcousticBrainz high level features
+(11 probabilities in [0, 1]) unless a directory of ingest_json files is given.
+
+usage: python -m benchmarks.bench_ann --num-tracks 200000 --k 10
+"""
+import argparse
+import time
+
+import numpy as np
+
+from recommendation_engine.ann_index import IVFTrackIndex
+from recommendation_engine.vector_index import COSINE, FEATURE_NAMES, ExactTrackIndex, track_vectors
+
+
+def synthetic_vectors(num_tracks: int, num_clusters: int = 64, seed: int = 0) -> np.ndarray:
+    """probability vectors grouped around random centers, like genres in the real catalog"""
+    rng = np.random.default_rng(seed)
+    centers = rng.random((num_clusters, len(FEATURE_NAMES)), dtype=np.float32)
+    assignments = rng.integers(0, num_clusters, size=num_tracks)
+    noise = rng.normal(0, 0.08, size=(num_tracks, len(FEATURE_NAMES))).astype(np.float32)
+    return np.clip(centers[assignments] + noise, 0, 1)
+
+
+def recall_at_k(approximate: np.ndarray, exact: np.ndarray) -> float:
+    hits = [len(set(a[a >= 0]) & set(e[e >= 0])) / max(1, (e >= 0).sum()) for a, e in zip(approximate, exact)]
+    return float(np.mean(hits))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--num-tracks", type=int, default=200_000)
+    parser.add_argument("--num-queries", type=int, default=500)
+    parser.add_argument("--num-lists", type=int, default=None)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--metric", default=COSINE)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument("--ingest-dir", help="directory of AcousticBrainz json files to use instead of synthetic data")
+    args = parser.parse_args()
+
+    if args.ingest_dir:
+        from scripts.get_acoustic_brainz_data import ingest_json
+
+        vectors = track_vectors(ingest_json(args.ingest_dir))
+    else:
+        vectors = synthetic_vectors(args.num_tracks)
+    rng = np.random.default_rng(1)
+    queries = np.clip(vectors[rng.choice(len(vectors), size=args.num_queries)] + 0.02, 0, 1)
+
+    exact = ExactTrackIndex(vectors, metric=args.metric)
+    start = time.perf_counter()
+    exact_indices, _ = exact.search(queries, k=args.k)
+    exact_seconds = time.perf_counter() - start
+    print(f"{len(vectors)} tracks, exact: {args.num_queries / exact_seconds:9.0f} qps (batched)")
+
+    start = time.perf_counter()
+    index = IVFTrackIndex.build(vectors, num_lists=args.num_lists, metric=args.metric)
+    print(f"built {len(index.centroids)} lists in {time.perf_counter() - start:.1f}s")
+
+    for nprobe in args.nprobe:
+        start = time.perf_counter()
+        indices, _ = index.search(queries, k=args.k, nprobe=nprobe)
+        seconds = time.perf_counter() - start
+        print(
+            f"nprobe {nprobe:4d}: recall@{args.k} {recall_at_k(indices, exact_indices):.3f}  "
+            f"{args.num_queries / seconds:9.0f} qps"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+files per second of the streaming AcousticBrainz ingester for different worker counts.
+
+Builds a synthetic .tar.zst dump of high level documents unless real archives are given.
+
+usage: python -m benchmarks.bench_ingest --num-files 20000 --workers 1 4 8
+"""
+import argparse
+import io
+import json
+import random
+import tarfile
+import tempfile
+import time
+from pathlib import Path
+
+import zstandard
+
+from scripts.get_acoustic_brainz_data import ProgressReporter, stream_archives
+
+HIGHLEVEL_MODELS = {
+    "danceability": ["danceable", "not_danceable"],
+    "mood_aggressive": ["aggressive", "not_aggressive"],
+    "mood_electronic": ["electronic", "not_electronic"],
+    "mood_acoustic": ["acoustic", "not_acoustic"],
+    "mood_happy": ["happy", "not_happy"],
+    "mood_party": ["party", "not_party"],
+    "mood_relaxed": ["relaxed", "not_relaxed"],
+    "mood_sad": ["sad", "not_sad"],
+    "timbre": ["bright", "dark"],
+    "tonal_atonal": ["atonal", "tonal"],
+    "voice_instrumental": ["instrumental", "voice"],
+}
+
+
+def synthetic_document(i: int, rng: random.Random) -> dict:
+    highlevel = {}
+    for model, labels in HIGHLEVEL_MODELS.items():
+        probability = rng.random()
+        highlevel[model] = {
+            "all": {labels[0]: probability, labels[1]: 1 - probability},
+            "probability": max(probability, 1 - probability),
+            "value": labels[0] if probability > 0.5 else labels[1],
+        }
+    return {
+        "metadata": {
+            "tags": {
+                "musicbrainz_recordingid": [f"{i:08d}-0000-0000-0000-000000000000"],
+                "title": [f"Track {i}"],
+                "artist": [f"Artist {i % 997}"],
+                "album": [f"Album {i % 4999}"],
+            },
+            # real documents carry a lot more metadata than we extract
+            "audio_properties": {"length": rng.random() * 300, "codec": "mp3", "bit_rate": 320000},
+        },
+        "highlevel": highlevel,
+    }
+
+
+def write_synthetic_archive(path: Path, num_files: int) -> str:
+    rng = random.Random(0)
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w") as tar:
+        for i in range(num_files):
+            raw = json.dumps(synthetic_document(i, rng)).encode()
+            info = tarfile.TarInfo(f"highlevel/{i % 256:02x}/{i}-0.json")
+            info.size = len(raw)
+            tar.addfile(info, io.BytesIO(raw))
+    path.write_bytes(zstandard.ZstdCompressor().compress(buffer.getvalue()))
+    return str(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--num-files", type=int, default=20_000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--batch-size", type=int, default=10_000)
+    parser.add_argument("archives", nargs="*", help="real .tar.zst dumps to use instead of synthetic data")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        archives = args.archives or [write_synthetic_archive(Path(tmp_dir) / "synthetic.tar.zst", args.num_files)]
+        for workers in args.workers:
+            progress = ProgressReporter(interval_seconds=float("inf"))
+            start = time.perf_counter()
+            for _ in stream_archives(archives, batch_size=args.batch_size, workers=workers, progress=progress):
+                pass
+            seconds = time.perf_counter() - start
+            print(f"workers {workers:3d}: {progress.files} files in {seconds:.1f}s, {progress.files / seconds:9.0f} files/s")
+
+
+if __name__ == "__main__":
+    main()
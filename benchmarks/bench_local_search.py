@@ -0,0 +1,76 @@
+"""
+latency of top-4 prefix queries against LocalTrackSearchIndex on a synthetic catalog,
+plus build, save and load times.
+
+usage: python -m benchmarks.bench_local_search --num-tracks 1000000
+"""
+import argparse
+import itertools
+import random
+import string
+import tempfile
+import time
+
+import numpy as np
+
+from search.local_index import LocalTrackSearchIndex
+
+
+def random_word(rng: random.Random) -> str:
+    return "".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(3, 9)))
+
+
+def synthetic_tracks(num_tracks: int, vocabulary_size: int = 50_000, seed: int = 0):
+    rng = random.Random(seed)
+    words = [random_word(rng) for _ in range(vocabulary_size)]
+    # zipf-ish word frequencies like real titles
+    cum_weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(vocabulary_size)))
+    artists = [" ".join(rng.choices(words, k=rng.randint(1, 2))) for _ in range(num_tracks // 10 + 1)]
+    return [
+        {
+            "musicbrainz_recordingid": f"{i:036d}",
+            "title": " ".join(rng.choices(words, cum_weights=cum_weights, k=rng.randint(1, 4))),
+            "artist": rng.choice(artists),
+        }
+        for i in range(num_tracks)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--num-tracks", type=int, default=200_000)
+    parser.add_argument("--num-queries", type=int, default=2000)
+    args = parser.parse_args()
+
+    tracks = synthetic_tracks(args.num_tracks)
+    popularity = np.random.default_rng(0).pareto(1.5, size=len(tracks))
+    start = time.perf_counter()
+    index = LocalTrackSearchIndex.build(tracks, popularity)
+    print(f"built {len(index)} records, {len(index.vocabulary)} words in {time.perf_counter() - start:.1f}s")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        index.save(tmp_dir)
+        start = time.perf_counter()
+        index = LocalTrackSearchIndex.load(tmp_dir)
+        print(f"loaded in {(time.perf_counter() - start) * 1000:.0f}ms")
+
+        rng = random.Random(1)
+        queries = []
+        for track in rng.sample(tracks, args.num_queries):
+            words = f"{track['title']} {track['artist']}".split()
+            typed = " ".join(words[:rng.randint(1, len(words))])
+            queries.append(typed[:rng.randint(1, len(typed))])
+        timings = []
+        for query in queries:
+            start = time.perf_counter()
+            index.search(query, limit=4)
+            timings.append(time.perf_counter() - start)
+        timings = np.array(timings) * 1000
+        print(
+            f"top-4 prefix queries: p50 {np.percentile(timings, 50):.3f}ms  "
+            f"p95 {np.percentile(timings, 95):.3f}ms  p99 {np.percentile(timings, 99):.3f}ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
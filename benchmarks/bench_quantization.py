@@ -0,0 +1,87 @@
+"""
+memory, recall@k and queries per second of QuantizedTrackIndex against the float32 ExactTrackIndex baseline.
+
+scalar (one byte per feature) and product quantization (one byte per subspace) are measured
+with and without the exact re-rank. re-rank vectors are read from a float32 memmap on disk, like
+a TrackCatalog, so resident memory is the codes only. memory is projected to --target-tracks
+(10M by default) from the measured bytes per track and checked against --budget-mb.
+
+usage: python -m benchmarks.bench_quantization --num-tracks 1000000 --k 10 --subspaces 4 6 11
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.bench_ann import recall_at_k, synthetic_vectors
+from recommendation_engine.quantized_index import PRODUCT, SCALAR, QuantizedTrackIndex
+from recommendation_engine.vector_index import COSINE, ExactTrackIndex
+
+# distance matrix entries computed per exact search call
+EXACT_BATCH_ENTRIES = 50_000_000
+
+
+def exact_neighbours(vectors: np.ndarray, queries: np.ndarray, k: int, metric: str) -> np.ndarray:
+    exact = ExactTrackIndex(vectors, metric=metric)
+    batch = max(1, EXACT_BATCH_ENTRIES // len(vectors))
+    return np.vstack([exact.search(queries[start:start + batch], k=k)[0] for start in range(0, len(queries), batch)])
+
+
+def measure(name: str, index: QuantizedTrackIndex, queries: np.ndarray, exact_indices: np.ndarray, args):
+    start = time.perf_counter()
+    indices, _ = index.search(queries, k=args.k)
+    seconds = time.perf_counter() - start
+    bytes_per_track = index.nbytes / len(index)
+    projected_mb = index.nbytes * args.target_tracks / len(index) / 2**20
+    verdict = "ok" if projected_mb <= args.budget_mb else "over budget"
+    print(
+        f"{name:>22}: {bytes_per_track:5.1f} B/track  {projected_mb:7.1f}MB at {args.target_tracks:,} ({verdict})  "
+        f"recall@{args.k} {recall_at_k(indices, exact_indices):.3f}  {len(queries) / seconds:7.1f} qps"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--num-tracks", type=int, default=1_000_000)
+    parser.add_argument("--num-queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--metric", default=COSINE)
+    parser.add_argument("--subspaces", type=int, nargs="+", default=[4, 6])
+    parser.add_argument("--target-tracks", type=int, default=10_000_000)
+    parser.add_argument("--budget-mb", type=float, default=150)
+    args = parser.parse_args()
+
+    vectors = synthetic_vectors(args.num_tracks)
+    rng = np.random.default_rng(1)
+    queries = np.clip(vectors[rng.choice(len(vectors), size=args.num_queries)] + 0.02, 0, 1)
+
+    start = time.perf_counter()
+    exact_indices = exact_neighbours(vectors, queries, args.k, args.metric)
+    exact_seconds = time.perf_counter() - start
+    float_mb = vectors.nbytes * args.target_tracks / len(vectors) / 2**20
+    print(
+        f"{len(vectors)} tracks, {'float32 exact':>22}: {vectors.itemsize * vectors.shape[1]:5.1f} B/track  "
+        f"{float_mb:7.1f}MB at {args.target_tracks:,}  {args.num_queries / exact_seconds:7.1f} qps"
+    )
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "vectors.npy")
+        np.save(path, vectors)
+        on_disk = np.load(path, mmap_mode="r")
+
+        configurations = [(SCALAR, {})] + [
+            (f"{PRODUCT} m={subspaces}", {"quantizer": PRODUCT, "num_subspaces": subspaces}) for subspaces in args.subspaces
+        ]
+        for label, build_kwargs in configurations:
+            start = time.perf_counter()
+            index = QuantizedTrackIndex.build(on_disk, metric=args.metric, **build_kwargs)
+            print(f"built {label} in {time.perf_counter() - start:.1f}s")
+            measure(f"{label} re-ranked", index, queries, exact_indices, args)
+            index.rerank_vectors = None
+            measure(f"{label} codes only", index, queries, exact_indices, args)
+
+
+if __name__ == "__main__":
+    main()
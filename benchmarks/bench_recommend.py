@@ -0,0 +1,63 @@
+"""
+Latency benchmark for BookendSeedsTrackFinder.recommend()
+compares sequential and concurrent (dependency wave) execution
+against a stubbed spotify client with artificial network delay.
+
+usage: python -m benchmarks.bench_recommend --delay-ms 150 --runs 20
+"""
+import argparse
+import time
+from statistics import median
+from typing import Any, Dict, List
+
+from recommendation_engine.bookend_seeds_track_finder import BookendSeedsTrackFinder
+
+
+class DelayedSpotify:
+    """Stands in for spotipy.Spotify, sleeping on every call to simulate a round trip"""
+
+    def __init__(self, delay_seconds: float):
+        self.delay_seconds = delay_seconds
+
+    def audio_features(self, track_ids: List[str]) -> List[Dict[str, float]]:
+        time.sleep(self.delay_seconds)
+        return [{"energy": 0.5, "danceability": 0.5, "valence": 0.5} for _ in track_ids]
+
+    def recommendations(self, limit: int, seed_tracks: List[str], country: str, **kwargs) -> Dict[str, Any]:
+        time.sleep(self.delay_seconds)
+        seed = "-".join(seed_tracks)
+        return {
+            "tracks": [
+                {"id": f"{seed}-{i}", "name": f"{seed} {i}", "artists": [{"id": f"{seed}-artist-{i}"}]}
+                for i in range(limit)
+            ]
+        }
+
+
+def time_recommend(sp: DelayedSpotify, concurrent: bool, runs: int) -> List[float]:
+    seed_track = {"id": "seed", "name": "Seed", "artists": [{"id": "seed_artist"}]}
+    destination_track = {"id": "dest", "name": "Dest", "artists": [{"id": "dest_artist"}]}
+    timings = []
+    for _ in range(runs):
+        finder = BookendSeedsTrackFinder(sp, seed_track, destination_track, concurrent=concurrent)
+        start = time.perf_counter()
+        finder.recommend()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--delay-ms", type=float, default=150, help="artificial latency per spotify call")
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+
+    sp = DelayedSpotify(args.delay_ms / 1000)
+    for label, concurrent in [("sequential", False), ("concurrent", True)]:
+        timings = sorted(time_recommend(sp, concurrent, args.runs))
+        p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+        print(f"{label:>10}: p50 {median(timings) * 1000:7.1f}ms  p95 {p95 * 1000:7.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
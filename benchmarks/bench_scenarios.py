@@ -0,0 +1,197 @@
+"""
+end to end scenario benchmarks against FakeSpotify, no network or credentials needed.
+
+each run builds a cold client stack (scheduler, response cache and batch loader, as in app.get_spotify)
+over the shared fake, runs one scenario and records its latency and spotify calls by endpoint.
+reports p50/p95/p99 and calls per request, and compares against a saved baseline:
+a p95 more than --tolerance slower, more spotify calls per request or a higher share of failed runs
+is a regression (exit code 1), and so is a scenario where every run failed.
+
+usage:
+    python -m benchmarks.bench_scenarios --profile fast --runs 30
+    python -m benchmarks.bench_scenarios --profile fast --save-baseline benchmarks/baselines/scenarios_fast.json
+    python -m benchmarks.bench_scenarios --profile fast --baseline benchmarks/baselines/scenarios_fast.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import random
+import sys
+import time
+from collections import Counter
+from typing import Any, Callable, Dict, List
+
+from benchmarks.fake_spotify import PROFILES, FakeSpotify, SyntheticCatalog
+from recommendation_engine import playlist
+from recommendation_engine.bookend_seeds_track_finder import BookendSeedsTrackFinder
+from recommendation_engine.mood_track_finder import SUPPORTED_MOODS, MoodTrackFinder
+from search.autocomplete import search_tracks
+from search.autocomplete_cache import AutocompleteCache
+from spotify_service.batching import InFlightRequests, SpotifyBatchLoader
+from spotify_service.cache import CachingSpotify, SpotifyResponseCache
+from spotify_service.scheduler import BATCH, INTERACTIVE, ScheduledSpotify, SpotifyScheduler
+
+USER = "bench_user"
+
+
+def client_stack(fake: FakeSpotify, scheduler: SpotifyScheduler, lane: int = BATCH):
+    sp = ScheduledSpotify(fake, scheduler, lane, user_key=USER)
+    return SpotifyBatchLoader(CachingSpotify(sp, SpotifyResponseCache(), user_key=USER), InFlightRequests())
+
+
+def song_to_song(fake, scheduler, rng):
+    seed, destination = rng.sample(fake.catalog.tracks, 2)
+    payload = {
+        "source_mode": playlist.SONG_MODE,
+        "seed_track_id": seed["id"],
+        "destination_mode": playlist.SONG_MODE,
+        "destination_track_id": destination["id"],
+    }
+    playlist.create_playlist(payload, client_stack(fake, scheduler), user_key=USER)
+
+
+def mood_to_song(fake, scheduler, rng):
+    payload = {
+        "source_mode": playlist.MOOD_MODE,
+        "source_mood": rng.choice(SUPPORTED_MOODS),
+        "destination_mode": playlist.SONG_MODE,
+        "destination_track_id": rng.choice(fake.catalog.tracks)["id"],
+    }
+    playlist.create_playlist(payload, client_stack(fake, scheduler), user_key=USER)
+
+
+def mood_to_mood(fake, scheduler, rng):
+    source_mood, destination_mood = rng.sample(SUPPORTED_MOODS, 2)
+    payload = {
+        "source_mode": playlist.MOOD_MODE,
+        "source_mood": source_mood,
+        "destination_mode": playlist.MOOD_MODE,
+        "destination_mood": destination_mood,
+    }
+    playlist.create_playlist(payload, client_stack(fake, scheduler), user_key=USER)
+
+
+def recommend(fake, scheduler, rng):
+    seed, destination = rng.sample(fake.catalog.tracks, 2)
+    BookendSeedsTrackFinder(client_stack(fake, scheduler), seed, destination).recommend()
+
+
+def mood_find(fake, scheduler, rng):
+    MoodTrackFinder(client_stack(fake, scheduler), rng.choice(SUPPORTED_MOODS), 3).find()
+
+
+def autocomplete_burst(fake, scheduler, rng):
+    """one user typing a track name, one search per keystroke"""
+    query = rng.choice(fake.catalog.tracks)["name"].lower()
+    sp = client_stack(fake, scheduler, INTERACTIVE)
+    cache = AutocompleteCache()
+    for end in range(1, len(query) + 1):
+        search_tracks(sp, query[:end], 4, cache=cache)
+
+
+SCENARIOS: Dict[str, Callable[[FakeSpotify, SpotifyScheduler, random.Random], None]] = {
+    "song_to_song": song_to_song,
+    "mood_to_song": mood_to_song,
+    "mood_to_mood": mood_to_mood,
+    "recommend": recommend,
+    "mood_find": mood_find,
+    "autocomplete_burst": autocomplete_burst,
+}
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+def run_scenario(name: str, fake: FakeSpotify, runs: int, seed: int) -> Dict[str, Any]:
+    # only retries 429s, the fake's latency is what's being measured
+    scheduler = SpotifyScheduler(app_rate=1e9, app_burst=1e9, user_rate=1e9, user_burst=1e9, max_wait_seconds={INTERACTIVE: 60, BATCH: 60})
+    rng = random.Random(seed)
+    # MoodTrackFinder samples seed artists with the random module
+    random.seed(seed)
+    fake.reset_calls()
+    timings = []
+    failures = 0
+    for _ in range(runs):
+        start = time.perf_counter()
+        try:
+            # the finders print their progress, keep the report readable
+            with contextlib.redirect_stdout(io.StringIO()):
+                SCENARIOS[name](fake, scheduler, rng)
+        except Exception:
+            failures += 1
+            continue
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    calls = Counter(fake.calls)
+    return {
+        "runs": runs,
+        "failures": failures,
+        "p50_ms": round(percentile(timings, 0.5) * 1000, 2) if timings else None,
+        "p95_ms": round(percentile(timings, 0.95) * 1000, 2) if timings else None,
+        "p99_ms": round(percentile(timings, 0.99) * 1000, 2) if timings else None,
+        "calls_per_request": round(sum(calls.values()) / runs, 2),
+        "calls_by_endpoint": {endpoint: round(count / runs, 2) for endpoint, count in sorted(calls.items())},
+    }
+
+
+def regressions(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Dict[str, Any]], tolerance: float) -> List[str]:
+    found = []
+    for name, result in results.items():
+        expected = baseline.get(name)
+        if expected is None:
+            continue
+        # compared as rates, a run can use a different --runs than the baseline
+        if result["failures"] / result["runs"] > expected["failures"] / expected["runs"]:
+            found.append(f"{name}: {result['failures']} of {result['runs']} runs failed vs baseline {expected['failures']} of {expected['runs']}")
+        if result["p95_ms"] is None:
+            found.append(f"{name}: every run failed")
+            continue
+        if expected["p95_ms"] is not None and result["p95_ms"] > expected["p95_ms"] * (1 + tolerance):
+            found.append(f"{name}: p95 {result['p95_ms']}ms vs baseline {expected['p95_ms']}ms")
+        if result["calls_per_request"] > expected["calls_per_request"]:
+            found.append(
+                f"{name}: {result['calls_per_request']} spotify calls per request vs baseline {expected['calls_per_request']}"
+            )
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="fast")
+    parser.add_argument("--scenarios", nargs="+", choices=sorted(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument("--runs", type=int, default=30)
+    parser.add_argument("--num-tracks", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--baseline", help="json file of a previous run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed p95 slowdown against the baseline")
+    parser.add_argument("--save-baseline", help="write this run's results to a json file")
+    args = parser.parse_args()
+
+    fake = FakeSpotify(SyntheticCatalog(num_tracks=args.num_tracks, seed=args.seed), PROFILES[args.profile], seed=args.seed)
+    results = {}
+    print(f"{'scenario':>20} {'p50':>9} {'p95':>9} {'p99':>9} {'calls/req':>10} {'failed':>7}")
+    for name in args.scenarios:
+        result = run_scenario(name, fake, args.runs, args.seed)
+        results[name] = result
+        p50, p95, p99 = (f"{result[key]:.1f}ms" if result[key] is not None else "-" for key in ("p50_ms", "p95_ms", "p99_ms"))
+        print(f"{name:>20} {p50:>9} {p95:>9} {p99:>9} {result['calls_per_request']:>10} {result['failures']:>7}")
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump({"profile": args.profile, "runs": args.runs, "scenarios": results}, f, indent=2, sort_keys=True)
+            f.write("\n")
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        found = regressions(results, baseline["scenarios"], args.tolerance)
+        for regression in found:
+            print(f"REGRESSION {regression}")
+        if found:
+            sys.exit(1)
+        print(f"no regressions against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""
+load test comparing gunicorn sync and gevent workers on a spotify-bound endpoint.
+
+each request makes one blocking `requests` call (the same io path spotipy takes) to a local
+upstream that sleeps --upstream-ms, standing in for api.spotify.com.
+sync workers hold one upstream call per process, gevent workers hold up to --worker-connections.
+
+usage: python -m benchmarks.bench_workers --clients 200 --requests 1000 --upstream-ms 300
+"""
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from statistics import median
+from typing import List
+
+import requests
+
+UPSTREAM_URL_ENV = "BENCH_UPSTREAM_URL"
+
+_session = None
+
+
+def app(environ, start_response):
+    """wsgi app served by gunicorn, proxies every request to the slow upstream"""
+    global _session
+    if _session is None:
+        _session = requests.Session()
+    body = _session.get(os.environ[UPSTREAM_URL_ENV], timeout=45).content
+    start_response("200 OK", [("Content-Type", "application/json"), ("Content-Length", str(len(body)))])
+    return [body]
+
+
+class SlowUpstreamHandler(BaseHTTPRequestHandler):
+    delay_seconds = 0.3
+
+    def do_GET(self):
+        time.sleep(self.delay_seconds)
+        body = json.dumps({"tracks": []}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for_port(port: int, server: subprocess.Popen, timeout: float = 15):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"gunicorn exited with {server.returncode}")
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"nothing listening on port {port}")
+
+
+def run_load(url: str, clients: int, num_requests: int) -> List[float]:
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=clients)
+    session.mount("http://", adapter)
+
+    def one_request(_):
+        start = time.perf_counter()
+        session.get(url, timeout=120).raise_for_status()
+        return time.perf_counter() - start
+
+    with ThreadPoolExecutor(max_workers=clients) as executor:
+        return list(executor.map(one_request, range(num_requests)))
+
+
+def bench_worker_class(worker_class: str, args, upstream_url: str):
+    port = free_port()
+    cmd = [
+        sys.executable, "-m", "gunicorn",
+        "--bind", f"127.0.0.1:{port}",
+        "--workers", str(args.workers),
+        "--worker-class", worker_class,
+        "--worker-connections", str(args.worker_connections),
+        "--timeout", "120",
+        "--log-level", "warning",
+        "benchmarks.bench_workers:app",
+    ]
+    server = subprocess.Popen(cmd, env={**os.environ, UPSTREAM_URL_ENV: upstream_url})
+    try:
+        wait_for_port(port, server)
+        start = time.perf_counter()
+        timings = sorted(run_load(f"http://127.0.0.1:{port}/", args.clients, args.requests))
+        elapsed = time.perf_counter() - start
+    finally:
+        server.terminate()
+        server.wait()
+    p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+    print(
+        f"{worker_class:>7}: {len(timings) / elapsed:8.1f} req/s  "
+        f"p50 {median(timings) * 1000:8.1f}ms  p95 {p95 * 1000:8.1f}ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=200, help="concurrent load generating clients")
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--upstream-ms", type=float, default=300, help="artificial latency of the upstream")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--worker-connections", type=int, default=1000)
+    parser.add_argument("--worker-classes", nargs="+", default=["sync", "gevent"])
+    args = parser.parse_args()
+
+    SlowUpstreamHandler.delay_seconds = args.upstream_ms / 1000
+    upstream = ThreadingHTTPServer(("127.0.0.1", 0), SlowUpstreamHandler)
+    upstream.daemon_threads = True
+    threading.Thread(target=upstream.serve_forever, daemon=True).start()
+    upstream_url = f"http://127.0.0.1:{upstream.server_address[1]}/"
+
+    try:
+        for worker_class in args.worker_classes:
+            bench_worker_class(worker_class, args, upstream_url)
+    finally:
+        upstream.shutdown()
+
+
+if __name__ == "__main__":
+    main()
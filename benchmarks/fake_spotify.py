@@ -0,0 +1,185 @@
+"""
+deterministic stand-in for spotipy.Spotify backed by a synthetic catalog.
+
+every call sleeps according to a LatencyProfile and can fail with a 5xx or a 429
+(with Retry-After), so benchmarks exercise the same retry and rate limit paths as production.
+responses have the shape of the real web api for the fields this app reads.
+"""
+import random
+import threading
+import time
+import zlib
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+import spotipy
+
+FEATURES = ("energy", "danceability", "valence")
+GENRES = ("pop", "rock", "dance", "chill", "ambient", "acoustic", "electronic", "hip-hop")
+
+
+@dataclass
+class LatencyProfile:
+    """per call latency is base_ms plus uniform jitter, errors and 429s are drawn per call"""
+
+    base_ms: float = 20.0
+    jitter_ms: float = 10.0
+    error_rate: float = 0.0
+    rate_limit_rate: float = 0.0
+    retry_after_seconds: int = 1
+
+
+PROFILES = {
+    "instant": LatencyProfile(base_ms=0, jitter_ms=0),
+    "fast": LatencyProfile(base_ms=20, jitter_ms=10),
+    "realistic": LatencyProfile(base_ms=120, jitter_ms=80),
+    "flaky": LatencyProfile(base_ms=120, jitter_ms=80, error_rate=0.02),
+    "throttled": LatencyProfile(base_ms=120, jitter_ms=80, rate_limit_rate=0.05),
+}
+
+
+def _stable_seed(*parts: Any) -> int:
+    # hash() is salted per process, crc32 keeps results identical between runs
+    return zlib.crc32(repr(parts).encode())
+
+
+class SyntheticCatalog:
+    """num_tracks tracks spread over num_artists artists with seeded names and audio features"""
+
+    def __init__(self, num_tracks: int = 5000, num_artists: int = 500, seed: int = 0):
+        rng = random.Random(seed)
+        syllables = ["la", "mo", "ri", "ka", "ve", "no", "su", "ta", "zi", "po", "de", "an"]
+
+        def word():
+            return "".join(rng.choice(syllables) for _ in range(rng.randint(2, 3))).capitalize()
+
+        self.artists = [{"id": f"artist{i}", "name": f"{word()} {word()}"} for i in range(num_artists)]
+        self.tracks = []
+        self.audio_features = {}
+        for i in range(num_tracks):
+            track_id = f"track{i}"
+            artist = self.artists[rng.randrange(num_artists)]
+            image = f"https://i.scdn.co/image/{track_id}"
+            self.tracks.append(
+                {
+                    "id": track_id,
+                    "name": f"{word()} {word()}",
+                    "uri": f"spotify:track:{track_id}",
+                    "artists": [artist],
+                    "album": {"images": [{"url": f"{image}-640"}, {"url": f"{image}-300"}, {"url": f"{image}-64"}]},
+                    "external_urls": {"spotify": f"https://open.spotify.com/track/{track_id}"},
+                    "popularity": rng.randint(0, 100),
+                }
+            )
+            self.audio_features[track_id] = {"id": track_id, **{feature: rng.random() for feature in FEATURES}}
+        self.tracks_by_id = {track["id"]: track for track in self.tracks}
+
+    def ensure_track(self, track_id: str) -> Dict[str, Any]:
+        """the track, made up from its id when it isn't in the catalog, so recorded production ids resolve"""
+        track = self.tracks_by_id.get(track_id)
+        if track is not None:
+            return track
+        rng = random.Random(_stable_seed(track_id))
+        template = rng.choice(self.tracks)
+        track = {
+            **template,
+            "id": track_id,
+            "uri": f"spotify:track:{track_id}",
+            "external_urls": {"spotify": f"https://open.spotify.com/track/{track_id}"},
+        }
+        # setdefault keeps the first copy when two threads make up the same track
+        self.audio_features.setdefault(track_id, {"id": track_id, **{feature: rng.random() for feature in FEATURES}})
+        return self.tracks_by_id.setdefault(track_id, track)
+
+
+class FakeSpotify:
+    """Implements the spotipy.Spotify methods this app calls. Thread safe.
+    calls counts every call by endpoint, including ones that failed."""
+
+    def __init__(
+        self,
+        catalog: Optional[SyntheticCatalog] = None,
+        profile: Optional[LatencyProfile] = None,
+        seed: int = 0,
+        sleep=time.sleep,
+    ):
+        self.catalog = catalog or SyntheticCatalog()
+        self.profile = profile or PROFILES["fast"]
+        self.sleep = sleep
+        self.calls = Counter()
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._playlists = 0
+
+    def _call(self, endpoint: str):
+        with self._lock:
+            self.calls[endpoint] += 1
+            delay = self.profile.base_ms + self._rng.random() * self.profile.jitter_ms
+            roll = self._rng.random()
+        self.sleep(delay / 1000)
+        if roll < self.profile.rate_limit_rate:
+            raise spotipy.SpotifyException(
+                429, -1, "API rate limit exceeded", headers={"Retry-After": str(self.profile.retry_after_seconds)}
+            )
+        if roll < self.profile.rate_limit_rate + self.profile.error_rate:
+            raise spotipy.SpotifyException(502, -1, "Bad gateway")
+
+    def track(self, track_id: str, market: Optional[str] = None) -> Dict[str, Any]:
+        self._call("track")
+        return self.catalog.tracks_by_id[track_id]
+
+    def tracks(self, tracks: List[str], market: Optional[str] = None) -> Dict[str, List[Optional[Dict[str, Any]]]]:
+        self._call("tracks")
+        return {"tracks": [self.catalog.tracks_by_id.get(track_id) for track_id in tracks]}
+
+    def audio_features(self, tracks: List[str]) -> List[Optional[Dict[str, Any]]]:
+        self._call("audio_features")
+        return [self.catalog.audio_features.get(track_id) for track_id in tracks]
+
+    def recommendations(self, limit: int = 20, **kwargs) -> Dict[str, Any]:
+        self._call("recommendations")
+        # the same seeds and targets always give the same tracks, like a warm spotify cache
+        rng = random.Random(_stable_seed(sorted(kwargs.items(), key=lambda item: item[0])))
+        return {"tracks": rng.sample(self.catalog.tracks, min(limit, len(self.catalog.tracks)))}
+
+    def search(self, q: str, limit: int = 10, offset: int = 0, type: str = "track", market: Optional[str] = None):
+        self._call("search")
+        query = q.lower()
+        matches = [track for track in self.catalog.tracks if track["name"].lower().startswith(query)]
+        if len(matches) < offset + limit:
+            rng = random.Random(_stable_seed(query))
+            matches += rng.sample(self.catalog.tracks, offset + limit - len(matches))
+        return {"tracks": {"items": matches[offset:offset + limit], "total": len(matches)}}
+
+    def current_user(self) -> Dict[str, Any]:
+        self._call("current_user")
+        return {"id": "bench_user", "display_name": "Bench User"}
+
+    def me(self) -> Dict[str, Any]:
+        return self.current_user()
+
+    def current_user_top_artists(self, limit: int = 20, offset: int = 0, time_range: str = "medium_term"):
+        self._call("current_user_top_artists")
+        rng = random.Random(_stable_seed(time_range))
+        items = rng.sample(self.catalog.artists, min(limit, len(self.catalog.artists)))
+        return {"total": len(items), "items": items}
+
+    def user_playlist_create(self, user: str, name: str, public: bool = True, **kwargs) -> Dict[str, Any]:
+        self._call("user_playlist_create")
+        with self._lock:
+            self._playlists += 1
+            playlist_id = f"playlist{self._playlists}"
+        return {"id": playlist_id, "name": name, "external_urls": {"spotify": f"https://open.spotify.com/playlist/{playlist_id}"}}
+
+    def playlist_add_items(self, playlist_id: str, items: List[str], position: Optional[int] = None):
+        self._call("playlist_add_items")
+        return {"snapshot_id": f"{playlist_id}-snapshot"}
+
+    def playlist_cover_image(self, playlist_id: str) -> List[Dict[str, Any]]:
+        self._call("playlist_cover_image")
+        return [{"url": f"https://mosaic.scdn.co/{playlist_id}", "height": 640, "width": 640}]
+
+    def reset_calls(self):
+        with self._lock:
+            self.calls.clear()
@@ -0,0 +1,176 @@
+"""
+FakeSpotify served over http, so the real app (gunicorn, spotipy, connection pool) can be load tested offline.
+
+serves the web api paths this app calls under /v1 and the client credentials token endpoint,
+point the app at it with SPOTIFY_API_URL and SPOTIFY_ACCOUNTS_URL.
+failures from the latency profile are returned as 429s with Retry-After and 502s, like the real api.
+
+usage: python -m benchmarks.fake_spotify_server --port 8090 --profile realistic
+"""
+import argparse
+import json
+import re
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import spotipy
+
+from benchmarks.fake_spotify import PROFILES, FakeSpotify, SyntheticCatalog
+
+# features the /tracks endpoint reads that the synthetic catalog doesn't model
+EXTRA_FEATURES = {
+    "acousticness": 0.5,
+    "instrumentalness": 0.1,
+    "key": 5,
+    "liveness": 0.1,
+    "loudness": -8.0,
+    "mode": 1,
+    "speechiness": 0.05,
+    "tempo": 120.0,
+}
+
+Params = Dict[str, str]
+Handler = Callable[[FakeSpotify, re.Match, Params, Any], Any]
+
+
+def _ids(fake: FakeSpotify, params: Params) -> List[str]:
+    ids = [track_id for track_id in params.get("ids", "").split(",") if track_id]
+    for track_id in ids:
+        fake.catalog.ensure_track(track_id)
+    return ids
+
+
+def _track(fake: FakeSpotify, match: re.Match, params: Params, body: Any) -> Dict[str, Any]:
+    fake.catalog.ensure_track(match["id"])
+    return fake.track(match["id"])
+
+
+def _audio_features(fake: FakeSpotify, match: re.Match, params: Params, body: Any) -> Dict[str, Any]:
+    features = fake.audio_features(_ids(fake, params))
+    return {"audio_features": [{**EXTRA_FEATURES, **f} if f is not None else None for f in features]}
+
+
+def _recommendations(fake: FakeSpotify, match: re.Match, params: Params, body: Any) -> Dict[str, Any]:
+    options = {key: value for key, value in params.items() if key != "limit"}
+    return fake.recommendations(limit=int(params.get("limit", 20)), **options)
+
+
+def _search(fake: FakeSpotify, match: re.Match, params: Params, body: Any) -> Dict[str, Any]:
+    return fake.search(params.get("q", ""), limit=int(params.get("limit", 10)), offset=int(params.get("offset", 0)))
+
+
+def _top_artists(fake: FakeSpotify, match: re.Match, params: Params, body: Any) -> Dict[str, Any]:
+    return fake.current_user_top_artists(
+        limit=int(params.get("limit", 20)),
+        offset=int(params.get("offset", 0)),
+        time_range=params.get("time_range", "medium_term"),
+    )
+
+
+def _token(fake: FakeSpotify, match: re.Match, params: Params, body: Any) -> Dict[str, Any]:
+    return {"access_token": "fake-app-token", "token_type": "Bearer", "expires_in": 3600, "scope": ""}
+
+
+ROUTES: List[Tuple[str, re.Pattern, Handler]] = [
+    ("GET", re.compile(r"/v1/tracks/?$"), lambda fake, m, params, body: fake.tracks(_ids(fake, params))),
+    ("GET", re.compile(r"/v1/tracks/(?P<id>\w+)$"), _track),
+    ("GET", re.compile(r"/v1/audio-features/?$"), _audio_features),
+    ("GET", re.compile(r"/v1/recommendations$"), _recommendations),
+    ("GET", re.compile(r"/v1/search$"), _search),
+    ("GET", re.compile(r"/v1/me/?$"), lambda fake, m, params, body: fake.current_user()),
+    ("GET", re.compile(r"/v1/me/top/artists$"), _top_artists),
+    (
+        "POST",
+        re.compile(r"/v1/users/(?P<user>[^/]+)/playlists$"),
+        lambda fake, m, params, body: fake.user_playlist_create(m["user"], body.get("name", "")),
+    ),
+    (
+        "POST",
+        re.compile(r"/v1/playlists/(?P<id>\w+)/tracks$"),
+        lambda fake, m, params, body: fake.playlist_add_items(m["id"], body),
+    ),
+    ("GET", re.compile(r"/v1/playlists/(?P<id>\w+)/images$"), lambda fake, m, params, body: fake.playlist_cover_image(m["id"])),
+    ("POST", re.compile(r"/api/token$"), _token),
+]
+
+
+class FakeSpotifyHandler(BaseHTTPRequestHandler):
+    # keep-alive, spotipy reuses pooled connections
+    protocol_version = "HTTP/1.1"
+    fake: Optional[FakeSpotify] = None
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+    def _handle(self, method: str):
+        url = urllib.parse.urlsplit(self.path)
+        params = dict(urllib.parse.parse_qsl(url.query))
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        if self.headers.get("Content-Type", "").startswith("application/x-www-form-urlencoded"):
+            body = dict(urllib.parse.parse_qsl(raw.decode()))
+        else:
+            body = json.loads(raw) if raw else None
+        for route_method, pattern, handler in ROUTES:
+            match = pattern.match(url.path)
+            if route_method == method and match:
+                break
+        else:
+            self._send(404, {"error": {"status": 404, "message": f"no fake for {method} {url.path}"}})
+            return
+        try:
+            result = handler(self.fake, match, params, body)
+        except spotipy.SpotifyException as e:
+            self._send(e.http_status, {"error": {"status": e.http_status, "message": e.msg}}, e.headers or {})
+            return
+        # spotify answers 201 Created for playlist writes
+        self._send(201 if method == "POST" and url.path.startswith("/v1/") else 200, result)
+
+    def _send(self, status: int, payload: Any, headers: Optional[Dict[str, str]] = None):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def make_server(fake: FakeSpotify, host: str = "127.0.0.1", port: int = 0) -> ThreadingHTTPServer:
+    handler = type("BoundFakeSpotifyHandler", (FakeSpotifyHandler,), {"fake": fake})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="realistic")
+    parser.add_argument("--num-tracks", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    fake = FakeSpotify(SyntheticCatalog(num_tracks=args.num_tracks, seed=args.seed), PROFILES[args.profile], seed=args.seed)
+    server = make_server(fake, args.host, args.port)
+    print(f"fake spotify ({args.profile}) on http://{args.host}:{server.server_address[1]}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(json.dumps({"calls": dict(fake.calls)}), flush=True)
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
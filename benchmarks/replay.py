@@ -0,0 +1,370 @@
+"""
+load test that replays a production request mix against the real app under gunicorn.
+
+starts benchmarks.fake_spotify_server and gunicorn serving app:app pointed at it, signs in a pool of
+synthetic users with forged session cookies, then fires /autocomplete, /new_playlist/ and /tracks
+requests open loop: arrivals don't wait for earlier responses, so a saturated server shows up
+as growing latency and sheds instead of a slower load generator.
+
+the mix comes from a request log recorded in production with REQUEST_LOG_PATH set (see utils.request_log),
+replayed with its recorded timing scaled by --speed, or at --rate requests per second.
+without --log a synthetic mix of --weights over the fake catalog is used.
+
+reports throughput, latency percentiles and 503 sheds per endpoint, requests in flight
+against the workers' capacity, and how late the load generator dispatched (a large lag means
+the client, not the server, is the bottleneck).
+
+usage:
+    python -m benchmarks.replay --rate 20 --duration 60 --workers 2 --profile realistic
+    python -m benchmarks.replay --log requests.log --speed 4 --worker-class sync --workers 4
+    python -m benchmarks.replay --url http://127.0.0.1:8080 --secret-key $FLASK_SECRET_KEY --rate 10
+"""
+import argparse
+import itertools
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional
+
+import requests
+from flask import Flask
+from flask.sessions import SecureCookieSessionInterface
+
+from benchmarks.bench_scenarios import percentile
+from benchmarks.bench_workers import free_port, wait_for_port
+from benchmarks.fake_spotify import PROFILES, SyntheticCatalog
+from recommendation_engine import playlist
+from recommendation_engine.mood_track_finder import SUPPORTED_MOODS
+from utils.request_log import REPLAYABLE_PATHS, read_request_log
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCOPE = "user-library-read user-top-read playlist-modify-private"
+DEFAULT_WEIGHTS = {"/autocomplete": 0.7, "/new_playlist/": 0.2, "/tracks": 0.1}
+# how often requests in flight are sampled for the saturation report
+SAMPLE_INTERVAL_SECONDS = 0.05
+
+
+@dataclass
+class Arrival:
+    """one request to send offset seconds after the start of the run"""
+
+    offset: float
+    method: str
+    path: str
+    args: Dict[str, Any]
+    json: Optional[Any]
+
+
+@dataclass
+class Outcome:
+    path: str
+    status: Optional[int]
+    latency: float
+    lag: float
+
+
+def session_cookie(secret_key: str, user_id: str) -> str:
+    """a signed flask session that passes login_required without the spotify oauth flow"""
+    signer = Flask(__name__)
+    signer.secret_key = secret_key
+    serializer = SecureCookieSessionInterface().get_signing_serializer(signer)
+    return serializer.dumps(
+        {
+            "token_info": {
+                "access_token": f"fake-token-{user_id}",
+                "token_type": "Bearer",
+                "scope": SCOPE,
+                "expires_in": 3600,
+                "expires_at": int(time.time()) + 24 * 60 * 60,
+                "refresh_token": "fake-refresh-token",
+            },
+            "user_id": user_id,
+            "user_name": user_id,
+        }
+    )
+
+
+def recorded_arrivals(path: str, speed: float) -> List[Arrival]:
+    entries = [entry for entry in read_request_log(path) if entry["path"] in REPLAYABLE_PATHS]
+    if not entries:
+        return []
+    start = entries[0]["ts"]
+    return [
+        Arrival((entry["ts"] - start) / speed, entry["method"], entry["path"], entry.get("args") or {}, entry.get("json"))
+        for entry in entries
+    ]
+
+
+def synthetic_request(path: str, catalog: SyntheticCatalog, rng: random.Random) -> Arrival:
+    if path == "/autocomplete":
+        name = rng.choice(catalog.tracks)["name"].lower()
+        # users pick a suggestion a few keystrokes in
+        return Arrival(0, "POST", path, {}, {"query": name[: rng.randint(2, len(name))]})
+    if path == "/tracks":
+        return Arrival(0, "GET", path, {"mood": rng.choice(SUPPORTED_MOODS)}, None)
+    # same shape as static/js/new-playlist.js, which always sends both track ids
+    payload = {"seed_track_id": "", "destination_track_id": ""}
+    for side, track_key in (("source", "seed_track_id"), ("destination", "destination_track_id")):
+        if rng.random() < 0.5:
+            payload[f"{side}_mode"] = playlist.MOOD_MODE
+            payload[f"{side}_mood"] = rng.choice(SUPPORTED_MOODS)
+        else:
+            payload[f"{side}_mode"] = playlist.SONG_MODE
+            payload[track_key] = rng.choice(catalog.tracks)["id"]
+    return Arrival(0, "POST", path, {}, payload)
+
+
+def with_rate(requests_: Iterable[Arrival], rate: float, duration: float, rng: random.Random) -> List[Arrival]:
+    """poisson arrivals at rate per second for duration seconds, cycling through requests_"""
+    arrivals = []
+    offset = rng.expovariate(rate)
+    for arrival in itertools.cycle(requests_):
+        if offset >= duration:
+            break
+        arrivals.append(Arrival(offset, arrival.method, arrival.path, arrival.args, arrival.json))
+        offset += rng.expovariate(rate)
+    return arrivals
+
+
+class InFlight:
+    def __init__(self):
+        self.count = 0
+        self.samples: List[int] = []
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        with self._lock:
+            self.count += 1
+
+    def __exit__(self, *exc):
+        with self._lock:
+            self.count -= 1
+
+    def sample_until(self, done: threading.Event):
+        while not done.wait(SAMPLE_INTERVAL_SECONDS):
+            self.samples.append(self.count)
+
+
+def replay(url: str, arrivals: List[Arrival], cookies: List[str], max_concurrency: int, in_flight: InFlight) -> List[Outcome]:
+    session = requests.Session()
+    session.mount("http://", requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=max_concurrency))
+    outcomes: List[Outcome] = []
+
+    def send(arrival: Arrival, cookie: str, scheduled_at: float):
+        started = time.perf_counter()
+        status = None
+        with in_flight:
+            try:
+                status = session.request(
+                    arrival.method,
+                    url + arrival.path,
+                    params=arrival.args or None,
+                    json=arrival.json,
+                    cookies={"session": cookie},
+                    timeout=120,
+                ).status_code
+            except requests.RequestException:
+                pass
+        outcomes.append(Outcome(arrival.path, status, time.perf_counter() - started, started - scheduled_at))
+
+    done = threading.Event()
+    sampler = threading.Thread(target=in_flight.sample_until, args=(done,), daemon=True)
+    sampler.start()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+        for i, arrival in enumerate(arrivals):
+            scheduled_at = start + arrival.offset
+            delay = scheduled_at - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            executor.submit(send, arrival, cookies[i % len(cookies)], scheduled_at)
+    done.set()
+    sampler.join()
+    return outcomes
+
+
+def report(outcomes: List[Outcome], elapsed: float, in_flight: InFlight, capacity: Optional[int]) -> Dict[str, Any]:
+    by_path = defaultdict(list)
+    for outcome in outcomes:
+        by_path[outcome.path].append(outcome)
+    endpoints = {}
+    for path, results in sorted(by_path.items()):
+        statuses = Counter(outcome.status for outcome in results)
+        ok = sorted(outcome.latency for outcome in results if outcome.status is not None and outcome.status < 400)
+        endpoints[path] = {
+            "requests": len(results),
+            "ok": len(ok),
+            "shed": statuses[503],
+            "errors": len(results) - len(ok) - statuses[503],
+            "statuses": {str(status): count for status, count in sorted(statuses.items(), key=str)},
+            "throughput": round(len(ok) / elapsed, 2),
+            "p50_ms": round(percentile(ok, 0.5) * 1000, 1) if ok else None,
+            "p95_ms": round(percentile(ok, 0.95) * 1000, 1) if ok else None,
+            "p99_ms": round(percentile(ok, 0.99) * 1000, 1) if ok else None,
+        }
+    samples = sorted(in_flight.samples) or [0]
+    lags = sorted(outcome.lag for outcome in outcomes) or [0.0]
+    saturation = {
+        "mean_in_flight": round(sum(samples) / len(samples), 1),
+        "p95_in_flight": percentile(samples, 0.95),
+        "max_in_flight": samples[-1],
+        "capacity": capacity,
+    }
+    if capacity:
+        saturation["mean_utilization"] = round(saturation["mean_in_flight"] / capacity, 3)
+        saturation["saturated_fraction"] = round(sum(1 for s in samples if s >= capacity) / len(samples), 3)
+    return {
+        "elapsed_s": round(elapsed, 2),
+        "endpoints": endpoints,
+        "saturation": saturation,
+        "dispatch_lag_p95_ms": round(percentile(lags, 0.95) * 1000, 1),
+    }
+
+
+def print_report(result: Dict[str, Any]):
+    print(f"{'endpoint':>14} {'reqs':>6} {'ok':>6} {'shed':>5} {'err':>5} {'ok/s':>7} {'p50':>9} {'p95':>9} {'p99':>9}")
+    for path, e in result["endpoints"].items():
+        p50, p95, p99 = (f"{e[key]:.0f}ms" if e[key] is not None else "-" for key in ("p50_ms", "p95_ms", "p99_ms"))
+        print(
+            f"{path:>14} {e['requests']:>6} {e['ok']:>6} {e['shed']:>5} {e['errors']:>5} "
+            f"{e['throughput']:>7} {p50:>9} {p95:>9} {p99:>9}"
+        )
+    s = result["saturation"]
+    line = f"in flight: mean {s['mean_in_flight']} p95 {s['p95_in_flight']} max {s['max_in_flight']}"
+    if s["capacity"]:
+        line += f" of {s['capacity']} ({s['mean_utilization']:.0%} mean utilization, saturated {s['saturated_fraction']:.0%} of the time)"
+    print(line)
+    print(f"dispatch lag p95 {result['dispatch_lag_p95_ms']}ms over {result['elapsed_s']}s")
+
+
+def start_stack(args, workdir: str) -> List[subprocess.Popen]:
+    """fake spotify and gunicorn, returns the processes and sets args.url and args.secret_key"""
+    fake_port, app_port = free_port(), free_port()
+    fake = subprocess.Popen(
+        [
+            sys.executable, "-m", "benchmarks.fake_spotify_server",
+            "--port", str(fake_port),
+            "--profile", args.profile,
+            "--num-tracks", str(args.num_tracks),
+            "--seed", str(args.seed),
+        ],
+        stdout=subprocess.DEVNULL,
+    )
+    wait_for_port(fake_port, fake)
+    fake_url = f"http://127.0.0.1:{fake_port}"
+    args.secret_key = args.secret_key or os.urandom(32).hex()
+    env = {
+        **os.environ,
+        "SPOTIFY_API_URL": fake_url,
+        "SPOTIFY_ACCOUNTS_URL": fake_url,
+        "SPOTIPY_CLIENT_ID": "fake-client-id",
+        "SPOTIPY_CLIENT_SECRET": "fake-client-secret",
+        "SPOTIPY_REDIRECT_URI": "http://127.0.0.1/",
+        "FLASK_SECRET_KEY": args.secret_key,
+        # each worker's scheduler takes its share of the spotify rate limits
+        "WEB_CONCURRENCY": str(args.workers),
+        "TRACK_STORE_PATH": os.path.join(workdir, "track_store.sqlite3"),
+        # runs in workdir so spotipy's token cache file doesn't leave the fake token in the checkout
+        "PYTHONPATH": os.pathsep.join(filter(None, [ROOT, os.environ.get("PYTHONPATH")])),
+    }
+    app = subprocess.Popen(
+        [
+            sys.executable, "-m", "gunicorn",
+            "--bind", f"127.0.0.1:{app_port}",
+            "--workers", str(args.workers),
+            "--worker-class", args.worker_class,
+            "--worker-connections", str(args.worker_connections),
+            "--timeout", "120",
+            "--log-level", "warning",
+            "app:app",
+        ],
+        env=env,
+        cwd=workdir,
+        stdout=subprocess.DEVNULL,
+        stderr=None if args.verbose else subprocess.DEVNULL,
+    )
+    processes = [fake, app]
+    try:
+        wait_for_port(app_port, app, timeout=60)
+    except RuntimeError:
+        stop_stack(processes)
+        raise
+    args.url = f"http://127.0.0.1:{app_port}"
+    return processes
+
+
+def stop_stack(processes: List[subprocess.Popen]):
+    for process in reversed(processes):
+        process.terminate()
+        process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--log", help="request log recorded with REQUEST_LOG_PATH, a synthetic mix when omitted")
+    parser.add_argument("--speed", type=float, default=1.0, help="replay a recorded log this many times faster")
+    parser.add_argument("--rate", type=float, help="poisson arrivals per second instead of the recorded timing")
+    parser.add_argument("--duration", type=float, default=30, help="seconds of load when --rate is used")
+    parser.add_argument("--weights", type=json.loads, default=DEFAULT_WEIGHTS, help="synthetic mix as a json object")
+    parser.add_argument("--users", type=int, default=50, help="signed in users the requests are spread over")
+    parser.add_argument("--max-concurrency", type=int, default=512, help="load generator threads")
+    parser.add_argument("--url", help="an already running app, skips starting the fake and gunicorn")
+    parser.add_argument("--secret-key", help="the app's FLASK_SECRET_KEY, required with --url")
+    parser.add_argument("--capacity", type=int, help="concurrent requests the workers can hold, for --url")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--worker-class", default="gevent")
+    parser.add_argument("--worker-connections", type=int, default=1000)
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="realistic")
+    parser.add_argument("--num-tracks", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="also write the report to this file")
+    parser.add_argument("--verbose", action="store_true", help="show gunicorn's output")
+    args = parser.parse_args()
+    if args.url and not args.secret_key:
+        parser.error("--url needs --secret-key to sign sessions")
+
+    rng = random.Random(args.seed)
+    if args.log:
+        arrivals = recorded_arrivals(args.log, args.speed)
+        if args.rate:
+            arrivals = with_rate(arrivals, args.rate, args.duration, rng)
+    else:
+        catalog = SyntheticCatalog(num_tracks=args.num_tracks, seed=args.seed)
+        paths = rng.choices(list(args.weights), weights=list(args.weights.values()), k=1000)
+        arrivals = with_rate([synthetic_request(path, catalog, rng) for path in paths], args.rate or 10, args.duration, rng)
+    if not arrivals:
+        parser.error("nothing to replay")
+
+    with tempfile.TemporaryDirectory() as workdir:
+        processes = [] if args.url else start_stack(args, workdir)
+        capacity = args.capacity
+        if processes:
+            # a sync worker serves one request at a time, async workers up to worker_connections
+            capacity = args.workers * (1 if args.worker_class == "sync" else args.worker_connections)
+        cookies = [session_cookie(args.secret_key, f"loadtest_user_{i}") for i in range(args.users)]
+        in_flight = InFlight()
+        try:
+            start = time.perf_counter()
+            outcomes = replay(args.url.rstrip("/"), arrivals, cookies, args.max_concurrency, in_flight)
+            elapsed = time.perf_counter() - start
+        finally:
+            stop_stack(processes)
+
+    result = report(outcomes, elapsed, in_flight, capacity)
+    print_report(result)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(result, f, indent=2, sort_keys=True)
+            f.write("\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+import json
+from pathlib import Path
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from recommendation_engine.payload_index import nearest_distinct
+from recommendation_engine.vector_index import COSINE, SUPPORTED_METRICS
+
+# rows assigned to centroids per chunk, bounds the (rows, num_lists) distance matrix
+ASSIGN_CHUNK_SIZE = 65536
+DEFAULT_NPROBE = 8
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, np.finfo(np.float32).tiny)
+
+
+def _squared_distances(queries: np.ndarray, points: np.ndarray) -> np.ndarray:
+    squared = (
+        np.einsum("ij,ij->i", queries, queries)[:, None]
+        - 2.0 * (queries @ points.T)
+        + np.einsum("ij,ij->i", points, points)[None, :]
+    )
+    return np.maximum(squared, 0.0)
+
+
+def _assign(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    assignments = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), ASSIGN_CHUNK_SIZE):
+        chunk = vectors[start:start + ASSIGN_CHUNK_SIZE]
+        assignments[start:start + len(chunk)] = _squared_distances(chunk, centroids).argmin(axis=1)
+    return assignments
+
+
+def _append(buffer: np.ndarray, count: int, values: np.ndarray) -> np.ndarray:
+    """writes values after the first count entries of buffer, doubling it when they don't fit"""
+    needed = count + len(values)
+    if needed > len(buffer):
+        grown = np.empty((max(needed, 2 * len(buffer)),) + buffer.shape[1:], dtype=buffer.dtype)
+        grown[:count] = buffer[:count]
+        buffer = grown
+    buffer[count:needed] = values
+    return buffer
+
+
+def train_kmeans(vectors: np.ndarray, num_lists: int, iterations: int = 20, seed: int = 0) -> np.ndarray:
+    """Lloyd's k-means, returns (num_lists, num_features) float32 centroids"""
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), size=num_lists, replace=False)].copy()
+    for _ in range(iterations):
+        assignments = _assign(vectors, centroids)
+        sums = np.zeros_like(centroids, dtype=np.float64)
+        np.add.at(sums, assignments, vectors)
+        counts = np.bincount(assignments, minlength=num_lists)
+        empty = counts == 0
+        # re-seed empty lists from random points so every list stays useful
+        if empty.any():
+            sums[empty] = vectors[rng.choice(len(vectors), size=int(empty.sum()))]
+            counts[empty] = 1
+        centroids = (sums / counts[:, None]).astype(np.float32)
+    return centroids
+
+
+class IVFTrackIndex:
+    """Inverted file approximate nearest neighbour index over track vectors.
+
+    Vectors are bucketed by their nearest k-means centroid. A query scans only the nprobe
+    closest buckets, so nprobe trades recall for latency. Results use the same contract as
+    ExactTrackIndex.search: row numbers in insertion order, -1 / inf for unfilled slots.
+
+    Rows from load() stay in the (memory mapped) stored arrays, rows added after it go to
+    buffers that double when full, so an add costs the rows it inserts amortized.
+    """
+
+    def __init__(self, centroids: np.ndarray, metric: str = COSINE, nprobe: int = DEFAULT_NPROBE):
+        if metric not in SUPPORTED_METRICS:
+            raise ValueError(f"Unknown metric: {metric}. Supported metrics include {SUPPORTED_METRICS}")
+        self.metric = metric
+        self.nprobe = nprobe
+        self.centroids = np.ascontiguousarray(centroids, dtype=np.float32)
+        self._stored_vectors = np.empty((0, self.centroids.shape[1]), dtype=np.float32)
+        self._stored_lists: List[np.ndarray] = [np.empty(0, dtype=np.int64) for _ in range(len(self.centroids))]
+        self._new_vectors = np.empty_like(self._stored_vectors)
+        self._new_count = 0
+        self._new_lists: List[np.ndarray] = [np.empty(0, dtype=np.int64) for _ in range(len(self.centroids))]
+        self._new_list_counts = np.zeros(len(self.centroids), dtype=np.int64)
+
+    @classmethod
+    def build(
+        cls,
+        vectors: np.ndarray,
+        num_lists: Optional[int] = None,
+        metric: str = COSINE,
+        nprobe: int = DEFAULT_NPROBE,
+        train_size: int = 100_000,
+        iterations: int = 20,
+        seed: int = 0,
+    ) -> "IVFTrackIndex":
+        """trains centroids on a sample of vectors then inserts all of them"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if num_lists is None:
+            # common rule of thumb for inverted file indexes
+            num_lists = max(1, int(np.sqrt(len(vectors))))
+        num_lists = min(num_lists, len(vectors))
+        training = cls._prepare(vectors, metric)
+        if len(training) > train_size:
+            rng = np.random.default_rng(seed)
+            training = training[rng.choice(len(training), size=train_size, replace=False)]
+        index = cls(train_kmeans(training, num_lists, iterations=iterations, seed=seed), metric=metric, nprobe=nprobe)
+        index.add(vectors)
+        return index
+
+    @staticmethod
+    def _prepare(vectors: np.ndarray, metric: str) -> np.ndarray:
+        # cosine ranks like euclidean on unit vectors, so store them normalized
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        return _normalize(vectors) if metric == COSINE else vectors
+
+    def __len__(self) -> int:
+        return len(self._stored_vectors) + self._new_count
+
+    @property
+    def vectors(self) -> np.ndarray:
+        """every vector in row order, a copy once rows were added to a loaded index"""
+        if self._new_count == 0:
+            return self._stored_vectors
+        new_vectors = self._new_vectors[:self._new_count]
+        return np.concatenate([self._stored_vectors, new_vectors]) if len(self._stored_vectors) else new_vectors
+
+    @property
+    def lists(self) -> List[np.ndarray]:
+        """rows of every list in insertion order"""
+        return [np.concatenate(self._list_parts(list_id)) for list_id in range(len(self.centroids))]
+
+    def _list_parts(self, list_id: int) -> Tuple[np.ndarray, np.ndarray]:
+        return self._stored_lists[list_id], self._new_lists[list_id][:self._new_list_counts[list_id]]
+
+    def _take(self, rows: np.ndarray) -> np.ndarray:
+        """vectors of rows, reading stored rows from the stored array without copying it"""
+        stored_count = len(self._stored_vectors)
+        if self._new_count == 0:
+            return self._stored_vectors[rows]
+        if stored_count == 0:
+            return self._new_vectors[rows]
+        taken = np.empty((len(rows), self.centroids.shape[1]), dtype=np.float32)
+        stored = rows < stored_count
+        taken[stored] = self._stored_vectors[rows[stored]]
+        taken[~stored] = self._new_vectors[rows[~stored] - stored_count]
+        return taken
+
+    def add(self, vectors: np.ndarray) -> np.ndarray:
+        """inserts vectors after the existing ones and returns their row numbers"""
+        vectors = self._prepare(np.atleast_2d(vectors), self.metric)
+        first_row = len(self)
+        rows = np.arange(first_row, first_row + len(vectors))
+        assignments = _assign(vectors, self.centroids)
+        self._new_vectors = _append(self._new_vectors, self._new_count, vectors)
+        self._new_count += len(vectors)
+        order = np.argsort(assignments, kind="stable")
+        list_ids, starts = np.unique(assignments[order], return_index=True)
+        for list_id, chunk in zip(list_ids, np.split(rows[order], starts[1:])):
+            self._new_lists[list_id] = _append(self._new_lists[list_id], self._new_list_counts[list_id], chunk)
+            self._new_list_counts[list_id] += len(chunk)
+        return rows
+
+    def _to_distance(self, squared: np.ndarray) -> np.ndarray:
+        if self.metric == COSINE:
+            # ||a - b||^2 = 2 - 2cos for unit vectors
+            return squared / 2.0
+        return np.sqrt(squared)
+
+    def search(
+        self,
+        queries: np.ndarray,
+        k: int,
+        nprobe: Optional[int] = None,
+        exclude: Optional[np.ndarray] = None,
+        distinct: Sequence[np.ndarray] = (),
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """exclude and distinct work as in ExactTrackIndex.search and are applied while scanning the lists.
+        When they leave fewer than k results in the nprobe closest lists, more lists are probed
+        in order of distance, so results only come up short once the whole index is exhausted."""
+        queries = self._prepare(np.atleast_2d(queries), self.metric)
+        nprobe = min(nprobe or self.nprobe, len(self.centroids))
+        probe_order = np.argsort(_squared_distances(queries, self.centroids), axis=1)
+
+        result_indices = np.full((len(queries), k), -1, dtype=np.int64)
+        result_distances = np.full((len(queries), k), np.inf, dtype=np.float32)
+        for query_number, (query, lists) in enumerate(zip(queries, probe_order)):
+            query_exclude = None
+            if exclude is not None:
+                query_exclude = exclude[query_number] if exclude.ndim == 2 else exclude
+            probed = nprobe
+            while True:
+                candidates = np.concatenate([part for list_id in lists[:probed] for part in self._list_parts(list_id)])
+                if query_exclude is not None:
+                    candidates = candidates[~query_exclude[candidates]]
+                squared = _squared_distances(query[None, :], self._take(candidates))[0] if len(candidates) else np.empty(0)
+                if distinct:
+                    nearest = nearest_distinct(squared, candidates, k, distinct)
+                else:
+                    count = min(k, len(candidates))
+                    nearest = np.argpartition(squared, count - 1)[:count] if count < len(candidates) else np.arange(count)
+                    nearest = nearest[np.argsort(squared[nearest], kind="stable")]
+                if len(nearest) == k or probed == len(lists):
+                    break
+                probed = min(len(lists), probed * 2)
+            result_indices[query_number, :len(nearest)] = candidates[nearest]
+            result_distances[query_number, :len(nearest)] = self._to_distance(squared[nearest])
+        return result_indices, result_distances
+
+    def save(self, directory: str):
+        """writes .npy files that load() can memory map"""
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        np.save(directory / "centroids.npy", self.centroids)
+        lists = self.lists
+        np.save(directory / "vectors.npy", self.vectors)
+        np.save(directory / "list_ids.npy", np.concatenate(lists) if lists else np.empty(0, dtype=np.int64))
+        np.save(directory / "list_offsets.npy", np.cumsum([0] + [len(ids) for ids in lists]))
+        with open(directory / "meta.json", "w") as f:
+            json.dump({"metric": self.metric, "nprobe": self.nprobe}, f)
+
+    @classmethod
+    def load(cls, directory: str, mmap: bool = True) -> "IVFTrackIndex":
+        directory = Path(directory)
+        mmap_mode = "r" if mmap else None
+        with open(directory / "meta.json") as f:
+            meta = json.load(f)
+        index = cls(np.load(directory / "centroids.npy"), metric=meta["metric"], nprobe=meta["nprobe"])
+        index._stored_vectors = np.load(directory / "vectors.npy", mmap_mode=mmap_mode)
+        list_ids = np.load(directory / "list_ids.npy", mmap_mode=mmap_mode)
+        offsets = np.load(directory / "list_offsets.npy")
+        index._stored_lists = [list_ids[start:end] for start, end in zip(offsets[:-1], offsets[1:])]
+        return index
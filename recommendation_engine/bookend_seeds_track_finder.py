@@ -1,9 +1,17 @@
+from concurrent.futures import ThreadPoolExecutor
+import contextvars
 from dataclasses import dataclass
 import spotipy
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Tuple, Callable
 import pprint
 
+from recommendation_engine.path_planner import GEOMETRIC, plan_waypoints
+from utils.tracing import tracer
+
 COUNTRY = "US"  # TODO: get this from user metadata
+RECOMMENDATION_POOL_SIZE = 4
+# progress stage reported as each recommended slot is chosen
+SLOT_FILLED = "slot_filled"
 
 
 @dataclass
@@ -29,7 +37,12 @@ class BookendSeedsTrackFinder:
     # 0 or missing feature key will not set a maximum
     # 2, for example, would set double the target as the max
     target_max_multiplier: Optional[Dict[str, float]] = None
+    # concurrent runs the independent recommendation calls of each wave in parallel
+    concurrent: bool = True
+    # how feature targets move from the seed to the destination, see path_planner
+    curve: str = GEOMETRIC
 
+    @tracer.traced("BookendSeedsTrackFinder.__init__")
     def __init__(
         self,
         sp: spotipy.Spotify,
@@ -39,12 +52,17 @@ class BookendSeedsTrackFinder:
         # class since this one is not used by other recommenders
         target_min_multiplier: Optional[Dict[str, float]] = None,
         target_max_multipler: Optional[Dict[str, float]] = None,
+        concurrent: bool = True,
+        curve: str = GEOMETRIC,
     ):
         self.sp = sp
         self.seed_track = seed_track
         self.destination_track = destination_track
         self.target_min_multiplier = target_min_multiplier
         self.target_max_multipler = target_max_multipler
+        self.target_max_multiplier = target_max_multipler
+        self.concurrent = concurrent
+        self.curve = curve
         self.num_tracks = 5
 
         # TODO: remove API call from __init__??
@@ -64,7 +82,8 @@ class BookendSeedsTrackFinder:
         self.destination_features["valence"] = destination_features["valence"]
 
     # TODO: break into helper functions for readability
-    def recommend(self):
+    @tracer.traced("BookendSeedsTrackFinder.recommend")
+    def recommend(self, progress: Optional[Callable[..., None]] = None):
         pp = pprint.PrettyPrinter(indent=4, width=120)
         # tracks that will be returned from the function
         # [seed, r0, r1, r2, r3, r4, destination]
@@ -76,95 +95,85 @@ class BookendSeedsTrackFinder:
         artist_ids = [self.seed_track["artists"][0]["id"], self.destination_track["artists"][0]["id"]]
         # TODO: experiment with adding/not adding more seed tracks as you go
 
-        source_features = self.source_features
-        destination_features = self.destination_features
+        iterations_recommendation_kwargs = self._get_iterations_recommendation_kwargs()
 
-        # list of kwargs for each slot in the playlist
-        iterations_recommendation_kwargs = []
+        # getting recommendations that utilize bookended seeds
+        # r0, r2, r4 only depend on the bookends so they are fetched together
+        # entries are (playlist_tracks index, recommendation kwargs, seed track ids)
+        first_wave = [
+            (1, iterations_recommendation_kwargs[0], [self.seed_track["id"]]),
+            (3, iterations_recommendation_kwargs[2], [self.seed_track["id"], self.destination_track["id"]]),
+            (5, iterations_recommendation_kwargs[4], [self.destination_track["id"]]),
+        ]
+        self._fill_slots(first_wave, playlist_tracks, track_names, artist_ids, progress)
+
+        # getting recommendations that use recommended tracks as seeds
+        # hoping this will blend continuity and diversity
+        # r1 and r3 only depend on the first wave
+        second_wave = [
+            (2, iterations_recommendation_kwargs[1], [playlist_tracks[1]["id"], playlist_tracks[3]["id"]]),
+            (4, iterations_recommendation_kwargs[3], [playlist_tracks[5]["id"], playlist_tracks[3]["id"]]),
+        ]
+        self._fill_slots(second_wave, playlist_tracks, track_names, artist_ids, progress)
 
-        step_size = self.num_tracks
-        for i in range(self.num_tracks):
+        return playlist_tracks
+
+    def _get_iterations_recommendation_kwargs(self) -> List[Dict[str, float]]:
+        """list of sp.recommendations kwargs for each slot in the playlist"""
+        features = list(self.source_features)
+        waypoints = plan_waypoints(
+            [self.source_features[feature] for feature in features],
+            [self.destination_features[feature] for feature in features],
+            self.num_tracks,
+            curve=self.curve,
+        )
+        iterations_recommendation_kwargs = []
+        for targets in waypoints.tolist():
             recommendation_kwargs = {}
-            for feature in source_features:
-                target_key = f"target_{feature}"
-                target = source_features[feature] + (
-                    (destination_features[feature] - source_features[feature]) / step_size
-                )
-                source_features[feature] = target
-                recommendation_kwargs[target_key] = target
+            for feature, target in zip(features, targets):
+                recommendation_kwargs[f"target_{feature}"] = target
 
                 if self.target_min_multiplier is not None:
-                    min_key = f"min_{feature}"
-                    min_feature = target * self.target_min_multiplier.get(feature, 0)
-                    recommendation_kwargs[min_key] = min_feature
+                    recommendation_kwargs[f"min_{feature}"] = target * self.target_min_multiplier.get(feature, 0)
 
                 if self.target_max_multiplier is not None and self.target_max_multiplier.get(feature, 0) != 0:
-                    max_key = f"max_{feature}"
-                    max_feature = target * self.target_max_multiplier
-                    recommendation_kwargs[max_key] = max_feature
-
-                iterations_recommendation_kwargs.append(recommendation_kwargs)
-
-        recommendation_pool_size = 4
-        # getting recommendations that utilize bookended seeds
-        # r0
-        recommendation_kwargs = iterations_recommendation_kwargs[0]
-        seed_tracks = [self.seed_track["id"]]
-        recs = self.sp.recommendations(
-            limit=recommendation_pool_size, seed_tracks=seed_tracks, country=COUNTRY, **recommendation_kwargs,
-        )
-        next_track = self.skip_duplicate_titles_and_artists(recs, track_names, artist_ids)
-        track_names.append(next_track["name"].lower())
-        artist_ids.append(next_track["artists"][0]["id"])
-        playlist_tracks[1] = next_track
-
-        # r2
-        recommendation_kwargs = iterations_recommendation_kwargs[2]
-        seed_tracks = [self.seed_track["id"], self.destination_track["id"]]
-        recs = self.sp.recommendations(
-            limit=recommendation_pool_size, seed_tracks=seed_tracks, country=COUNTRY, **recommendation_kwargs,
-        )
-        next_track = self.skip_duplicate_titles_and_artists(recs, track_names, artist_ids)
-        track_names.append(next_track["name"].lower())
-        artist_ids.append(next_track["artists"][0]["id"])
-        playlist_tracks[3] = next_track
-
-        # r4
-        recommendation_kwargs = iterations_recommendation_kwargs[4]
-        seed_tracks = [self.destination_track["id"]]
-        recs = self.sp.recommendations(
-            limit=recommendation_pool_size, seed_tracks=seed_tracks, country=COUNTRY, **recommendation_kwargs,
-        )
-        next_track = self.skip_duplicate_titles_and_artists(recs, track_names, artist_ids)
-        track_names.append(next_track["name"].lower())
-        artist_ids.append(next_track["artists"][0]["id"])
-        playlist_tracks[5] = next_track
+                    recommendation_kwargs[f"max_{feature}"] = target * self.target_max_multiplier[feature]
+            iterations_recommendation_kwargs.append(recommendation_kwargs)
+        return iterations_recommendation_kwargs
 
-        # getting recommendations that use recommended tracks as seeds
-        # hoping this will blend continuity and diversity
-        # r1
-        recommendation_kwargs = iterations_recommendation_kwargs[1]
-        seed_tracks = [playlist_tracks[1]["id"], playlist_tracks[3]["id"]]
-        recs = self.sp.recommendations(
-            limit=recommendation_pool_size, seed_tracks=seed_tracks, country=COUNTRY, **recommendation_kwargs,
+    def _get_recommendations(self, seed_tracks: List[str], recommendation_kwargs: Dict[str, float]):
+        return self.sp.recommendations(
+            limit=RECOMMENDATION_POOL_SIZE, seed_tracks=seed_tracks, country=COUNTRY, **recommendation_kwargs,
         )
-        next_track = self.skip_duplicate_titles_and_artists(recs, track_names, artist_ids)
-        track_names.append(next_track["name"].lower())
-        artist_ids.append(next_track["artists"][0]["id"])
-        playlist_tracks[2] = next_track
-
-        # r3
-        recommendation_kwargs = iterations_recommendation_kwargs[3]
-        seed_tracks = [playlist_tracks[5]["id"], playlist_tracks[3]["id"]]
-        recs = self.sp.recommendations(
-            limit=recommendation_pool_size, seed_tracks=seed_tracks, country=COUNTRY, **recommendation_kwargs,
-        )
-        next_track = self.skip_duplicate_titles_and_artists(recs, track_names, artist_ids)
-        track_names.append(next_track["name"].lower())
-        artist_ids.append(next_track["artists"][0]["id"])
-        playlist_tracks[4] = next_track
 
-        return playlist_tracks
+    def _fill_slots(
+        self,
+        slots: List[Tuple[int, Dict[str, float], List[str]]],
+        playlist_tracks: List[Optional[Dict[str, Any]]],
+        track_names: List[str],
+        artist_ids: List[str],
+        progress: Optional[Callable[..., None]] = None,
+    ):
+        """Fetches recommendations for a wave of independent slots, concurrently when enabled.
+        De-duplication always runs in slot order so the playlist matches a sequential run."""
+        if self.concurrent and len(slots) > 1:
+            with ThreadPoolExecutor(max_workers=len(slots)) as executor:
+                # copy the context so flask's request context (and the session token cache) is visible to workers
+                futures = [
+                    executor.submit(contextvars.copy_context().run, self._get_recommendations, seed_tracks, kwargs)
+                    for _, kwargs, seed_tracks in slots
+                ]
+                recs_per_slot = [future.result() for future in futures]
+        else:
+            recs_per_slot = [self._get_recommendations(seed_tracks, kwargs) for _, kwargs, seed_tracks in slots]
+
+        for (slot, _, _), recs in zip(slots, recs_per_slot):
+            next_track = self.skip_duplicate_titles_and_artists(recs, track_names, artist_ids)
+            track_names.append(next_track["name"].lower())
+            artist_ids.append(next_track["artists"][0]["id"])
+            playlist_tracks[slot] = next_track
+            if progress is not None:
+                progress(SLOT_FILLED, slot=slot, track=track_summary(next_track))
 
     @staticmethod
     # if there are only duplicates available in the recommendation pool,
@@ -180,3 +189,7 @@ class BookendSeedsTrackFinder:
                 continue
             return recommended_track
         return recs["tracks"][0]
+
+
+def track_summary(track: Dict[str, Any]) -> Dict[str, str]:
+    return {"id": track["id"], "name": track["name"], "artist": track["artists"][0].get("name", "")}
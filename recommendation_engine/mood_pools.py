@@ -0,0 +1,87 @@
+import logging
+import random
+import threading
+from typing import Any, Dict, Iterable, List, Optional
+
+import spotipy
+
+from recommendation_engine.mood_track_finder import COUNTRY, SUPPORTED_MOODS, MoodTrackFinder, mood_genres
+
+logger = logging.getLogger(__name__)
+
+# spotify's max limit for one recommendations call
+POOL_SIZE = 100
+REFRESH_INTERVAL_SECONDS = 30 * 60
+
+
+class MoodCandidatePools:
+    """Candidate tracks for every mood, refreshed on a background thread.
+
+    The mood feature targets are static, so one genre seeded recommendations call per mood
+    serves every user. MoodTrackFinder samples from memory and personalizes afterwards
+    instead of making a live recommendations call per playlist.
+    A failed refresh keeps serving the previous pool.
+    With start_on_first_use the refresh thread starts on the first get(), so creating the pools
+    (e.g. importing the app in tests, benchmarks or the gunicorn master) makes no spotify calls.
+    """
+
+    def __init__(
+        self,
+        sp: spotipy.Spotify,
+        pool_size: int = POOL_SIZE,
+        refresh_interval_seconds: float = REFRESH_INTERVAL_SECONDS,
+        start_on_first_use: bool = False,
+    ):
+        self.sp = sp
+        self.pool_size = pool_size
+        self.refresh_interval_seconds = refresh_interval_seconds
+        self.start_on_first_use = start_on_first_use
+        self._pools: Dict[str, List[Dict[str, Any]]] = {mood: [] for mood in SUPPORTED_MOODS}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+
+    def refresh(self, moods: Iterable[str] = SUPPORTED_MOODS):
+        for mood in moods:
+            try:
+                recs = self.sp.recommendations(
+                    limit=self.pool_size,
+                    seed_genres=mood_genres[mood],
+                    country=COUNTRY,
+                    **MoodTrackFinder.get_mood_features(mood),
+                )
+            except Exception:
+                logger.exception(f"failed to refresh candidate pool for mood {mood}")
+                continue
+            # swapped in whole so readers never see a partial pool
+            self._pools[mood] = recs["tracks"]
+            logger.debug(f"refreshed candidate pool for mood {mood} with {len(recs['tracks'])} tracks")
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.refresh()
+            self._stop.wait(self.refresh_interval_seconds)
+
+    def start(self):
+        with self._start_lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name="mood-candidate-pools", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def get(self, mood: str) -> List[Dict[str, Any]]:
+        if self.start_on_first_use and self._thread is None:
+            # the first callers find the pools empty and fall back to a live call
+            self.start()
+        return self._pools.get(mood, [])
+
+    def sample(self, mood: str, num_tracks: int, preferred_artist_ids: Iterable[str] = ()) -> List[Dict[str, Any]]:
+        """random tracks from the mood's pool, tracks by preferred artists first"""
+        preferred_artist_ids = set(preferred_artist_ids)
+        pool = list(self.get(mood))
+        random.shuffle(pool)
+        pool.sort(key=lambda track: not any(artist["id"] in preferred_artist_ids for artist in track["artists"]))
+        return pool[:num_tracks]
@@ -1,3 +1,5 @@
+from concurrent.futures import ThreadPoolExecutor
+import contextvars
 import pprint
 from random import sample
 import spotipy
@@ -5,6 +7,8 @@ from statistics import median
 from typing import Dict, List
 from werkzeug.exceptions import abort
 
+from utils.tracing import tracer
+
 
 # TODO: make global?
 MOOD_HAPPY = "happy"
@@ -25,7 +29,16 @@ mood_genres = {
 
 
 class MoodTrackFinder:
-    def __init__(self, sp: spotipy.Spotify, mood:str, num_tracks: int, session=None):
+    def __init__(
+        self,
+        sp: spotipy.Spotify,
+        mood: str,
+        num_tracks: int,
+        session=None,
+        pools=None,
+        top_artists_cache=None,
+        user_key=None,
+    ):
         mood = mood.lower()
         if mood not in SUPPORTED_MOODS:
             raise ValueError(
@@ -38,12 +51,18 @@ class MoodTrackFinder:
         self.sp = sp
         self.mood = mood
         self.num_tracks = num_tracks
+        # optional MoodCandidatePools to sample from instead of calling recommendations
+        self.pools = pools
         # TODO: is this ok in __init__?
         if session and "top_artists" in session:
             self.top_artists = session.get("top_artists")
         else:
             print("calling get top artists") # TODO: proper logger at debug level
-            top_artists = self._get_top_artists()
+            # a TopArtistsCache shares the lookup across finders, requests and sessions of the same user
+            if top_artists_cache is not None and user_key is not None:
+                top_artists = top_artists_cache.get(user_key, self._get_top_artists)
+            else:
+                top_artists = self._get_top_artists()
             self.top_artists = top_artists
             if session:
                 session["top_artists"] = top_artists
@@ -52,16 +71,25 @@ class MoodTrackFinder:
     def _get_top_artists(self) -> Dict[str, List[Dict[str, str]]]:
         print("fetching top artists to seed recommendations")
         artists_per_time_range = {"short_term": [], "medium_term": [], "long_term": []}
-        for time_range in artists_per_time_range:
-            # 50 is max limit
-            top_artists_resp = self.sp.current_user_top_artists(limit=10, time_range=time_range)
-            if top_artists_resp["total"] == 0:
-                return artists_per_time_range
-            # Only return name and id for each artist
-            artists_per_time_range[time_range] = [
-                {"name": artist["name"], "id": artist["id"]}
-                for artist in top_artists_resp["items"]
-            ]
+        # the time ranges are independent so fetch them concurrently
+        with ThreadPoolExecutor(max_workers=len(artists_per_time_range)) as executor:
+            # copy the context so flask's request context (and the session token cache) is visible to workers
+            futures = {
+                # 50 is max limit
+                time_range: executor.submit(
+                    contextvars.copy_context().run, self.sp.current_user_top_artists, limit=10, time_range=time_range
+                )
+                for time_range in artists_per_time_range
+            }
+            for time_range, future in futures.items():
+                top_artists_resp = future.result()
+                if top_artists_resp["total"] == 0:
+                    continue
+                # Only return name and id for each artist
+                artists_per_time_range[time_range] = [
+                    {"name": artist["name"], "id": artist["id"]}
+                    for artist in top_artists_resp["items"]
+                ]
         return artists_per_time_range
 
     # Fetch 5 randomized, distinct seed artists
@@ -90,19 +118,19 @@ class MoodTrackFinder:
         print("seed artists for mood", self.mood, [artist_name_per_id[a_id] for a_id in seed_artists])
         return seed_artists
 
+    @tracer.traced("MoodTrackFinder.find")
     def find(self):
         """
         returns a list of tracks from spotify reccomendations response
         https://developer.spotify.com/documentation/web-api/reference/get-recommendations
         """
+        # precomputed pools answer from memory, personalized with the user's top artists
+        if self.pools is not None and len(self.pools.get(self.mood)) >= self.num_tracks:
+            top_artist_ids = [artist["id"] for artists in self.top_artists.values() for artist in artists]
+            return self.pools.sample(self.mood, self.num_tracks, top_artist_ids)
+
         # get features for corresponding mood
-        mood_features = {}
-        if self.mood == MOOD_HAPPY:
-            mood_features = self.get_happy_features()
-        elif self.mood == MOOD_ENERGIZED:
-            mood_features = self.get_energized_features()
-        elif self.mood == MOOD_CALM:
-            mood_features = self.get_calm_features()
+        mood_features = self.get_mood_features(self.mood)
         # print("mood features for", self.mood)
         # print(mood_features)
 
@@ -137,6 +165,16 @@ class MoodTrackFinder:
     acousticness, liveness, and instrumentalness all seem to be very noisy, or low quality signals.
     """
 
+    @classmethod
+    def get_mood_features(cls, mood: str) -> Dict[str, float]:
+        if mood == MOOD_HAPPY:
+            return cls.get_happy_features()
+        elif mood == MOOD_ENERGIZED:
+            return cls.get_energized_features()
+        elif mood == MOOD_CALM:
+            return cls.get_calm_features()
+        return {}
+
     @staticmethod
     def get_happy_features() -> Dict[str, float]:
         return {
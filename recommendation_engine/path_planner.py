@@ -0,0 +1,53 @@
+import numpy as np
+
+# interpolation curves, each maps waypoint number to how far along the path it sits
+LINEAR = "linear"
+EASE_IN = "ease_in"
+EASE_OUT = "ease_out"
+EASE_IN_OUT = "ease_in_out"
+# every step covers the same fraction of the distance left to the destination
+# this is what BookendSeedsTrackFinder originally did, it front loads the change and never reaches the destination
+GEOMETRIC = "geometric"
+SUPPORTED_CURVES = [LINEAR, EASE_IN, EASE_OUT, EASE_IN_OUT, GEOMETRIC]
+
+
+def path_fractions(num_waypoints: int, curve: str = LINEAR) -> np.ndarray:
+    """
+    (num_waypoints,) fractions of the way from source to destination, strictly between 0 and 1
+    for every curve so waypoints never repeat the bookends
+    """
+    if curve not in SUPPORTED_CURVES:
+        raise ValueError(f"Unknown curve: {curve}. Supported curves include {SUPPORTED_CURVES}")
+    if num_waypoints < 1:
+        raise ValueError("path_fractions requires num_waypoints greater than 0")
+    steps = np.arange(1, num_waypoints + 1, dtype=np.float64)
+    if curve == GEOMETRIC:
+        return 1 - (1 - 1 / num_waypoints) ** steps
+    t = steps / (num_waypoints + 1)
+    if curve == EASE_IN:
+        return t * t
+    if curve == EASE_OUT:
+        return 1 - (1 - t) ** 2
+    if curve == EASE_IN_OUT:
+        # smoothstep
+        return t * t * (3 - 2 * t)
+    return t
+
+
+def plan_waypoints(source: np.ndarray, destination: np.ndarray, num_waypoints: int, curve: str = LINEAR) -> np.ndarray:
+    """
+    Feature targets for every slot between source and destination in one vectorized operation.
+
+    source and destination are (num_features,) vectors, or (num_legs, num_features) to plan several
+    legs at once. Returns (num_waypoints, num_features), or (num_legs, num_waypoints, num_features).
+    The rows can be passed straight to a vector index as a batch of queries.
+    """
+    source = np.asarray(source, dtype=np.float64)
+    destination = np.asarray(destination, dtype=np.float64)
+    if source.shape != destination.shape:
+        raise ValueError(f"source shape {source.shape} does not match destination shape {destination.shape}")
+    fractions = path_fractions(num_waypoints, curve)[:, None]
+    if source.ndim == 2:
+        source = source[:, None, :]
+        destination = destination[:, None, :]
+    return source + fractions * (destination - source)
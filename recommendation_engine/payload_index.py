@@ -0,0 +1,85 @@
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+
+class PayloadIndex:
+    """Inverted index over one string column of the catalog, e.g. normalized artists or titles.
+
+    Values are factorized to an int32 code per row, and row numbers are grouped by code in one
+    sorted array with offsets per code. The rows holding a value are a slice, and a row's value
+    is one array lookup, so filters cost the rows they touch instead of a string compare per track.
+    Only the distinct values are kept as strings, a row costs its code whatever the value's length.
+    Values are matched as given, callers normalize them the same way as the column.
+    """
+
+    def __init__(self, values: Iterable[str]):
+        first_seen: Dict[str, int] = {}
+        codes = np.fromiter((first_seen.setdefault(value, len(first_seen)) for value in values), dtype=np.int32)
+        # codes follow the sorted values
+        self.values: List[str] = sorted(first_seen)
+        self._codes_by_value = {value: code for code, value in enumerate(self.values)}
+        sorted_codes = np.empty(len(first_seen), dtype=np.int32)
+        sorted_codes[list(first_seen.values())] = [self._codes_by_value[value] for value in first_seen]
+        self.codes = sorted_codes[codes]
+        self.rows = np.argsort(self.codes, kind="stable")
+        self.offsets = np.concatenate([[0], np.cumsum(np.bincount(self.codes, minlength=len(self.values)))])
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def value(self, row: int) -> str:
+        return self.values[self.codes[row]]
+
+    def lookup(self, values: Iterable[str]) -> np.ndarray:
+        """codes of the values present in the column, values not in it are dropped"""
+        codes = [self._codes_by_value[value] for value in values if value in self._codes_by_value]
+        return np.unique(np.array(codes, dtype=np.int32))
+
+    def rows_for(self, codes: Iterable[int]) -> np.ndarray:
+        """sorted rows holding any of the codes"""
+        slices = [self.rows[self.offsets[code]:self.offsets[code + 1]] for code in np.unique(np.asarray(list(codes)))]
+        if not slices:
+            return np.empty(0, dtype=np.int64)
+        return np.sort(np.concatenate(slices))
+
+    def mask(self, codes: Iterable[int], out: Optional[np.ndarray] = None) -> np.ndarray:
+        """boolean mask of rows holding any of the codes, set in out when given"""
+        mask = np.zeros(len(self), dtype=bool) if out is None else out
+        mask[self.rows_for(codes)] = True
+        return mask
+
+
+def first_distinct(rows: np.ndarray, k: int, distinct: Sequence[np.ndarray]) -> np.ndarray:
+    """positions of the first k rows whose code in every distinct column hasn't been taken by an earlier row"""
+    taken = [set() for _ in distinct]
+    chosen = []
+    for position, row in enumerate(rows.tolist()):
+        row_codes = [codes[row] for codes in distinct]
+        if any(code in seen for code, seen in zip(row_codes, taken)):
+            continue
+        for code, seen in zip(row_codes, taken):
+            seen.add(code)
+        chosen.append(position)
+        if len(chosen) == k:
+            break
+    return np.array(chosen, dtype=np.int64)
+
+
+def nearest_distinct(distances: np.ndarray, rows: np.ndarray, k: int, distinct: Sequence[np.ndarray]) -> np.ndarray:
+    """Positions of up to k finite distances, nearest first, whose rows are distinct in every distinct column.
+    Only a window of the nearest is sorted, widened until k distinct rows are found or nothing is left."""
+    window = min(len(distances), 2 * k)
+    while window:
+        if window < len(distances):
+            candidates = np.argpartition(distances, window - 1)[:window]
+        else:
+            candidates = np.arange(len(distances))
+        candidates = candidates[np.argsort(distances[candidates], kind="stable")]
+        candidates = candidates[np.isfinite(distances[candidates])]
+        chosen = candidates[first_distinct(rows[candidates], k, distinct)]
+        # an excluded (infinite) candidate in the window means every allowed one was already in it
+        if len(chosen) == k or len(candidates) < window or window == len(distances):
+            return chosen
+        window = min(len(distances), window * 4)
+    return np.empty(0, dtype=np.int64)
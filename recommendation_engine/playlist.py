@@ -1,61 +1,117 @@
 import spotipy
-from typing import List, Tuple
+from typing import Any, Callable, Dict, List, Optional
 
-from recommendation_engine.bookend_seeds_track_finder import BookendSeedsTrackFinder
+from recommendation_engine.bookend_seeds_track_finder import BookendSeedsTrackFinder, track_summary
 from recommendation_engine.mood_track_finder import MoodTrackFinder
+from utils.tracing import tracer
 
 
 SONG_MODE = "song"
 MOOD_MODE = "mood"
 
+# progress stages reported while a playlist is built, see also bookend_seeds_track_finder.SLOT_FILLED
+SOURCE_CHOSEN = "source_chosen"
+DESTINATION_CHOSEN = "destination_chosen"
+PLAYLIST_WRITTEN = "playlist_written"
+
 # TODO: move this to spotify service
+@tracer.traced("create_spotify_playlist")
 def _create_spotify_playlist(
-    sp: spotipy.Spotify, recommendation_uris: List[str], point_a_label: str, point_b_label: str
-) -> Tuple[str, str]:
-    user_id = sp.current_user()["id"]
+    sp: spotipy.Spotify,
+    recommendation_uris: List[str],
+    point_a_label: str,
+    point_b_label: str,
+    user_id: Optional[str] = None,
+) -> Dict[str, Optional[str]]:
+    """user_id saves a current_user() call when the caller already knows it (it's kept in the session)"""
+    if user_id is None:
+        user_id = sp.current_user()["id"]
     playlist_name = f"Wave Guide from {point_a_label} to {point_b_label}"
-    playlist_id = sp.user_playlist_create(user_id, playlist_name, public=False)["id"]
-    sp.playlist_add_items(playlist_id, recommendation_uris)
-    # TODO: speficy fields=
-    playlist_metadata = sp.user_playlist(user_id, playlist_id)  # , fields=["external_urls", "name", "images"])
+    # the create response is the full playlist object, so url and name come from it
+    created = sp.user_playlist_create(user_id, playlist_name, public=False)
+    sp.playlist_add_items(created["id"], recommendation_uris)
+    # spotify generates the mosaic cover asynchronously after items are added, so it's rarely there
+    # right away. the modal shows the logo and fetches it later with playlist_cover, off the write path
+    images = created.get("images") or []
     resp = {
-        "url": playlist_metadata["external_urls"]["spotify"],
-        "name": playlist_metadata["name"],
-        "image": playlist_metadata["images"][0]["url"],
+        "id": created["id"],
+        "url": created["external_urls"]["spotify"],
+        "name": created["name"],
+        "image": images[0]["url"] if images else None,
     }
     return resp
 
 
-def create_song_to_song_playlist(sp: spotipy.Spotify, seed_track_id: str, destination_track_id: str):
+@tracer.traced("playlist_cover")
+def playlist_cover(sp: spotipy.Spotify, playlist_id: str) -> Optional[str]:
+    """the playlist's cover url, None until spotify has generated it. only images is requested"""
+    images = sp.playlist(playlist_id, fields="images").get("images") or []
+    return images[0]["url"] if images else None
+
+
+def create_song_to_song_playlist(
+    sp: spotipy.Spotify,
+    seed_track_id: str,
+    destination_track_id: str,
+    progress: Optional[Callable[..., None]] = None,
+    user_id: Optional[str] = None,
+):
     # TODO: can we get this data from the initial search to avoid this call?
-    seed_track = sp.track(seed_track_id)
-    destination_track = sp.track(destination_track_id)
-    recommended_tracks = BookendSeedsTrackFinder(sp, seed_track, destination_track).recommend()
+    seed_track, destination_track = sp.tracks([seed_track_id, destination_track_id])["tracks"]
+    if progress is not None:
+        progress(SOURCE_CHOSEN, track=track_summary(seed_track))
+        progress(DESTINATION_CHOSEN, track=track_summary(destination_track))
+    recommended_tracks = BookendSeedsTrackFinder(sp, seed_track, destination_track).recommend(progress=progress)
     # TODO: remove this extra loop
     recommendation_uris = [track["uri"] for track in recommended_tracks]
-    return _create_spotify_playlist(sp, recommendation_uris, seed_track["name"], destination_track["name"])
+    resp = _create_spotify_playlist(
+        sp, recommendation_uris, seed_track["name"], destination_track["name"], user_id=user_id
+    )
+    if progress is not None:
+        progress(PLAYLIST_WRITTEN, playlist=resp)
+    return resp
 
-def create_playlist(request, sp: spotipy.Spotify, session):
+@tracer.traced("create_playlist")
+def create_playlist(
+    payload: Dict[str, Any],
+    sp: spotipy.Spotify,
+    session=None,
+    mood_pools=None,
+    top_artists_cache=None,
+    user_key=None,
+    progress: Optional[Callable[..., None]] = None,
+):
+    """builds a playlist for a validated /new_playlist/ payload.
+    session is optional so builds can run outside of a request, pass user_key for the shared caches instead."""
+    if user_key is None and session:
+        user_key = session.get("user_id")
+    finder_kwargs = {
+        "pools": mood_pools,
+        "top_artists_cache": top_artists_cache,
+        "user_key": user_key,
+    }
     # track to start the playlist
-    source_mode = request.json["source_mode"]
+    source_mode = payload["source_mode"]
     source_track_id = ""
     if source_mode == SONG_MODE:
-        source_track_id = request.json["seed_track_id"]
+        source_track_id = payload["seed_track_id"]
     elif source_mode == MOOD_MODE:
-        track_finder = MoodTrackFinder(sp, request.json["source_mood"], 1, session)
+        track_finder = MoodTrackFinder(sp, payload["source_mood"], 1, session, **finder_kwargs)
         source_track_id = track_finder.find()[0]["id"]
 
     # track to end the playlist
-    destination_mode = request.json["destination_mode"]
+    destination_mode = payload["destination_mode"]
     destination_track_id = ""
     if destination_mode == SONG_MODE:
-        destination_track_id = request.json["destination_track_id"]
+        destination_track_id = payload["destination_track_id"]
     elif destination_mode == MOOD_MODE:
-        track_finder = MoodTrackFinder(sp, request.json["destination_mood"], 2, session)
+        track_finder = MoodTrackFinder(sp, payload["destination_mood"], 2, session, **finder_kwargs)
         recs = track_finder.find()
         for rec in recs:
             if rec["id"] != source_track_id:
                 destination_track_id = rec["id"]
                 break
 
-    return create_song_to_song_playlist(sp, source_track_id, destination_track_id)
\ No newline at end of file
+    return create_song_to_song_playlist(
+        sp, source_track_id, destination_track_id, progress=progress, user_id=user_key
+    )
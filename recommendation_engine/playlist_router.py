@@ -0,0 +1,138 @@
+from dataclasses import dataclass
+from typing import List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from recommendation_engine.mood_track_finder import MOOD_CALM, MOOD_ENERGIZED, MOOD_HAPPY, SUPPORTED_MOODS
+from recommendation_engine.path_planner import LINEAR, plan_waypoints
+from recommendation_engine.payload_index import PayloadIndex
+from recommendation_engine.vector_index import FEATURE_NAMES
+
+# AcousticBrainz feature targets for each mood, features not listed sit at 0.5
+MOOD_FEATURES = {
+    MOOD_HAPPY: {"happy": 0.9, "party": 0.7, "danceable": 0.7, "sad": 0.1, "aggressive": 0.1},
+    MOOD_ENERGIZED: {"party": 0.8, "danceable": 0.8, "aggressive": 0.6, "relaxed": 0.1, "electronic": 0.7},
+    MOOD_CALM: {"relaxed": 0.9, "acoustic": 0.8, "aggressive": 0.0, "party": 0.1, "danceable": 0.2},
+}
+
+# a waypoint is a catalog row, a mood name or a raw feature vector
+Waypoint = Union[int, str, Sequence[float]]
+
+
+def mood_vector(mood: str) -> np.ndarray:
+    mood = mood.lower()
+    if mood not in SUPPORTED_MOODS:
+        raise ValueError(f"Unknown mood: {mood} provided. Supported moods include {SUPPORTED_MOODS}")
+    return np.array([MOOD_FEATURES[mood].get(feature, 0.5) for feature in FEATURE_NAMES], dtype=np.float32)
+
+
+@dataclass
+class PlaylistRouter:
+    """Builds a playlist through any number of waypoints over a local track catalog.
+
+    Every slot gets a candidate pool from one batched k-NN query over the planned path,
+    then a beam search picks the sequence with the lowest total transition distance
+    (plus distance from each slot's target) while keeping artists and titles unique.
+    The query excludes the waypoint tracks' artists and titles and returns pools with
+    distinct artists and titles, sized so every slot can be filled without a repeat.
+
+    index is an ExactTrackIndex or IVFTrackIndex built over vectors, artist_index and title_index
+    are PayloadIndexes of the normalized columns in the same row order, e.g. the ExactTrackIndex's own.
+    """
+
+    index: object
+    vectors: np.ndarray
+    artist_index: PayloadIndex
+    title_index: PayloadIndex
+    pool_size: int = 16
+    beam_width: int = 32
+    # how much straying from a slot's planned target costs relative to transitions
+    target_weight: float = 1.0
+
+    def route(self, waypoints: List[Waypoint], slots_per_leg: int, curve: str = LINEAR) -> List[int]:
+        """returns catalog rows for the playlist, fixed track waypoints included"""
+        if len(waypoints) < 2:
+            raise ValueError("route requires at least two waypoints")
+        stops = np.stack([self._waypoint_vector(waypoint) for waypoint in waypoints])
+        leg_targets = plan_waypoints(stops[:-1], stops[1:], slots_per_leg, curve=curve)
+
+        # positions alternate stop, slots, stop, slots ... stop
+        # fixed rows are track waypoints, every other position is filled from a candidate pool
+        targets = []
+        fixed_rows: List[Optional[int]] = []
+        for leg, waypoint in enumerate(waypoints):
+            targets.append(stops[leg])
+            fixed_rows.append(int(waypoint) if self._is_row(waypoint) else None)
+            if leg < len(leg_targets):
+                targets.extend(leg_targets[leg])
+                fixed_rows.extend([None] * slots_per_leg)
+        targets = np.stack(targets)
+
+        exclude = self._exclusion_mask([row for row in fixed_rows if row is not None])
+        open_positions = [position for position, row in enumerate(fixed_rows) if row is None]
+        candidates_per_position = {}
+        if open_positions:
+            # a chosen track rules out at most one artist and one title of a distinct pool,
+            # so 2 * (open slots - 1) + 1 candidates always leave one for every slot
+            pool_size = max(self.pool_size, 2 * len(open_positions) - 1)
+            # one batched query fills every slot's pool
+            pools, _ = self.index.search(
+                targets[open_positions],
+                k=pool_size,
+                exclude=exclude,
+                distinct=(self.artist_index.codes, self.title_index.codes),
+            )
+            for position, pool in zip(open_positions, pools):
+                candidates_per_position[position] = pool[pool >= 0]
+        return self._beam_search(targets, fixed_rows, candidates_per_position)
+
+    @staticmethod
+    def _is_row(waypoint: Waypoint) -> bool:
+        return isinstance(waypoint, (int, np.integer))
+
+    def _waypoint_vector(self, waypoint: Waypoint) -> np.ndarray:
+        if self._is_row(waypoint):
+            return np.asarray(self.vectors[waypoint], dtype=np.float32)
+        if isinstance(waypoint, str):
+            return mood_vector(waypoint)
+        return np.asarray(waypoint, dtype=np.float32)
+
+    def _exclusion_mask(self, rows: List[int]) -> np.ndarray:
+        mask = self.artist_index.mask(self.artist_index.codes[rows])
+        return self.title_index.mask(self.title_index.codes[rows], out=mask)
+
+    def _beam_search(self, targets: np.ndarray, fixed_rows: List[Optional[int]], candidates_per_position) -> List[int]:
+        # beam entries are (cost, rows, used artist codes, used title codes)
+        artist_codes, title_codes = self.artist_index.codes, self.title_index.codes
+        used_artists = frozenset(int(artist_codes[row]) for row in fixed_rows if row is not None)
+        used_titles = frozenset(int(title_codes[row]) for row in fixed_rows if row is not None)
+        beam: List[Tuple[float, List[int], frozenset, frozenset]] = [(0.0, [], used_artists, used_titles)]
+
+        for position, fixed_row in enumerate(fixed_rows):
+            candidates = np.array([fixed_row]) if fixed_row is not None else candidates_per_position[position]
+            if len(candidates) == 0:
+                # nothing left to choose from, leave the slot out rather than repeat a track
+                continue
+            candidate_vectors = np.asarray(self.vectors[candidates], dtype=np.float32)
+            target_costs = self.target_weight * np.linalg.norm(candidate_vectors - targets[position], axis=1)
+            if beam[0][1]:
+                previous_vectors = np.asarray(self.vectors[[rows[-1] for _, rows, _, _ in beam]], dtype=np.float32)
+                transition_costs = np.linalg.norm(previous_vectors[:, None, :] - candidate_vectors[None, :, :], axis=2)
+            else:
+                transition_costs = np.zeros((len(beam), len(candidates)), dtype=np.float32)
+            costs = np.array([cost for cost, _, _, _ in beam])[:, None] + transition_costs + target_costs[None, :]
+
+            next_beam = []
+            for flat in np.argsort(costs, axis=None, kind="stable"):
+                beam_number, candidate_number = divmod(int(flat), len(candidates))
+                _, rows, artists, titles = beam[beam_number]
+                row = int(candidates[candidate_number])
+                artist, title = int(artist_codes[row]), int(title_codes[row])
+                if fixed_row is None and (artist in artists or title in titles or row in rows):
+                    continue
+                next_beam.append((float(costs[beam_number, candidate_number]), rows + [row], artists | {artist}, titles | {title}))
+                if len(next_beam) == self.beam_width:
+                    break
+            if next_beam:
+                beam = next_beam
+        return beam[0][1]
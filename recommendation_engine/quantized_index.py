@@ -0,0 +1,293 @@
+import json
+from pathlib import Path
+from typing import List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from recommendation_engine.ann_index import _assign, _normalize, _squared_distances, train_kmeans
+from recommendation_engine.payload_index import nearest_distinct
+from recommendation_engine.track_catalog import UINT8, dequantize, quantize
+from recommendation_engine.vector_index import COSINE, EUCLIDEAN, SUPPORTED_METRICS
+
+SCALAR = "scalar"
+PRODUCT = "product"
+SUPPORTED_QUANTIZERS = [SCALAR, PRODUCT]
+# codes scored per kernel call, bounds the decoded chunk and the (queries, rows) distance matrix
+SCAN_CHUNK_SIZE = 65536
+# one byte per product quantizer code
+PQ_CENTROIDS = 256
+DEFAULT_PQ_SUBSPACES = 6
+# candidates per result re-ranked with exact vectors, product codes are coarser than scalar ones
+DEFAULT_RERANK_FACTOR = {SCALAR: 4, PRODUCT: 16}
+
+
+class ScalarQuantizer:
+    """One byte per feature over the fixed [0, 1] range, the same encoding as UINT8 catalog vectors.
+    Features are non negative, so unit normalized vectors for cosine are in range as well."""
+
+    kind = SCALAR
+
+    def __init__(self, num_features: int):
+        self.num_features = num_features
+
+    @property
+    def code_size(self) -> int:
+        return self.num_features
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        return quantize(vectors, UINT8)
+
+    def decode(self, codes: np.ndarray) -> np.ndarray:
+        return dequantize(codes)
+
+    def prepare_queries(self, queries: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        return queries, np.einsum("ij,ij->i", queries, queries)
+
+    def scan(self, prepared: Tuple[np.ndarray, np.ndarray], codes: np.ndarray) -> np.ndarray:
+        """(num_queries, num_codes) squared distances, the chunk is decoded to float32 for one matrix product"""
+        queries, query_squared_norms = prepared
+        points = self.decode(codes)
+        # in place, the (queries, codes) matrix is the largest allocation of a search
+        squared = queries @ points.T
+        squared *= -2.0
+        squared += query_squared_norms[:, None]
+        squared += np.einsum("ij,ij->i", points, points)[None, :]
+        return np.maximum(squared, 0.0, out=squared)
+
+
+class ProductQuantizer:
+    """Splits the features into subspaces and stores the nearest of 256 trained centroids per subspace as a byte.
+
+    Codes are scored with asymmetric distance computation: queries stay float, and a code's distance
+    is the sum of one lookup per subspace into a table of query to centroid distances built once per query.
+    """
+
+    kind = PRODUCT
+
+    def __init__(self, codebooks: List[np.ndarray]):
+        self.codebooks = [np.ascontiguousarray(codebook, dtype=np.float32) for codebook in codebooks]
+        self.bounds = np.cumsum([0] + [codebook.shape[1] for codebook in self.codebooks]).tolist()
+
+    @classmethod
+    def train(
+        cls, vectors: np.ndarray, num_subspaces: int = DEFAULT_PQ_SUBSPACES, iterations: int = 20, seed: int = 0
+    ) -> "ProductQuantizer":
+        num_centroids = min(PQ_CENTROIDS, len(vectors))
+        subspaces = np.array_split(np.arange(vectors.shape[1]), num_subspaces)
+        return cls(
+            [
+                train_kmeans(np.ascontiguousarray(vectors[:, dims]), num_centroids, iterations=iterations, seed=seed)
+                for dims in subspaces
+            ]
+        )
+
+    @property
+    def code_size(self) -> int:
+        return len(self.codebooks)
+
+    def _subspaces(self, vectors: np.ndarray):
+        for codebook, start, end in zip(self.codebooks, self.bounds[:-1], self.bounds[1:]):
+            yield codebook, np.ascontiguousarray(vectors[:, start:end])
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        codes = np.empty((len(vectors), self.code_size), dtype=np.uint8)
+        for subspace, (codebook, part) in enumerate(self._subspaces(vectors)):
+            codes[:, subspace] = _assign(part, codebook)
+        return codes
+
+    def decode(self, codes: np.ndarray) -> np.ndarray:
+        return np.hstack([codebook[codes[:, subspace]] for subspace, codebook in enumerate(self.codebooks)])
+
+    def prepare_queries(self, queries: np.ndarray) -> List[np.ndarray]:
+        """per subspace (num_queries, num_centroids) squared distance tables"""
+        return [_squared_distances(part, codebook) for codebook, part in self._subspaces(queries)]
+
+    def scan(self, tables: List[np.ndarray], codes: np.ndarray) -> np.ndarray:
+        distances = np.zeros((tables[0].shape[0], len(codes)), dtype=np.float32)
+        # np.take along a contiguous row of codes per subspace is several times faster than fancy indexing columns
+        codes = np.ascontiguousarray(codes.T)
+        for subspace, table in enumerate(tables):
+            distances += np.take(table, codes[subspace], axis=1)
+        return distances
+
+
+Quantizer = Union[ScalarQuantizer, ProductQuantizer]
+
+
+class QuantizedTrackIndex:
+    """Nearest neighbour search over quantized track vectors, with the same contract as ExactTrackIndex.search.
+
+    Only the codes are held in memory: 11 bytes per track with scalar quantization and one byte
+    per subspace with product quantization, against 44 for float32 vectors. Search scans every code
+    in chunks, then re-ranks the closest rerank_factor * k candidates per query against
+    rerank_vectors when given. Pass a float32 TrackCatalog memmap there, only candidate rows are read.
+    """
+
+    def __init__(
+        self,
+        quantizer: Quantizer,
+        codes: np.ndarray,
+        metric: str = COSINE,
+        rerank_vectors: Optional[np.ndarray] = None,
+        rerank_factor: Optional[int] = None,
+    ):
+        if metric not in SUPPORTED_METRICS:
+            raise ValueError(f"Unknown metric: {metric}. Supported metrics include {SUPPORTED_METRICS}")
+        self.quantizer = quantizer
+        self.codes = codes
+        self.metric = metric
+        self.rerank_vectors = rerank_vectors
+        self.rerank_factor = rerank_factor or DEFAULT_RERANK_FACTOR[quantizer.kind]
+
+    @classmethod
+    def build(
+        cls,
+        vectors: np.ndarray,
+        quantizer: str = SCALAR,
+        metric: str = COSINE,
+        num_subspaces: int = DEFAULT_PQ_SUBSPACES,
+        rerank: bool = True,
+        rerank_factor: Optional[int] = None,
+        train_size: int = 100_000,
+        iterations: int = 20,
+        seed: int = 0,
+    ) -> "QuantizedTrackIndex":
+        """Encodes vectors in chunks, so a memmap is never loaded whole. vectors may be stored quantized
+        like TrackCatalog.raw_vectors. With rerank the index keeps a reference to vectors for the re-rank."""
+        if quantizer not in SUPPORTED_QUANTIZERS:
+            raise ValueError(f"Unknown quantizer: {quantizer}. Supported quantizers include {SUPPORTED_QUANTIZERS}")
+        if quantizer == SCALAR:
+            trained = ScalarQuantizer(vectors.shape[1])
+        else:
+            rng = np.random.default_rng(seed)
+            sample = np.sort(rng.choice(len(vectors), size=min(train_size, len(vectors)), replace=False))
+            training = cls._prepare(dequantize(np.asarray(vectors[sample])), metric)
+            trained = ProductQuantizer.train(training, num_subspaces, iterations=iterations, seed=seed)
+        codes = np.empty((len(vectors), trained.code_size), dtype=np.uint8)
+        for start in range(0, len(vectors), SCAN_CHUNK_SIZE):
+            chunk = cls._prepare(dequantize(np.asarray(vectors[start:start + SCAN_CHUNK_SIZE])), metric)
+            codes[start:start + len(chunk)] = trained.encode(chunk)
+        return cls(trained, codes, metric=metric, rerank_vectors=vectors if rerank else None, rerank_factor=rerank_factor)
+
+    @classmethod
+    def from_catalog(cls, catalog, quantizer: str = SCALAR, metric: str = COSINE, **build_kwargs) -> "QuantizedTrackIndex":
+        """Row numbers match the catalog rows. A uint8 catalog searched with the euclidean metric is used
+        as scalar codes as is, otherwise the catalog vectors are encoded and, when stored as float32, re-ranked."""
+        if quantizer == SCALAR and metric == EUCLIDEAN and catalog.raw_vectors.dtype == np.uint8:
+            return cls(ScalarQuantizer(catalog.raw_vectors.shape[1]), catalog.raw_vectors, metric=metric)
+        build_kwargs.setdefault("rerank", catalog.raw_vectors.dtype == np.float32)
+        return cls.build(catalog.raw_vectors, quantizer=quantizer, metric=metric, **build_kwargs)
+
+    @staticmethod
+    def _prepare(vectors: np.ndarray, metric: str) -> np.ndarray:
+        # cosine ranks like euclidean on unit vectors, so codes are of normalized vectors
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        return _normalize(vectors) if metric == COSINE else vectors
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    @property
+    def nbytes(self) -> int:
+        """memory held by the codes and codebooks, rerank_vectors belong to the caller"""
+        codebooks = getattr(self.quantizer, "codebooks", [])
+        return self.codes.nbytes + sum(codebook.nbytes for codebook in codebooks)
+
+    def _to_distance(self, squared: np.ndarray) -> np.ndarray:
+        if self.metric == COSINE:
+            # ||a - b||^2 = 2 - 2cos for unit vectors
+            return squared / 2.0
+        return np.sqrt(squared)
+
+    def _scan(self, queries: np.ndarray, count: int, exclude: Optional[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+        """the count closest rows per query by code distance, unsorted"""
+        state = self.quantizer.prepare_queries(queries)
+        best_rows = np.empty((len(queries), 0), dtype=np.int64)
+        best_squared = np.empty((len(queries), 0), dtype=np.float32)
+        for start in range(0, len(self), SCAN_CHUNK_SIZE):
+            squared = self.quantizer.scan(state, self.codes[start:start + SCAN_CHUNK_SIZE])
+            if exclude is not None:
+                squared = np.where(exclude[..., start:start + squared.shape[1]], np.inf, squared)
+            # narrow the chunk down before merging, so only small arrays are copied
+            if squared.shape[1] > count:
+                rows = np.argpartition(squared, count - 1, axis=1)[:, :count]
+                squared = np.take_along_axis(squared, rows, axis=1)
+                rows += start
+            else:
+                rows = np.broadcast_to(np.arange(start, start + squared.shape[1]), squared.shape)
+            best_squared = np.concatenate([best_squared, squared], axis=1)
+            best_rows = np.concatenate([best_rows, rows], axis=1)
+            if best_squared.shape[1] > count:
+                keep = np.argpartition(best_squared, count - 1, axis=1)[:, :count]
+                best_squared = np.take_along_axis(best_squared, keep, axis=1)
+                best_rows = np.take_along_axis(best_rows, keep, axis=1)
+        return best_rows, best_squared
+
+    def search(
+        self,
+        queries: np.ndarray,
+        k: int,
+        exclude: Optional[np.ndarray] = None,
+        rerank_factor: Optional[int] = None,
+        distinct: Sequence[np.ndarray] = (),
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Finds the k nearest tracks for each query vector, see ExactTrackIndex.search.
+        Distances are exact for re-ranked results and approximate otherwise.
+        With distinct, candidates are scanned again with a wider window when too few distinct tracks were found."""
+        queries = self._prepare(np.atleast_2d(queries), self.metric)
+        rerank = self.rerank_vectors is not None
+        widen = rerank or bool(distinct)
+        num_candidates = min(len(self), k * (rerank_factor or self.rerank_factor) if widen else k)
+        result_indices = np.full((len(queries), k), -1, dtype=np.int64)
+        result_distances = np.full((len(queries), k), np.inf, dtype=np.float32)
+        while num_candidates:
+            candidates, squared = self._scan(queries, num_candidates, exclude)
+            short = False
+            for query_number, query in enumerate(queries):
+                found = np.isfinite(squared[query_number])
+                rows = candidates[query_number][found]
+                query_squared = squared[query_number][found]
+                if rerank and len(rows):
+                    # sorted rows read a memmap front to back
+                    rows = np.sort(rows)
+                    exact = self._prepare(dequantize(np.asarray(self.rerank_vectors[rows])), self.metric)
+                    query_squared = _squared_distances(query[None, :], exact)[0]
+                if distinct:
+                    nearest = nearest_distinct(query_squared, rows, k, distinct)
+                    # a full window may hide distinct tracks further out, a window with excluded rows can't
+                    short |= len(nearest) < k and len(rows) == num_candidates
+                else:
+                    nearest = np.argsort(query_squared, kind="stable")[:min(k, len(rows))]
+                result_indices[query_number, :len(nearest)] = rows[nearest]
+                result_distances[query_number, :len(nearest)] = self._to_distance(query_squared[nearest])
+            if not short or num_candidates == len(self):
+                break
+            num_candidates = min(len(self), num_candidates * 4)
+        return result_indices, result_distances
+
+    def save(self, directory: str):
+        """writes .npy files that load() can memory map, rerank vectors are not saved"""
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        np.save(directory / "codes.npy", self.codes)
+        meta = {"quantizer": self.quantizer.kind, "metric": self.metric, "rerank_factor": self.rerank_factor}
+        if self.quantizer.kind == SCALAR:
+            meta["num_features"] = self.quantizer.num_features
+        else:
+            np.savez(directory / "codebooks.npz", *self.quantizer.codebooks)
+        with open(directory / "meta.json", "w") as f:
+            json.dump(meta, f)
+
+    @classmethod
+    def load(cls, directory: str, rerank_vectors: Optional[np.ndarray] = None, mmap: bool = True) -> "QuantizedTrackIndex":
+        directory = Path(directory)
+        with open(directory / "meta.json") as f:
+            meta = json.load(f)
+        if meta["quantizer"] == SCALAR:
+            quantizer = ScalarQuantizer(meta["num_features"])
+        else:
+            with np.load(directory / "codebooks.npz") as codebooks:
+                quantizer = ProductQuantizer([codebooks[f"arr_{i}"] for i in range(len(codebooks.files))])
+        codes = np.load(directory / "codes.npy", mmap_mode="r" if mmap else None)
+        return cls(quantizer, codes, metric=meta["metric"], rerank_vectors=rerank_vectors, rerank_factor=meta["rerank_factor"])
@@ -0,0 +1,106 @@
+import contextvars
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+logger = logging.getLogger(__name__)
+
+TTL_SECONDS = 60 * 60
+# stale entries are still served (and refreshed in the background) for this long
+STALE_TTL_SECONDS = 24 * 60 * 60
+# least recently used users are dropped past this, a long lived worker sees an unbounded number of users
+DEFAULT_MAX_ENTRIES = 10_000
+
+_MISSING = object()
+
+
+class TopArtistsCache:
+    """Per user top artists shared by every MoodTrackFinder in the worker.
+
+    Entries younger than ttl_seconds are served as is. Entries up to stale_ttl_seconds old are
+    served immediately while one background refresh per user replaces them (stale-while-revalidate).
+    Anything older is fetched inline. At most max_entries users are kept, least recently used first out.
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: float = TTL_SECONDS,
+        stale_ttl_seconds: float = STALE_TTL_SECONDS,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.stale_ttl_seconds = stale_ttl_seconds
+        self.clock = clock
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._refreshing = set()
+        self._lock = threading.Lock()
+
+    def get(self, user_key: Hashable, fetch: Callable[[], Any]) -> Any:
+        now = self.clock()
+        with self._lock:
+            fetched_at, value = self._entries.get(user_key, (None, _MISSING))
+            age = None if fetched_at is None else now - fetched_at
+            if fetched_at is not None:
+                self._entries.move_to_end(user_key)
+            if age is not None and age < self.ttl_seconds:
+                self.hits += 1
+                return value
+            if age is not None and age < self.stale_ttl_seconds:
+                self.stale_hits += 1
+                refresh = user_key not in self._refreshing
+                if refresh:
+                    self._refreshing.add(user_key)
+            else:
+                self.misses += 1
+                refresh = None
+        if refresh is None:
+            value = fetch()
+            self.set(user_key, value)
+        elif refresh:
+            # copy the context so flask's request context (and the session token cache) is visible to the refresh
+            threading.Thread(
+                target=contextvars.copy_context().run, args=(self._refresh, user_key, fetch), daemon=True
+            ).start()
+        return value
+
+    def set(self, user_key: Hashable, value: Any):
+        with self._lock:
+            self._entries[user_key] = (self.clock(), value)
+            self._entries.move_to_end(user_key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def _refresh(self, user_key: Hashable, fetch: Callable[[], Any]):
+        try:
+            self.set(user_key, fetch())
+        except Exception:
+            logger.exception(f"failed to refresh top artists for {user_key}")
+        finally:
+            with self._lock:
+                self._refreshing.discard(user_key)
+
+    def evict_expired(self):
+        now = self.clock()
+        with self._lock:
+            for user_key in [k for k, (fetched_at, _) in self._entries.items() if now - fetched_at >= self.stale_ttl_seconds]:
+                del self._entries[user_key]
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.stale_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": (self.hits + self.stale_hits) / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,172 @@
+import json
+from pathlib import Path
+from typing import Any, Dict, Iterable, List
+
+import numpy as np
+
+from recommendation_engine.vector_index import FEATURE_NAMES
+
+FORMAT_VERSION = 1
+FLOAT32 = "float32"
+FLOAT16 = "float16"
+# features are probabilities in [0, 1] so they quantize to a byte with 1/255 resolution
+UINT8 = "uint8"
+SUPPORTED_VECTOR_DTYPES = [FLOAT32, FLOAT16, UINT8]
+# musicbrainz ids are 36 character uuids
+ID_WIDTH = 36
+ID_COLUMNS = ["musicbrainz_recordingid", "musicbrainz_artistid"]
+STRING_COLUMNS = ["title", "artist", "album"]
+
+
+def quantize(vectors: np.ndarray, vector_dtype: str) -> np.ndarray:
+    if vector_dtype == UINT8:
+        return np.rint(np.clip(vectors, 0.0, 1.0) * 255).astype(np.uint8)
+    return vectors.astype(vector_dtype)
+
+
+def dequantize(vectors: np.ndarray) -> np.ndarray:
+    if vectors.dtype == np.uint8:
+        return vectors.astype(np.float32) / 255
+    return vectors.astype(np.float32)
+
+
+class TrackCatalogWriter:
+    """Appends batches of ingest_json style track dicts to a catalog directory.
+
+    Layout, every column in track order:
+        meta.json                       counts and dtypes
+        vectors.bin                     (num_tracks, 11) features as float32, float16 or uint8
+        <id column>.bin                 fixed width ascii musicbrainz ids
+        <string column>.offsets.bin     uint64 start of each string, num_tracks + 1 entries
+        <string column>.strings.bin     utf-8 bytes of every string back to back
+    """
+
+    def __init__(self, directory: str, vector_dtype: str = FLOAT32):
+        if vector_dtype not in SUPPORTED_VECTOR_DTYPES:
+            raise ValueError(f"Unknown vector dtype: {vector_dtype}. Supported dtypes include {SUPPORTED_VECTOR_DTYPES}")
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        # the columns are truncated below, an old meta.json would open them with the old counts
+        (self.directory / "meta.json").unlink(missing_ok=True)
+        self.vector_dtype = vector_dtype
+        self.num_tracks = 0
+        self._files = {"vectors": open(self.directory / "vectors.bin", "wb")}
+        for column in ID_COLUMNS:
+            self._files[column] = open(self.directory / f"{column}.bin", "wb")
+        self._string_sizes = {}
+        for column in STRING_COLUMNS:
+            self._files[f"{column}.offsets"] = open(self.directory / f"{column}.offsets.bin", "wb")
+            self._files[f"{column}.strings"] = open(self.directory / f"{column}.strings.bin", "wb")
+            self._files[f"{column}.offsets"].write(np.zeros(1, dtype=np.uint64).tobytes())
+            self._string_sizes[column] = 0
+
+    def __enter__(self) -> "TrackCatalogWriter":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close(complete=exc_type is None)
+
+    def write_batch(self, tracks: List[Dict[str, Any]]):
+        if not tracks:
+            return
+        vectors = np.array([[track[feature] for feature in FEATURE_NAMES] for track in tracks], dtype=np.float32)
+        self._files["vectors"].write(quantize(vectors, self.vector_dtype).tobytes())
+        for column in ID_COLUMNS:
+            ids = np.array([track.get(column, "") for track in tracks], dtype=f"S{ID_WIDTH}")
+            self._files[column].write(ids.tobytes())
+        for column in STRING_COLUMNS:
+            encoded = [track.get(column, "").encode("utf-8") for track in tracks]
+            offsets = self._string_sizes[column] + np.cumsum([len(value) for value in encoded], dtype=np.uint64)
+            self._files[f"{column}.strings"].write(b"".join(encoded))
+            self._files[f"{column}.offsets"].write(offsets.tobytes())
+            self._string_sizes[column] = int(offsets[-1])
+        self.num_tracks += len(tracks)
+
+    def close(self, complete: bool = True):
+        """complete=False closes the files without writing meta.json, the catalog then can't be opened"""
+        for f in self._files.values():
+            f.close()
+        if not complete:
+            return
+        meta = {
+            "version": FORMAT_VERSION,
+            "num_tracks": self.num_tracks,
+            "features": FEATURE_NAMES,
+            "vector_dtype": self.vector_dtype,
+        }
+        # written last and renamed into place so a half written catalog can't be opened
+        tmp_path = self.directory / "meta.json.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(meta, f)
+        tmp_path.replace(self.directory / "meta.json")
+
+
+def write_catalog(directory: str, batches: Iterable[List[Dict[str, Any]]], vector_dtype: str = FLOAT32) -> int:
+    """writes batches (e.g. from stream_archives) to a catalog and returns the number of tracks"""
+    with TrackCatalogWriter(directory, vector_dtype) as writer:
+        for batch in batches:
+            writer.write_batch(batch)
+    return writer.num_tracks
+
+
+class TrackCatalog:
+    """Read only view of a catalog directory.
+
+    Every column is a numpy.memmap, so opening is instant and gunicorn workers
+    on the same host share one copy of the data through the page cache.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = Path(directory)
+        with open(self.directory / "meta.json") as f:
+            self.meta = json.load(f)
+        if self.meta["version"] != FORMAT_VERSION:
+            raise ValueError(f"Unsupported catalog version: {self.meta['version']}")
+        if self.meta["features"] != FEATURE_NAMES:
+            raise ValueError(f"Catalog features {self.meta['features']} do not match {FEATURE_NAMES}")
+        self.num_tracks = self.meta["num_tracks"]
+        self.raw_vectors = self._memmap("vectors.bin", self.meta["vector_dtype"], (self.num_tracks, len(FEATURE_NAMES)))
+        self._ids = {column: self._memmap(f"{column}.bin", f"S{ID_WIDTH}", (self.num_tracks,)) for column in ID_COLUMNS}
+        self._offsets = {}
+        self._strings = {}
+        for column in STRING_COLUMNS:
+            self._offsets[column] = self._memmap(f"{column}.offsets.bin", np.uint64, (self.num_tracks + 1,))
+            self._strings[column] = self._memmap(f"{column}.strings.bin", np.uint8, None)
+
+    def _memmap(self, file_name: str, dtype, shape) -> np.ndarray:
+        path = self.directory / file_name
+        # numpy can't memory map empty files
+        if path.stat().st_size == 0:
+            return np.empty(shape if shape is not None else 0, dtype=dtype)
+        return np.memmap(path, dtype=dtype, mode="r", shape=shape)
+
+    def __len__(self) -> int:
+        return self.num_tracks
+
+    def vectors(self) -> np.ndarray:
+        """float32 features, the memmap itself when stored as float32 otherwise a decoded copy"""
+        if self.raw_vectors.dtype == np.float32:
+            return self.raw_vectors
+        return dequantize(self.raw_vectors)
+
+    def id_value(self, column: str, row: int) -> str:
+        return self._ids[column][row].decode("ascii")
+
+    def string_value(self, column: str, row: int) -> str:
+        start, end = self._offsets[column][row], self._offsets[column][row + 1]
+        return self._strings[column][start:end].tobytes().decode("utf-8")
+
+    def column(self, column: str) -> List[str]:
+        """every value of an id or string column, decoded"""
+        if column in self._ids:
+            return [value.decode("ascii") for value in self._ids[column]]
+        blob = self._strings[column].tobytes()
+        offsets = self._offsets[column].tolist()
+        return [blob[start:end].decode("utf-8") for start, end in zip(offsets[:-1], offsets[1:])]
+
+    def track(self, row: int) -> Dict[str, Any]:
+        """rebuilds the ingest_json style dict for one row"""
+        track = {column: self.id_value(column, row) for column in ID_COLUMNS}
+        track.update({column: self.string_value(column, row) for column in STRING_COLUMNS})
+        track.update(zip(FEATURE_NAMES, dequantize(self.raw_vectors[row:row + 1])[0].tolist()))
+        return track
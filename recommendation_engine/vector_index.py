@@ -0,0 +1,154 @@
+import numpy as np
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from recommendation_engine.payload_index import PayloadIndex, nearest_distinct
+
+# AcousticBrainz high level features produced by scripts/get_acoustic_brainz_data.ingest_json
+# order matches the vectors pushed to qdrant in scripts/qdrant_playground.py
+FEATURE_NAMES = [
+    "acoustic",
+    "aggressive",
+    "danceable",
+    "dark",
+    "electronic",
+    "happy",
+    "party",
+    "relaxed",
+    "sad",
+    "tonal",
+    "voice",
+]
+COSINE = "cosine"
+EUCLIDEAN = "euclidean"
+SUPPORTED_METRICS = [COSINE, EUCLIDEAN]
+
+
+def track_vectors(tracks: List[Dict[str, Any]]) -> np.ndarray:
+    """stacks ingest_json track dicts into a contiguous (num_tracks, num_features) float32 matrix"""
+    return np.array([[track[feature] for feature in FEATURE_NAMES] for track in tracks], dtype=np.float32).reshape(
+        len(tracks), len(FEATURE_NAMES)
+    )
+
+
+def normalize_text(text: str) -> str:
+    return " ".join(text.lower().split())
+
+
+class ExactTrackIndex:
+    """Brute force nearest neighbour search over track vectors with batched matrix ops.
+
+    Results are row numbers into the vectors the index was built from, so callers
+    keep metadata in the same order (e.g. the ingest_json list or a catalog).
+    """
+
+    def __init__(
+        self,
+        vectors: np.ndarray,
+        metric: str = COSINE,
+        artists: Optional[Iterable[str]] = None,
+        titles: Optional[Iterable[str]] = None,
+    ):
+        if metric not in SUPPORTED_METRICS:
+            raise ValueError(f"Unknown metric: {metric}. Supported metrics include {SUPPORTED_METRICS}")
+        self.metric = metric
+        self.vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        if metric == COSINE:
+            norms = np.linalg.norm(self.vectors, axis=1, keepdims=True)
+            self._search_vectors = self.vectors / np.maximum(norms, np.finfo(np.float32).tiny)
+        else:
+            self._search_vectors = self.vectors
+            self._squared_norms = np.einsum("ij,ij->i", self.vectors, self.vectors)
+        # normalized metadata for exclusion masks, a code per track, share these rather than rebuilding them
+        self.artist_index = PayloadIndex(map(normalize_text, artists)) if artists is not None else None
+        self.title_index = PayloadIndex(map(normalize_text, titles)) if titles is not None else None
+
+    @classmethod
+    def from_tracks(cls, tracks: List[Dict[str, Any]], metric: str = COSINE) -> "ExactTrackIndex":
+        return cls(
+            track_vectors(tracks),
+            metric=metric,
+            artists=[track["artist"] for track in tracks],
+            titles=[track["title"] for track in tracks],
+        )
+
+    @classmethod
+    def from_catalog(cls, catalog, metric: str = COSINE) -> "ExactTrackIndex":
+        """builds the index over a TrackCatalog, row numbers match the catalog rows"""
+        return cls(catalog.vectors(), metric=metric, artists=catalog.column("artist"), titles=catalog.column("title"))
+
+    def __len__(self) -> int:
+        return self.vectors.shape[0]
+
+    def distances(self, queries: np.ndarray) -> np.ndarray:
+        """(num_queries, num_tracks) distances, smaller is closer"""
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        if self.metric == COSINE:
+            query_norms = np.linalg.norm(queries, axis=1, keepdims=True)
+            queries = queries / np.maximum(query_norms, np.finfo(np.float32).tiny)
+            return 1.0 - queries @ self._search_vectors.T
+        query_squared_norms = np.einsum("ij,ij->i", queries, queries)[:, None]
+        squared = query_squared_norms - 2.0 * (queries @ self._search_vectors.T) + self._squared_norms[None, :]
+        return np.sqrt(np.maximum(squared, 0.0))
+
+    def search(
+        self,
+        queries: np.ndarray,
+        k: int,
+        exclude: Optional[np.ndarray] = None,
+        distinct: Sequence[np.ndarray] = (),
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Finds the k nearest tracks for each query vector.
+
+        queries is a single vector or a (num_queries, num_features) matrix.
+        exclude is a boolean mask over tracks, either shared (num_tracks,) or per query (num_queries, num_tracks).
+        distinct are per track codes, e.g. PayloadIndex.codes of artists, each query's results
+        hold at most one track per code of every column.
+        Returns (indices, distances) of shape (num_queries, k) sorted nearest first.
+        Slots that can't be filled because too many tracks were excluded hold index -1 and distance inf.
+        """
+        distances = self.distances(queries)
+        num_queries, num_tracks = distances.shape
+        if exclude is not None:
+            distances = np.where(exclude, np.inf, distances)
+        if distinct:
+            return self._search_distinct(distances, k, distinct)
+        k_available = min(k, num_tracks)
+        if k_available < num_tracks:
+            candidates = np.argpartition(distances, k_available - 1, axis=1)[:, :k_available]
+        else:
+            candidates = np.broadcast_to(np.arange(num_tracks), (num_queries, num_tracks))
+        candidate_distances = np.take_along_axis(distances, candidates, axis=1)
+        order = np.argsort(candidate_distances, axis=1, kind="stable")
+        indices = np.take_along_axis(candidates, order, axis=1)
+        sorted_distances = np.take_along_axis(candidate_distances, order, axis=1)
+
+        result_indices = np.full((num_queries, k), -1, dtype=np.int64)
+        result_distances = np.full((num_queries, k), np.inf, dtype=np.float32)
+        result_indices[:, :k_available] = np.where(np.isinf(sorted_distances), -1, indices)
+        result_distances[:, :k_available] = sorted_distances
+        return result_indices, result_distances
+
+    def _search_distinct(self, distances: np.ndarray, k: int, distinct: Sequence[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+        rows = np.arange(distances.shape[1])
+        result_indices = np.full((len(distances), k), -1, dtype=np.int64)
+        result_distances = np.full((len(distances), k), np.inf, dtype=np.float32)
+        for query_number, query_distances in enumerate(distances):
+            chosen = nearest_distinct(query_distances, rows, k, distinct)
+            result_indices[query_number, :len(chosen)] = chosen
+            result_distances[query_number, :len(chosen)] = query_distances[chosen]
+        return result_indices, result_distances
+
+    def exclusion_mask(self, artists: Iterable[str] = (), titles: Iterable[str] = ()) -> np.ndarray:
+        """boolean mask of tracks by any of the given artists or with any of the given titles"""
+        mask = np.zeros(len(self), dtype=bool)
+        artists = [normalize_text(a) for a in artists]
+        titles = [normalize_text(t) for t in titles]
+        if artists:
+            if self.artist_index is None:
+                raise ValueError("index was built without artists")
+            self.artist_index.mask(self.artist_index.lookup(artists), out=mask)
+        if titles:
+            if self.title_index is None:
+                raise ValueError("index was built without titles")
+            self.title_index.mask(self.title_index.lookup(titles), out=mask)
+        return mask
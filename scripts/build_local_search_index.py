@@ -0,0 +1,126 @@
+"""
+Builds the LocalTrackSearchIndex served by /autocomplete from a TrackCatalog.
+
+AcousticBrainz tracks only carry MusicBrainz ids, and playlists are built from spotify ids, so
+only recordings with a spotify id are indexed. Ids come from a csv of
+musicbrainz_recordingid,spotify_id,popularity rows, e.g. exported from MusicBrainz's spotify url
+relationships. With --resolve, recordings missing from it are looked up with spotify search
+(client credentials from .env) and appended to it, misses included with an empty spotify_id, so a
+rerun only looks up what's new. Spotify popularity ranks the results.
+
+usage: python -m scripts.build_local_search_index catalog/ search_index/ --spotify-ids spotify_ids.csv --resolve
+then set LOCAL_SEARCH_INDEX_DIR=search_index/ for the app.
+"""
+import argparse
+import csv
+import os
+import sys
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+from recommendation_engine.vector_index import normalize_text
+from search.local_index import LocalTrackSearchIndex
+from spotify_service.scheduler import BATCH, ScheduledSpotify, SpotifyScheduler
+
+CSV_FIELDS = ["musicbrainz_recordingid", "spotify_id", "popularity"]
+SEARCH_LIMIT = 5
+PROGRESS_EVERY = 1000
+
+
+def read_spotify_ids(path: str) -> Dict[str, Tuple[str, float]]:
+    """recording id to (spotify id, popularity), misses hold an empty spotify id"""
+    if not Path(path).exists():
+        return {}
+    with open(path, newline="") as f:
+        return {
+            row["musicbrainz_recordingid"]: (row["spotify_id"], float(row.get("popularity") or 0))
+            for row in csv.DictReader(f)
+        }
+
+
+class SpotifyIdResolver:
+    """Finds a track's spotify id with spotify search. Only a result with the same title and artist
+    (case and whitespace aside) counts, a wrong id would seed playlists from the wrong song."""
+
+    def __init__(self, sp):
+        self.sp = sp
+
+    def resolve(self, title: str, artist: str) -> Optional[Tuple[str, float]]:
+        results = self.sp.search(f"track:{title} artist:{artist}", type="track", limit=SEARCH_LIMIT)
+        title, artist = normalize_text(title), normalize_text(artist)
+        for result in results["tracks"]["items"]:
+            artist_names = [normalize_text(a["name"]) for a in result["artists"]]
+            if normalize_text(result["name"]) == title and artist in artist_names + [", ".join(artist_names)]:
+                return result["id"], float(result.get("popularity", 0))
+        return None
+
+
+def resolve_missing(
+    catalog, spotify_ids: Dict[str, Tuple[str, float]], resolver: SpotifyIdResolver, max_lookups: Optional[int] = None
+) -> Iterator[Dict[str, Any]]:
+    """yields a csv row for every catalog recording not in spotify_ids, up to max_lookups"""
+    lookups = 0
+    for recording_id, title, artist in zip(
+        catalog.column("musicbrainz_recordingid"), catalog.column("title"), catalog.column("artist")
+    ):
+        if recording_id in spotify_ids:
+            continue
+        if max_lookups is not None and lookups == max_lookups:
+            return
+        lookups += 1
+        spotify_id, popularity = resolver.resolve(title, artist) or ("", 0.0)
+        spotify_ids[recording_id] = (spotify_id, popularity)
+        yield {"musicbrainz_recordingid": recording_id, "spotify_id": spotify_id, "popularity": popularity}
+
+
+def build_index(catalog, spotify_ids: Dict[str, Tuple[str, float]]) -> LocalTrackSearchIndex:
+    """indexes the catalog recordings with a spotify id, ranked by their spotify popularity"""
+    found = {recording_id: ids for recording_id, ids in spotify_ids.items() if ids[0]}
+    popularity = [found.get(recording_id, ("", 0.0))[1] for recording_id in catalog.column("musicbrainz_recordingid")]
+    return LocalTrackSearchIndex.from_catalog(
+        catalog, popularity, spotify_ids={recording_id: ids[0] for recording_id, ids in found.items()}
+    )
+
+
+def spotify_client() -> ScheduledSpotify:
+    import spotipy
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    client_credentials_manager = spotipy.oauth2.SpotifyClientCredentials(
+        client_id=os.getenv("SPOTIPY_CLIENT_ID"),
+        client_secret=os.getenv("SPOTIPY_CLIENT_SECRET"),
+    )
+    # batch lane with a scheduler of its own, run it off peak since it shares the app's quota
+    return ScheduledSpotify(spotipy.Spotify(client_credentials_manager=client_credentials_manager), SpotifyScheduler(), BATCH)
+
+
+if __name__ == "__main__":
+    from recommendation_engine.track_catalog import TrackCatalog
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("catalog", help="TrackCatalog directory written by scripts.get_acoustic_brainz_data --catalog")
+    parser.add_argument("output", help="index directory, served with LOCAL_SEARCH_INDEX_DIR")
+    parser.add_argument("--spotify-ids", required=True, help="csv of musicbrainz_recordingid,spotify_id,popularity")
+    parser.add_argument("--resolve", action="store_true", help="look up recordings missing from --spotify-ids")
+    parser.add_argument("--max-lookups", type=int, default=None, help="spotify searches in this run")
+    args = parser.parse_args()
+
+    catalog = TrackCatalog(args.catalog)
+    spotify_ids = read_spotify_ids(args.spotify_ids)
+    if args.resolve:
+        new_file = not Path(args.spotify_ids).exists()
+        with open(args.spotify_ids, "a", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=CSV_FIELDS)
+            if new_file:
+                writer.writeheader()
+            resolver = SpotifyIdResolver(spotify_client())
+            for looked_up, row in enumerate(resolve_missing(catalog, spotify_ids, resolver, args.max_lookups), 1):
+                writer.writerow(row)
+                if looked_up % PROGRESS_EVERY == 0:
+                    f.flush()
+                    print(f"looked up {looked_up} recordings", file=sys.stderr)
+
+    index = build_index(catalog, spotify_ids)
+    index.save(args.output)
+    print(f"indexed {len(index)} of {len(catalog)} catalog tracks with spotify ids into {args.output}", file=sys.stderr)
@@ -7,13 +7,47 @@ https://acousticbrainz.readthedocs.io/dev/similarity.html
 
 
 
-# import zstandard
-# import tarfile
-# import os
+import zstandard
+import tarfile
+import os
+import sys
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 import pprint
 import json
 
+DEFAULT_BATCH_SIZE = 10_000
+# members handed to each worker process at a time
+PARSE_CHUNK_SIZE = 64
+PROGRESS_INTERVAL_SECONDS = 10
+
+
+def extract_track(data: Dict[str, Any]) -> Dict[str, Any]:
+    """slims an AcousticBrainz high level document down to metadata and the 11 features we search on"""
+    return {
+        'musicbrainz_recordingid': data['metadata']['tags']['musicbrainz_recordingid'][0],
+        'musicbrainz_artistid': data['metadata']['tags'].get('musicbrainz_artistid', [""])[0],
+        'title': data['metadata']['tags'].get('title', [""])[0],
+        'artist': data['metadata']['tags'].get('artist', [""])[0],
+        'album': data['metadata']['tags'].get('album', [""])[0],
+        # 'bpm': int(data['metadata']['tags'].get('bpm', [])[0]),
+        'danceable': float(data['highlevel']['danceability']['all']['danceable']),
+        'aggressive': float(data['highlevel']['mood_aggressive']['all']['aggressive']),
+        'electronic': float(data['highlevel']['mood_electronic']['all']['electronic']),
+        'acoustic': float(data['highlevel']['mood_acoustic']['all']['acoustic']),
+        'happy': float(data['highlevel']['mood_happy']['all']['happy']),
+        'party': float(data['highlevel']['mood_party']['all']['party']),
+        'relaxed': float(data['highlevel']['mood_relaxed']['all']['relaxed']),
+        'sad': float(data['highlevel']['mood_sad']['all']['sad']),
+        'dark': float(data['highlevel']['timbre']['all']['dark']),
+        'tonal': float(data['highlevel']['tonal_atonal']['all']['tonal']),
+        'voice': float(data['highlevel']['voice_instrumental']['all']['voice'])
+    }
+
+
 def ingest_json(input_dir: str):
     input_dir = Path(input_dir)
     tracks = []
@@ -21,31 +55,170 @@ def ingest_json(input_dir: str):
         with open(file, 'r') as f:
             data = json.load(f)
             # pprint.pprint(data)
-            track = {
-                'musicbrainz_recordingid': data['metadata']['tags']['musicbrainz_recordingid'][0],
-                'title': data['metadata']['tags'].get('title', [""])[0],
-                'artist': data['metadata']['tags'].get('artist', [""])[0],
-                'album': data['metadata']['tags'].get('album', [""])[0],
-                # 'bpm': int(data['metadata']['tags'].get('bpm', [])[0]),
-                'danceable': float(data['highlevel']['danceability']['all']['danceable']),
-                'aggressive': float(data['highlevel']['mood_aggressive']['all']['aggressive']),
-                'electronic': float(data['highlevel']['mood_electronic']['all']['electronic']),
-                'acoustic': float(data['highlevel']['mood_acoustic']['all']['acoustic']),
-                'happy': float(data['highlevel']['mood_happy']['all']['happy']),
-                'party': float(data['highlevel']['mood_party']['all']['party']),
-                'relaxed': float(data['highlevel']['mood_relaxed']['all']['relaxed']),
-                'sad': float(data['highlevel']['mood_sad']['all']['sad']),
-                'dark': float(data['highlevel']['timbre']['all']['dark']),
-                'tonal': float(data['highlevel']['tonal_atonal']['all']['tonal']),
-                'voice': float(data['highlevel']['voice_instrumental']['all']['voice'])
-            }
-            tracks.append(track)
+            tracks.append(extract_track(data))
     return tracks
 
 
+def parse_member(raw: bytes) -> Optional[Dict[str, Any]]:
+    """runs in worker processes, returns None for documents missing features"""
+    try:
+        return extract_track(json.loads(raw))
+    except (KeyError, IndexError, ValueError, TypeError):
+        return None
+
+
+def iter_archive_members(archive_path: str, start_member: int = 0) -> Iterator[Tuple[int, bytes]]:
+    """
+    Streams (member number, file contents) for the json files in a .tar.zst dump
+    straight from the decompression stream, nothing is written to disk.
+    Members before start_member aren't extracted or parsed, but they are still decompressed:
+    the dumps are a single zstd stream with no seek table, so reaching a member means
+    decompressing everything before it.
+    """
+    with open(archive_path, 'rb') as compressed:
+        reader = zstandard.ZstdDecompressor().stream_reader(compressed)
+        # r| reads the tar sequentially, it never seeks
+        with tarfile.open(fileobj=reader, mode='r|') as tar:
+            for member_number, member in enumerate(tar):
+                if member_number < start_member or not member.isfile() or not member.name.endswith('.json'):
+                    continue
+                yield member_number, tar.extractfile(member).read()
+
+
+class Checkpoint:
+    """
+    Progress per archive: {archive name: {"members": members consumed, "done": bool}}
+    saved as json so an interrupted ingest resumes where it left off
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self.archives = {}
+        if path and os.path.exists(path):
+            with open(path) as f:
+                self.archives = json.load(f)
+
+    def start_member(self, archive_name: str) -> int:
+        return self.archives.get(archive_name, {}).get('members', 0)
+
+    def is_done(self, archive_name: str) -> bool:
+        return self.archives.get(archive_name, {}).get('done', False)
+
+    def update(self, archive_name: str, members: int, done: bool = False):
+        self.archives[archive_name] = {'members': members, 'done': done}
+
+    def save(self):
+        if not self.path:
+            return
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.archives, f)
+        os.replace(tmp_path, self.path)
+
+
+class ProgressReporter:
+    def __init__(self, interval_seconds: float = PROGRESS_INTERVAL_SECONDS):
+        self.interval_seconds = interval_seconds
+        self.started_at = time.perf_counter()
+        self.last_report = self.started_at
+        self.files = 0
+        self.skipped = 0
+
+    def add(self, files: int, skipped: int):
+        self.files += files
+        self.skipped += skipped
+        now = time.perf_counter()
+        if now - self.last_report >= self.interval_seconds:
+            self.last_report = now
+            self.report()
+
+    def files_per_second(self) -> float:
+        return self.files / max(time.perf_counter() - self.started_at, 1e-9)
+
+    def report(self):
+        print(
+            f"ingested {self.files} files ({self.skipped} skipped) at {self.files_per_second():.0f} files/s",
+            file=sys.stderr,
+        )
+
+
+def stream_archives(
+    archive_paths: List[str],
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    workers: Optional[int] = None,
+    checkpoint_path: Optional[str] = None,
+    progress: Optional[ProgressReporter] = None,
+) -> Iterator[List[Dict[str, Any]]]:
+    """
+    Yields batches of batch_size track dicts (the last batch may be smaller) from .tar.zst dumps.
+    json is parsed in a pool of worker processes, and the main process decompresses the next chunk
+    of members while the workers parse the current one.
+    The checkpoint is saved once the consumer asks for the next batch, so a batch that
+    was yielded but not fully handled is ingested again on resume.
+    """
+    workers = workers or os.cpu_count() or 1
+    checkpoint = Checkpoint(checkpoint_path)
+    progress = progress or ProgressReporter()
+    batch = []
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+
+    def parse_chunk(chunk: List[bytes]) -> Iterator[Optional[Dict[str, Any]]]:
+        if pool is None:
+            return iter([parse_member(raw) for raw in chunk])
+        # map submits every member right away, results are only waited on when iterated
+        return pool.map(parse_member, chunk, chunksize=PARSE_CHUNK_SIZE)
+
+    try:
+        for archive_path in archive_paths:
+            archive_name = Path(archive_path).name
+            if checkpoint.is_done(archive_name):
+                continue
+            members = iter_archive_members(archive_path, start_member=checkpoint.start_member(archive_name))
+            # (member numbers, parse results) of the chunk the workers are on while the next one is decompressed
+            in_flight = None
+            while True:
+                chunk = []
+                member_numbers = []
+                for member_number, raw in members:
+                    chunk.append(raw)
+                    member_numbers.append(member_number)
+                    if len(chunk) == PARSE_CHUNK_SIZE * workers:
+                        break
+                next_in_flight = (member_numbers, parse_chunk(chunk)) if chunk else None
+                if in_flight is None:
+                    if next_in_flight is None:
+                        break
+                    in_flight = next_in_flight
+                    continue
+                member_numbers, results = in_flight
+                in_flight = next_in_flight
+                parsed = list(results)
+                skipped = parsed.count(None)
+                progress.add(len(parsed) - skipped, skipped)
+                for member_number, track in zip(member_numbers, parsed):
+                    if track is None:
+                        continue
+                    batch.append(track)
+                    if len(batch) == batch_size:
+                        # everything up to this member is in a yielded batch
+                        checkpoint.update(archive_name, member_number + 1)
+                        yield batch
+                        batch = []
+                        checkpoint.save()
+                checkpoint.update(archive_name, member_numbers[-1] + 1)
+            checkpoint.update(archive_name, checkpoint.start_member(archive_name), done=True)
+        if batch:
+            yield batch
+        checkpoint.save()
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
+
 def decompress_and_extract(input_file_path, output_dir=None):
     """
     Decompress a .tar.zst file and extract its contents
+    Prefer stream_archives, it reads the archive without writing anything to disk.
     
     Args:
         input_file_path (str): Path to the .tar.zst file
@@ -87,10 +260,29 @@ def decompress_and_extract(input_file_path, output_dir=None):
 if __name__ == "__main__":
     # note these files are really big
     # https://data.metabrainz.org/pub/musicbrainz/acousticbrainz/dumps/
+    parser = argparse.ArgumentParser(description="stream tracks out of AcousticBrainz .tar.zst dumps")
+    parser.add_argument("archives", nargs="+", help="e.g. acousticbrainz-highlevel-json-20220623-29.tar.zst")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--checkpoint", default=None, help="json file used to resume an interrupted ingest")
+    parser.add_argument(
+        "--catalog",
+        default=None,
+        help="write a TrackCatalog directory instead of printing, run as python -m scripts.get_acoustic_brainz_data",
+    )
+    parser.add_argument("--vector-dtype", default="float32", help="float32, float16 or uint8 catalog vectors")
+    args = parser.parse_args()
+    if args.catalog and args.checkpoint:
+        # a catalog is always written from scratch so a resumed ingest would lose the earlier tracks
+        parser.error("--catalog can't be combined with --checkpoint")
 
-    # input_file = 'acousticbrainz-highlevel-json-20220623-29.tar.zst'
-    # output_dir = "."
-    
-    # decompress_and_extract(input_file, output_dir)
-    tracks = ingest_json("/Users/jeffreycapobianco/coding/wave_guide/data/acousticbrainz-highlevel-json-20220623/highlevel/00/0/")
-    pprint.pprint(tracks)
\ No newline at end of file
+    progress = ProgressReporter()
+    batches = stream_archives(args.archives, args.batch_size, args.workers, args.checkpoint, progress)
+    if args.catalog:
+        from recommendation_engine.track_catalog import write_catalog
+
+        write_catalog(args.catalog, batches, vector_dtype=args.vector_dtype)
+    else:
+        for batch in batches:
+            pprint.pprint(batch[0])
+    progress.report()
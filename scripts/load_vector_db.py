@@ -0,0 +1,204 @@
+"""
+Loads tracks streamed out of AcousticBrainz dumps into a vector DB collection.
+
+Batches come from stream_archives, each batch is split into upsert chunks that go out in
+parallel with retries, and the next batch is only pulled once every chunk of the current one
+is stored. The ingester saves its checkpoint when the next batch is pulled, so a rerun with the
+same --checkpoint skips everything already loaded. Point ids are uuid5 of the recording id, a
+batch that is loaded twice after an interrupted run overwrites the same points.
+
+usage: python -m scripts.load_vector_db dump-0.tar.zst dump-1.tar.zst --checkpoint load.json
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set
+
+from recommendation_engine.vector_index import FEATURE_NAMES
+from scripts.get_acoustic_brainz_data import DEFAULT_BATCH_SIZE, ProgressReporter, stream_archives
+
+DEFAULT_COLLECTION = "tracks"
+DEFAULT_UPSERT_SIZE = 500
+DEFAULT_UPLOAD_THREADS = 4
+# chunks sent or waiting for a thread, bounds memory when the vector DB falls behind
+DEFAULT_MAX_IN_FLIGHT = 8
+MAX_RETRIES = 4
+RETRY_BASE_SECONDS = 0.5
+# fixed namespace so a recording always maps to the same point id
+POINT_ID_NAMESPACE = uuid.UUID("3f1b2c5e-8a61-4c3e-9a57-0d2f6b7c9e41")
+PAYLOAD_KEYS = ("title", "artist", "album", "musicbrainz_recordingid", "musicbrainz_artistid")
+
+
+@dataclass
+class Point:
+    id: str
+    vector: List[float]
+    payload: Dict[str, Any]
+
+
+def point_id(musicbrainz_recordingid: str) -> str:
+    return str(uuid.uuid5(POINT_ID_NAMESPACE, musicbrainz_recordingid))
+
+
+def track_point(track: Dict[str, Any]) -> Point:
+    return Point(
+        id=point_id(track["musicbrainz_recordingid"]),
+        vector=[float(track[feature]) for feature in FEATURE_NAMES],
+        payload={key: track.get(key, "") for key in PAYLOAD_KEYS},
+    )
+
+
+class InMemoryVectorStore:
+    """Keeps points in a dict per collection, for tests and dry runs"""
+
+    def __init__(self):
+        self.collections: Dict[str, Dict[str, Point]] = {}
+        self.upserts = 0
+        self._lock = threading.Lock()
+
+    def ensure_collection(self, name: str, size: int):
+        with self._lock:
+            self.collections.setdefault(name, {})
+
+    def upsert(self, name: str, points: List[Point]):
+        with self._lock:
+            self.upserts += 1
+            self.collections[name].update((point.id, point) for point in points)
+
+
+class QdrantVectorStore:
+    """Writes to a Qdrant collection, client is a qdrant_client.QdrantClient (QdrantClient(":memory:") runs locally)"""
+
+    def __init__(self, client):
+        from qdrant_client import models
+
+        self.client = client
+        self.models = models
+
+    def ensure_collection(self, name: str, size: int):
+        existing = [collection.name for collection in self.client.get_collections().collections]
+        if name not in existing:
+            self.client.create_collection(
+                collection_name=name,
+                vectors_config=self.models.VectorParams(size=size, distance=self.models.Distance.COSINE),
+            )
+
+    def upsert(self, name: str, points: List[Point]):
+        self.client.upsert(
+            collection_name=name,
+            points=[self.models.PointStruct(id=point.id, vector=point.vector, payload=point.payload) for point in points],
+            wait=True,
+        )
+
+
+class VectorLoader:
+    """Upserts batches of tracks in parallel chunks, retrying failed chunks with exponential backoff.
+
+    At most max_in_flight chunks are submitted at once, the caller blocks until one finishes.
+    A chunk that still fails after max_retries raises from load_batch, so the ingester's
+    checkpoint never moves past a batch that wasn't fully stored.
+    """
+
+    def __init__(
+        self,
+        store,
+        collection: str = DEFAULT_COLLECTION,
+        upsert_size: int = DEFAULT_UPSERT_SIZE,
+        threads: int = DEFAULT_UPLOAD_THREADS,
+        max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+        max_retries: int = MAX_RETRIES,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        self.store = store
+        self.collection = collection
+        self.upsert_size = upsert_size
+        self.max_in_flight = max(max_in_flight, 1)
+        self.max_retries = max_retries
+        self.sleep = sleep
+        self.executor = ThreadPoolExecutor(max_workers=threads)
+        self.points = 0
+        self.retries = 0
+        self._lock = threading.Lock()
+        store.ensure_collection(collection, len(FEATURE_NAMES))
+
+    def _upsert(self, points: List[Point]):
+        for attempt in range(self.max_retries + 1):
+            try:
+                self.store.upsert(self.collection, points)
+                break
+            except Exception:
+                if attempt == self.max_retries:
+                    raise
+                with self._lock:
+                    self.retries += 1
+                self.sleep(RETRY_BASE_SECONDS * 2**attempt)
+        with self._lock:
+            self.points += len(points)
+
+    def load_batch(self, tracks: List[Dict[str, Any]]):
+        """returns once every track in the batch is stored"""
+        points = [track_point(track) for track in tracks]
+        in_flight: Set[Future] = set()
+        try:
+            for start in range(0, len(points), self.upsert_size):
+                if len(in_flight) == self.max_in_flight:
+                    done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        future.result()
+                in_flight.add(self.executor.submit(self._upsert, points[start:start + self.upsert_size]))
+            for future in in_flight:
+                future.result()
+        finally:
+            for future in in_flight:
+                future.cancel()
+
+    def load(self, batches: Iterable[List[Dict[str, Any]]]) -> int:
+        """returns the number of points stored"""
+        for batch in batches:
+            self.load_batch(batch)
+        return self.points
+
+    def close(self):
+        self.executor.shutdown(cancel_futures=True)
+
+
+def qdrant_store(url: Optional[str], api_key: Optional[str]) -> QdrantVectorStore:
+    from qdrant_client import QdrantClient
+
+    return QdrantVectorStore(QdrantClient(url, api_key=api_key))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("archives", nargs="+", help="e.g. acousticbrainz-highlevel-json-20220623-29.tar.zst")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="tracks pulled from the ingester at a time")
+    parser.add_argument("--upsert-size", type=int, default=DEFAULT_UPSERT_SIZE, help="points per upsert request")
+    parser.add_argument("--threads", type=int, default=DEFAULT_UPLOAD_THREADS, help="parallel upsert requests")
+    parser.add_argument("--max-in-flight", type=int, default=DEFAULT_MAX_IN_FLIGHT)
+    parser.add_argument("--workers", type=int, default=None, help="json parsing processes")
+    parser.add_argument("--checkpoint", default=None, help="json file used to skip what an earlier run loaded")
+    parser.add_argument("--collection", default=DEFAULT_COLLECTION)
+    parser.add_argument("--in-memory", action="store_true", help="load into memory instead of Qdrant, a dry run")
+    args = parser.parse_args()
+
+    if args.in_memory:
+        store = InMemoryVectorStore()
+    else:
+        from dotenv import load_dotenv
+
+        load_dotenv()
+        store = qdrant_store(os.getenv("QDRANT_URL") or os.getenv("QDRANT_CLUSTER_NAME"), os.getenv("QDRANT_API_KEY"))
+
+    progress = ProgressReporter()
+    loader = VectorLoader(store, args.collection, args.upsert_size, args.threads, args.max_in_flight)
+    try:
+        loaded = loader.load(stream_archives(args.archives, args.batch_size, args.workers, args.checkpoint, progress))
+    finally:
+        loader.close()
+    progress.report()
+    print(f"loaded {loaded} points into {args.collection} ({loader.retries} retried upserts)", file=sys.stderr)
@@ -1,7 +1,19 @@
 import spotipy
+from typing import Optional
 
+from search.autocomplete_cache import AutocompleteCache
+from utils.tracing import tracer
 
-def search_tracks(sp: spotipy.Spotify, query: str, limit: int):  # TODO: add return type
+
+# nested only, a trace line per keystroke would drown out the playlist builds
+@tracer.traced("search_tracks", root=False)
+def search_tracks(
+    sp: spotipy.Spotify, query: str, limit: int, cache: Optional[AutocompleteCache] = None
+):  # TODO: add return type
+    if cache is not None:
+        cached = cache.get(query, limit)
+        if cached is not None:
+            return cached
     # if you want to be more specific can use syntax below
     # for now let spotify's api figure out whatever a user would put in
     # query = f"track:{title}, artist:{artist}"
@@ -20,4 +32,6 @@ def search_tracks(sp: spotipy.Spotify, query: str, limit: int):  # TODO: add ret
             "small_image": result["album"]["images"][-1]["url"],
         }
         slimmed_results.append(slimmed)
+    if cache is not None:
+        cache.set(query, limit, slimmed_results)
     return slimmed_results
@@ -0,0 +1,73 @@
+import threading
+from typing import Any, Dict, List, Optional
+
+from spotify_service.cache import MINUTE, TTLCache
+
+DEFAULT_MAX_ENTRIES = 20_000
+DEFAULT_TTL_SECONDS = 30 * MINUTE
+# shorter prefixes match too much to be worth reusing
+MIN_PREFIX_LENGTH = 3
+
+
+def normalize_query(query: str) -> str:
+    return " ".join(query.lower().split())
+
+
+def matches_query(result: Dict[str, Any], normalized_query: str) -> bool:
+    """every query token starts a word in the track or artist name"""
+    words = normalize_query(f"{result['track_name']} {result['artist_name']}").replace(",", " ").split()
+    return all(any(word.startswith(token) for word in words) for token in normalized_query.split())
+
+
+class AutocompleteCache:
+    """Server side cache of slimmed search_tracks results shared by every user in the worker.
+
+    A longer query can be answered from a cached shorter prefix when the result set for the
+    prefix was complete (spotify returned fewer than limit results, so nothing else matches),
+    or when enough of the prefix's results still match the longer query on their own.
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, ttl_seconds: float = DEFAULT_TTL_SECONDS):
+        self.cache = TTLCache(max_entries, ttl_seconds)
+        self.exact_hits = 0
+        self.prefix_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def _count(self, counter: str):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def get(self, query: str, limit: int) -> Optional[List[Dict[str, Any]]]:
+        normalized = normalize_query(query)
+        results = self.cache.get((normalized, limit))
+        if results is not None:
+            self._count("exact_hits")
+            return results
+
+        for length in range(len(normalized) - 1, MIN_PREFIX_LENGTH - 1, -1):
+            prefix_results = self.cache.get((normalized[:length], limit))
+            if prefix_results is None:
+                continue
+            matching = [result for result in prefix_results if matches_query(result, normalized)]
+            complete = len(prefix_results) < limit
+            if complete or len(matching) >= limit:
+                self._count("prefix_hits")
+                # store it so the next keystroke finds an exact entry
+                self.cache.set((normalized, limit), matching[:limit])
+                return matching[:limit]
+        self._count("misses")
+        return None
+
+    def set(self, query: str, limit: int, results: List[Dict[str, Any]]):
+        self.cache.set((normalize_query(query), limit), results)
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.exact_hits + self.prefix_hits + self.misses
+        return {
+            "entries": len(self.cache),
+            "exact_hits": self.exact_hits,
+            "prefix_hits": self.prefix_hits,
+            "misses": self.misses,
+            "hit_ratio": (self.exact_hits + self.prefix_hits) / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,280 @@
+import json
+import re
+from bisect import bisect_left
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# the frontend expects search_tracks' slimmed shape, AcousticBrainz has no artwork so the frontend shows the logo
+NO_IMAGE = ""
+# which ids a result carries, playlists can only be built from spotify ids
+SPOTIFY_IDS = "spotify"
+MUSICBRAINZ_IDS = "musicbrainz"
+# sorts after every character a token can contain, closes a prefix range
+PREFIX_END = "\U0010ffff"
+DISPLAY_FIELDS = ["id", "track_name", "artist_name"]
+# one and two character prefixes span thousands of words, their best rows are computed at build time
+SHORT_PREFIX_LENGTH = 2
+SHORT_PREFIX_DEPTH = 32
+
+
+def tokenize(text: str) -> List[str]:
+    return re.findall(r"\w+", text.lower())
+
+
+def _pack_strings(values: List[str]) -> Tuple[np.ndarray, bytes]:
+    encoded = [value.encode("utf-8") for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(value) for value in encoded], out=offsets[1:])
+    return offsets, b"".join(encoded)
+
+
+def _load_mapped(path: Path) -> np.ndarray:
+    # a plain ndarray view of the memory map, np.memmap's indexing overhead is most of a query's time
+    return np.load(path, mmap_mode="r").view(np.ndarray)
+
+
+def _ranges_to_indices(starts: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+    """concatenation of arange(start, start + length) for every pair, without a python loop"""
+    total = int(lengths.sum())
+    if total == 0:
+        return np.empty(0, dtype=np.int64)
+    segment_starts = np.repeat(starts - np.concatenate([[0], np.cumsum(lengths)[:-1]]), lengths)
+    return segment_starts + np.arange(total)
+
+
+class LocalTrackSearchIndex:
+    """In process track search over title and artist words, no spotify calls.
+
+    Records are numbered in popularity order, so a lower row is a better result. The sorted
+    vocabulary answers prefix queries with a binary search (a flat alternative to a trie), and an
+    inverted index maps every word to the ascending rows that contain it. Multi word queries treat
+    every word as a prefix and check the other words against each candidate's own word list.
+    Single word queries of one or two characters are answered from rows precomputed at build time.
+    """
+
+    def __init__(
+        self,
+        vocabulary: List[str],
+        token_offsets: np.ndarray,
+        postings: np.ndarray,
+        record_token_offsets: np.ndarray,
+        record_tokens: np.ndarray,
+        display: Dict[str, Tuple[np.ndarray, bytes]],
+        short_prefixes: Optional[Dict[str, np.ndarray]] = None,
+        id_source: str = MUSICBRAINZ_IDS,
+    ):
+        self.vocabulary = vocabulary
+        self.token_offsets = token_offsets
+        self.postings = postings
+        self.record_token_offsets = record_token_offsets
+        self.record_tokens = record_tokens
+        self.display = display
+        self.id_source = id_source
+        if short_prefixes is None:
+            short_prefixes = {}
+            for prefix in sorted({token[:length] for token in vocabulary for length in range(1, SHORT_PREFIX_LENGTH + 1)}):
+                short_prefixes[prefix] = self._search_prefix_rows(self._token_range(prefix), [], SHORT_PREFIX_DEPTH)
+        self.short_prefixes = short_prefixes
+
+    @classmethod
+    def build(cls, tracks: Iterable[Dict[str, Any]], popularity: Optional[Sequence[float]] = None) -> "LocalTrackSearchIndex":
+        """tracks are ingest_json style dicts, popularity is one weight per track, higher ranks first.
+        Results carry each track's spotify_id when every track has one, the recording id otherwise."""
+        tracks = list(tracks)
+        id_source = SPOTIFY_IDS if tracks and all(t.get("spotify_id") for t in tracks) else MUSICBRAINZ_IDS
+        id_key = "spotify_id" if id_source == SPOTIFY_IDS else "musicbrainz_recordingid"
+        weights = np.zeros(len(tracks)) if popularity is None else np.asarray(popularity, dtype=np.float64)
+        order = np.argsort(-weights, kind="stable")
+        tracks = [tracks[i] for i in order]
+
+        record_token_sets = [sorted(set(tokenize(f"{t['title']} {t['artist']}"))) for t in tracks]
+        vocabulary = sorted({token for tokens in record_token_sets for token in tokens})
+        token_ids = {token: token_id for token_id, token in enumerate(vocabulary)}
+
+        record_tokens = [token_ids[token] for tokens in record_token_sets for token in tokens]
+        record_token_offsets = np.zeros(len(tracks) + 1, dtype=np.int64)
+        np.cumsum([len(tokens) for tokens in record_token_sets], out=record_token_offsets[1:])
+        record_tokens = np.array(record_tokens, dtype=np.int64)
+
+        # rows per token, ascending because a stable sort by token keeps row order
+        record_rows = np.repeat(np.arange(len(tracks)), np.diff(record_token_offsets))
+        by_token = np.argsort(record_tokens, kind="stable")
+        postings = record_rows[by_token]
+        token_offsets = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(record_tokens, minlength=len(vocabulary)), out=token_offsets[1:])
+
+        display = {
+            "id": _pack_strings([t[id_key] for t in tracks]),
+            "track_name": _pack_strings([t["title"] for t in tracks]),
+            "artist_name": _pack_strings([t["artist"] for t in tracks]),
+        }
+        return cls(vocabulary, token_offsets, postings, record_token_offsets, record_tokens, display, id_source=id_source)
+
+    @classmethod
+    def from_catalog(
+        cls,
+        catalog,
+        popularity: Optional[Sequence[float]] = None,
+        spotify_ids: Optional[Dict[str, str]] = None,
+    ) -> "LocalTrackSearchIndex":
+        """popularity is one weight per catalog row. spotify_ids maps recording ids to spotify ids,
+        when given only the mapped rows are indexed so every result can seed a playlist."""
+        tracks = [
+            {"musicbrainz_recordingid": recording_id, "title": title, "artist": artist}
+            for recording_id, title, artist in zip(
+                catalog.column("musicbrainz_recordingid"), catalog.column("title"), catalog.column("artist")
+            )
+        ]
+        if spotify_ids is not None:
+            rows = [row for row, track in enumerate(tracks) if track["musicbrainz_recordingid"] in spotify_ids]
+            tracks = [dict(tracks[row], spotify_id=spotify_ids[tracks[row]["musicbrainz_recordingid"]]) for row in rows]
+            popularity = [popularity[row] for row in rows] if popularity is not None else None
+        return cls.build(tracks, popularity)
+
+    def __len__(self) -> int:
+        return len(self.record_token_offsets) - 1
+
+    @property
+    def has_spotify_ids(self) -> bool:
+        return self.id_source == SPOTIFY_IDS
+
+    def _token_range(self, token: str) -> Tuple[int, int]:
+        return bisect_left(self.vocabulary, token), bisect_left(self.vocabulary, token + PREFIX_END)
+
+    def _postings_count(self, token_range: Tuple[int, int]) -> int:
+        return int(self.token_offsets[token_range[1]] - self.token_offsets[token_range[0]])
+
+    def _matches(self, rows: np.ndarray, token_range: Tuple[int, int]) -> np.ndarray:
+        """whether each row has a word inside the vocabulary range"""
+        starts = self.record_token_offsets[rows]
+        lengths = self.record_token_offsets[rows + 1] - starts
+        tokens = self.record_tokens[_ranges_to_indices(starts, lengths)]
+        in_range = (tokens >= token_range[0]) & (tokens < token_range[1])
+        return np.logical_or.reduceat(in_range, np.concatenate([[0], np.cumsum(lengths)[:-1]]))
+
+    def _expected_depth(self, other_ranges: List[Tuple[int, int]], limit: int) -> int:
+        """how deep into each driver word's postings we expect to go before limit candidates pass the other words,
+        taking the words as independent so each one passes its share of the records"""
+        passing = 1.0
+        for other in other_ranges:
+            passing *= self._postings_count(other) / max(len(self), 1)
+        return int(min(limit / max(passing, 1e-12), len(self)))
+
+    def _driver_cost(self, token_range: Tuple[int, int], other_ranges: List[Tuple[int, int]], limit: int) -> float:
+        """rough number of postings read when candidates come from this word"""
+        depth = self._expected_depth(other_ranges, limit)
+        return min(self._postings_count(token_range), (token_range[1] - token_range[0]) * depth)
+
+    def search_rows(self, query: str, limit: int = 4) -> np.ndarray:
+        tokens = tokenize(query)
+        if not tokens or limit < 1:
+            return np.empty(0, dtype=np.int64)
+        if len(tokens) == 1 and tokens[0] in self.short_prefixes and limit <= SHORT_PREFIX_DEPTH:
+            return self.short_prefixes[tokens[0]][:limit]
+        ranges = [self._token_range(token) for token in tokens]
+        if any(low == high for low, high in ranges):
+            return np.empty(0, dtype=np.int64)
+        # generate candidates from the cheapest word, check the rest per candidate
+        driver = min(
+            range(len(ranges)),
+            key=lambda i: self._driver_cost(ranges[i], ranges[:i] + ranges[i + 1:], limit),
+        )
+        # the rarest word first leaves the fewest candidates for the next
+        others = sorted((token_range for i, token_range in enumerate(ranges) if i != driver), key=self._postings_count)
+        # start at the expected depth, rare combinations read the driver's postings in one go
+        depth = max(limit, self._expected_depth(others, limit))
+        return self._search_prefix_rows(ranges[driver], others, limit, depth)
+
+    def _search_prefix_rows(
+        self, driver: Tuple[int, int], others: List[Tuple[int, int]], limit: int, depth: Optional[int] = None
+    ) -> np.ndarray:
+        low, high = driver
+        starts = self.token_offsets[low:high]
+        sizes = self.token_offsets[low + 1:high + 1] - starts
+
+        depth = depth or limit
+        while True:
+            taken = np.minimum(sizes, depth)
+            candidates = np.unique(self.postings[_ranges_to_indices(starts, taken)])
+            for token_range in others:
+                if len(candidates):
+                    candidates = candidates[self._matches(candidates, token_range)]
+            truncated = taken < sizes
+            if not truncated.any():
+                return candidates[:limit]
+            # rows past the deepest row read from a truncated word could still be missing
+            cutoff = self.postings[starts[truncated] + taken[truncated] - 1].min()
+            complete = candidates[candidates <= cutoff]
+            if len(complete) >= limit:
+                return complete[:limit]
+            depth *= 4
+
+    def _display_value(self, field: str, row: int) -> str:
+        offsets, blob = self.display[field]
+        return blob[offsets[row]:offsets[row + 1]].decode("utf-8")
+
+    def search(self, query: str, limit: int = 4) -> List[Dict[str, str]]:
+        """same result shape as search.autocomplete.search_tracks"""
+        return [
+            {
+                "id": self._display_value("id", row),
+                "artist_name": self._display_value("artist_name", row),
+                "track_name": self._display_value("track_name", row),
+                "large_image": NO_IMAGE,
+                "small_image": NO_IMAGE,
+            }
+            for row in self.search_rows(query, limit).tolist()
+        ]
+
+    def save(self, directory: str):
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        with open(directory / "vocabulary.txt", "w", encoding="utf-8") as f:
+            f.write("\n".join(self.vocabulary))
+        arrays = {
+            "token_offsets": self.token_offsets,
+            "postings": self.postings,
+            "record_token_offsets": self.record_token_offsets,
+            "record_tokens": self.record_tokens,
+        }
+        for field, (offsets, blob) in self.display.items():
+            arrays[f"{field}_offsets"] = offsets
+            (directory / f"{field}.strings.bin").write_bytes(blob)
+        for name, array in arrays.items():
+            np.save(directory / f"{name}.npy", array)
+        prefixes = list(self.short_prefixes)
+        prefix_rows = np.full((len(prefixes), SHORT_PREFIX_DEPTH), -1, dtype=np.int64)
+        for i, prefix in enumerate(prefixes):
+            rows = self.short_prefixes[prefix]
+            prefix_rows[i, :len(rows)] = rows
+        np.save(directory / "short_prefix_rows.npy", prefix_rows)
+        with open(directory / "meta.json", "w") as f:
+            json.dump({"num_records": len(self), "short_prefixes": prefixes, "id_source": self.id_source}, f)
+
+    @classmethod
+    def load(cls, directory: str) -> "LocalTrackSearchIndex":
+        directory = Path(directory)
+        vocabulary_text = (directory / "vocabulary.txt").read_text(encoding="utf-8")
+        vocabulary = vocabulary_text.split("\n") if vocabulary_text else []
+        arrays = {
+            name: _load_mapped(directory / f"{name}.npy")
+            for name in ["token_offsets", "postings", "record_token_offsets", "record_tokens"]
+        }
+        display = {
+            field: (_load_mapped(directory / f"{field}_offsets.npy"), (directory / f"{field}.strings.bin").read_bytes())
+            for field in DISPLAY_FIELDS
+        }
+        with open(directory / "meta.json") as f:
+            meta = json.load(f)
+        prefixes = meta["short_prefixes"]
+        prefix_rows = np.load(directory / "short_prefix_rows.npy")
+        short_prefixes = {prefix: rows[rows >= 0] for prefix, rows in zip(prefixes, prefix_rows)}
+        return cls(
+            vocabulary,
+            display=display,
+            short_prefixes=short_prefixes,
+            id_source=meta.get("id_source", MUSICBRAINZ_IDS),
+            **arrays,
+        )
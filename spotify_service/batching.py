@@ -0,0 +1,115 @@
+import threading
+from concurrent.futures import Future
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+import spotipy
+
+TRACKS = "tracks"
+AUDIO_FEATURES = "audio_features"
+# spotify's bulk endpoint limits
+MAX_IDS_PER_CALL = {
+    TRACKS: 50,
+    AUDIO_FEATURES: 100,
+}
+
+
+class InFlightRequests:
+    """Worker wide registry of lookups that are currently being fetched.
+    Concurrent requests asking for the same id wait on one shared call instead of issuing their own."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._futures: Dict[Tuple[str, Hashable], Future] = {}
+
+    def claim(self, endpoint: str, ids: List[str]) -> Tuple[List[str], Dict[str, Future]]:
+        """returns the ids this caller must fetch itself and futures for ids someone else is fetching"""
+        owned = []
+        waiting = {}
+        with self._lock:
+            for item_id in ids:
+                future = self._futures.get((endpoint, item_id))
+                if future is None:
+                    self._futures[(endpoint, item_id)] = Future()
+                    owned.append(item_id)
+                else:
+                    waiting[item_id] = future
+        return owned, waiting
+
+    def resolve(
+        self, endpoint: str, ids: List[str], results: Optional[Dict[str, Any]] = None, error: Optional[BaseException] = None
+    ):
+        """completes every claimed id, ids missing from results resolve to None like an unknown id in a bulk response"""
+        results = results or {}
+        with self._lock:
+            futures = [self._futures.pop((endpoint, item_id)) for item_id in ids]
+        for item_id, future in zip(ids, futures):
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(results.get(item_id))
+
+
+class SpotifyBatchLoader:
+    """Request scoped dataloader in front of a spotify client.
+
+    Track and audio feature lookups are collected and sent as bulk sp.tracks / sp.audio_features
+    calls, split at spotify's batch limits. prime_tracks queues ids so they ride along with the next
+    lookup of the same kind. Results are memoized for the life of the loader, so create one per request.
+    Every other endpoint is passed straight through to the wrapped client.
+    """
+
+    def __init__(self, sp: spotipy.Spotify, in_flight: Optional[InFlightRequests] = None):
+        self.sp = sp
+        self.in_flight = in_flight or InFlightRequests()
+        self._pending: Dict[str, List[str]] = {TRACKS: [], AUDIO_FEATURES: []}
+        self._results: Dict[str, Dict[str, Any]] = {TRACKS: {}, AUDIO_FEATURES: {}}
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.sp, name)
+
+    def prime_tracks(self, track_ids: List[str]):
+        with self._lock:
+            self._pending[TRACKS].extend(track_ids)
+
+    def track(self, track_id: str, market: Optional[str] = None) -> Dict[str, Any]:
+        if market is not None:
+            return self.sp.track(track_id, market=market)
+        return self._load(TRACKS, [track_id])[0]
+
+    def tracks(self, tracks: List[str], market: Optional[str] = None) -> Dict[str, List[Dict[str, Any]]]:
+        if market is not None:
+            return self.sp.tracks(tracks, market=market)
+        return {"tracks": self._load(TRACKS, tracks)}
+
+    def audio_features(self, tracks: List[str]) -> List[Optional[Dict[str, Any]]]:
+        return self._load(AUDIO_FEATURES, tracks)
+
+    def _fetch(self, endpoint: str, ids: List[str]) -> Dict[str, Any]:
+        """results by id, matched on each item's id since a bulk response can be short or skip ids"""
+        items = self.sp.tracks(ids)["tracks"] if endpoint == TRACKS else self.sp.audio_features(ids)
+        by_id = {item["id"]: item for item in items or [] if item}
+        return {item_id: by_id.get(item_id) for item_id in ids}
+
+    def _load(self, endpoint: str, ids: List[str]) -> List[Any]:
+        results = self._results[endpoint]
+        with self._lock:
+            pending = self._pending[endpoint]
+            self._pending[endpoint] = []
+        to_load = list(dict.fromkeys(item_id for item_id in pending + ids if item_id not in results))
+
+        owned, waiting = self.in_flight.claim(endpoint, to_load)
+        batch_size = MAX_IDS_PER_CALL[endpoint]
+        for start in range(0, len(owned), batch_size):
+            batch = owned[start:start + batch_size]
+            try:
+                fetched = self._fetch(endpoint, batch)
+            except Exception as e:
+                # release every id we claimed so other requests don't wait forever
+                self.in_flight.resolve(endpoint, owned[start:], error=e)
+                raise
+            self.in_flight.resolve(endpoint, batch, fetched)
+            results.update(fetched)
+        for item_id, future in waiting.items():
+            results[item_id] = future.result()
+        return [results[item_id] for item_id in ids]
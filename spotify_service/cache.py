@@ -0,0 +1,223 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+import spotipy
+
+from spotify_service.track_store import AUDIO_FEATURES, TRACKS, TrackStore
+
+MINUTE = 60
+HOUR = 60 * MINUTE
+DAY = 24 * HOUR
+
+# track metadata and audio features are effectively immutable
+# search results and top artists drift, so keep them short lived
+ENDPOINT_TTLS = {
+    "track": 7 * DAY,
+    "audio_features": 7 * DAY,
+    "search": 10 * MINUTE,
+    "current_user_top_artists": HOUR,
+}
+# entries for these endpoints depend on who is logged in and are keyed by user
+USER_SCOPED_ENDPOINTS = {"current_user_top_artists"}
+DEFAULT_MAX_ENTRIES = 5000
+
+_MISSING = object()
+
+
+class TTLCache:
+    """Thread safe LRU cache where every entry also expires after ttl_seconds"""
+
+    def __init__(self, max_entries: int, ttl_seconds: float, clock: Callable[[], float] = time.monotonic):
+        if max_entries < 1:
+            raise ValueError("TTLCache requires max_entries greater than 0")
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._entries.get(key, _MISSING)
+            if entry is _MISSING:
+                self.misses += 1
+                return default
+            expires_at, value = entry
+            if expires_at <= self.clock():
+                del self._entries[key]
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl_seconds: Optional[float] = None):
+        ttl_seconds = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        with self._lock:
+            self._entries[key] = (self.clock() + ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+
+class SpotifyResponseCache:
+    """One TTLCache per spotify endpoint, shared by every CachingSpotify in the worker"""
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, ttls: Optional[Dict[str, float]] = None):
+        ttls = ttls or ENDPOINT_TTLS
+        self.caches = {endpoint: TTLCache(max_entries, ttl) for endpoint, ttl in ttls.items()}
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        return {endpoint: cache.stats() for endpoint, cache in self.caches.items()}
+
+
+class CachingSpotify:
+    """Wraps a spotipy.Spotify client and serves repeat calls from a SpotifyResponseCache.
+    Endpoints that are not cached are passed straight through to the wrapped client.
+
+    user_key separates user scoped entries (e.g. top artists) between users.
+    When it is None, user scoped endpoints are never cached.
+    Cached responses are shared between requests so callers must not mutate them.
+
+    store is an optional TrackStore consulted for tracks and audio features after the
+    in memory cache misses. Network responses are written through to it.
+    """
+
+    def __init__(
+        self,
+        sp: spotipy.Spotify,
+        cache: SpotifyResponseCache,
+        user_key: Optional[str] = None,
+        store: Optional[TrackStore] = None,
+    ):
+        self.sp = sp
+        self.cache = cache
+        self.user_key = user_key
+        self.store = store
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.sp, name)
+
+    def _cached_call(self, endpoint: str, key: Tuple, fetch: Callable[[], Any]) -> Any:
+        if endpoint in USER_SCOPED_ENDPOINTS:
+            if self.user_key is None:
+                return fetch()
+            key = (self.user_key,) + key
+        cache = self.cache.caches[endpoint]
+        value = cache.get(key, _MISSING)
+        if value is _MISSING:
+            value = fetch()
+            cache.set(key, value)
+        return value
+
+    def track(self, track_id: str, market: Optional[str] = None) -> Dict[str, Any]:
+        def fetch():
+            # market specific responses are not written to the shared store
+            if self.store is None or market is not None:
+                return self.sp.track(track_id, market=market)
+            stored = self.store.get_many(TRACKS, [track_id])
+            if track_id in stored:
+                return stored[track_id]
+            track = self.sp.track(track_id, market=market)
+            self.store.put_many(TRACKS, {track_id: track})
+            return track
+
+        return self._cached_call("track", (track_id, market), fetch)
+
+    def tracks(self, tracks: List[str], market: Optional[str] = None) -> Dict[str, List[Dict[str, Any]]]:
+        """Shares per track entries with track() so bulk and single lookups warm each other"""
+        if market is not None:
+            return self.sp.tracks(tracks, market=market)
+        cache = self.cache.caches["track"]
+        tracks_per_id = {}
+        missing_ids = []
+        for track_id in tracks:
+            track = cache.get((track_id, None), _MISSING)
+            if track is _MISSING:
+                if track_id not in missing_ids:
+                    missing_ids.append(track_id)
+            else:
+                tracks_per_id[track_id] = track
+        if missing_ids and self.store is not None:
+            stored = self.store.get_many(TRACKS, missing_ids)
+            for track_id, track in stored.items():
+                tracks_per_id[track_id] = track
+                cache.set((track_id, None), track)
+            missing_ids = [track_id for track_id in missing_ids if track_id not in stored]
+        if missing_ids:
+            fetched = {}
+            for track_id, track in zip(missing_ids, self.sp.tracks(missing_ids)["tracks"]):
+                tracks_per_id[track_id] = track
+                if track is not None:
+                    cache.set((track_id, None), track)
+                    fetched[track_id] = track
+            if self.store is not None:
+                self.store.put_many(TRACKS, fetched)
+        return {"tracks": [tracks_per_id[track_id] for track_id in tracks]}
+
+    def audio_features(self, tracks: List[str]) -> List[Optional[Dict[str, Any]]]:
+        """Cached per track id so overlapping requests only fetch the ids that are missing"""
+        cache = self.cache.caches["audio_features"]
+        features_per_id = {}
+        missing_ids = []
+        for track_id in tracks:
+            features = cache.get(track_id, _MISSING)
+            if features is _MISSING:
+                if track_id not in missing_ids:
+                    missing_ids.append(track_id)
+            else:
+                features_per_id[track_id] = features
+        if missing_ids and self.store is not None:
+            stored = self.store.get_many(AUDIO_FEATURES, missing_ids)
+            for track_id, features in stored.items():
+                features_per_id[track_id] = features
+                cache.set(track_id, features)
+            missing_ids = [track_id for track_id in missing_ids if track_id not in stored]
+        if missing_ids:
+            fetched = {}
+            for track_id, features in zip(missing_ids, self.sp.audio_features(missing_ids)):
+                features_per_id[track_id] = features
+                # spotify returns None for unknown ids, don't cache those
+                if features is not None:
+                    cache.set(track_id, features)
+                    fetched[track_id] = features
+            if self.store is not None:
+                self.store.put_many(AUDIO_FEATURES, fetched)
+        return [features_per_id[track_id] for track_id in tracks]
+
+    def search(self, q: str, limit: int = 10, offset: int = 0, type: str = "track", market: Optional[str] = None):
+        return self._cached_call(
+            "search",
+            (q, limit, offset, type, market),
+            lambda: self.sp.search(q, limit=limit, offset=offset, type=type, market=market),
+        )
+
+    def current_user_top_artists(self, limit: int = 20, offset: int = 0, time_range: str = "medium_term"):
+        return self._cached_call(
+            "current_user_top_artists",
+            (limit, offset, time_range),
+            lambda: self.sp.current_user_top_artists(limit=limit, offset=offset, time_range=time_range),
+        )
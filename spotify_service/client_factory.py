@@ -0,0 +1,111 @@
+import threading
+from typing import Any, Dict, Optional
+
+import requests
+import spotipy
+
+# one pool per host, spotify traffic only goes to api.spotify.com and accounts.spotify.com
+POOL_CONNECTIONS = 4
+# upper bound on open connections per host for the whole worker
+DEFAULT_POOL_MAXSIZE = 64
+REQUESTS_TIMEOUT = 45
+
+
+class _SharedSession(requests.Session):
+    """spotipy.Spotify closes its session when the client is garbage collected,
+    which would drop every pooled connection. The factory owns this session, so only it closes it."""
+
+    def close(self):
+        pass
+
+    def close_pool(self):
+        super().close()
+
+
+class InstrumentedHTTPAdapter(requests.adapters.HTTPAdapter):
+    """HTTPAdapter that counts requests in flight so pool utilization can be reported"""
+
+    def __init__(self, *args, **kwargs):
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.requests = 0
+        super().__init__(*args, **kwargs)
+
+    def send(self, *args, **kwargs):
+        with self._lock:
+            self.in_flight += 1
+            self.requests += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            return super().send(*args, **kwargs)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+
+class SpotifyClientFactory:
+    """Hands out spotipy clients that share one bounded keep-alive connection pool.
+
+    Clients are cheap to create, so build one per request with the user's auth manager
+    instead of swapping a global client. Connections and TLS sessions to api.spotify.com
+    are reused across every client in the worker.
+    With pool_block set, callers wait for a free connection once pool_maxsize are in use
+    instead of opening connections that are thrown away after the request.
+    """
+
+    def __init__(
+        self,
+        pool_maxsize: int = DEFAULT_POOL_MAXSIZE,
+        pool_block: bool = True,
+        requests_timeout: float = REQUESTS_TIMEOUT,
+        api_url: Optional[str] = None,
+    ):
+        if pool_maxsize < 1:
+            raise ValueError("SpotifyClientFactory requires pool_maxsize greater than 0")
+        self.requests_timeout = requests_timeout
+        # points clients at a stand-in for api.spotify.com, e.g. benchmarks.fake_spotify_server
+        self.api_url = api_url
+        self.adapter = InstrumentedHTTPAdapter(
+            pool_connections=POOL_CONNECTIONS,
+            pool_maxsize=pool_maxsize,
+            pool_block=pool_block,
+        )
+        self.session = _SharedSession()
+        self.session.mount("https://", self.adapter)
+        self.session.mount("http://", self.adapter)
+
+    def client(self, auth_manager: Optional[Any] = None, auth: Optional[str] = None) -> spotipy.Spotify:
+        sp = spotipy.Spotify(
+            auth=auth,
+            auth_manager=auth_manager,
+            requests_session=self.session,
+            requests_timeout=self.requests_timeout,
+        )
+        if self.api_url is not None:
+            sp.prefix = self.api_url.rstrip("/") + "/v1/"
+        return sp
+
+    def close(self):
+        self.session.close_pool()
+
+    def stats(self) -> Dict[str, Any]:
+        """in flight counts plus, per host, connections opened, idle and the pool bound"""
+        pools = {}
+        pool_manager = self.adapter.poolmanager
+        for key in pool_manager.pools.keys():
+            pool = pool_manager.pools.get(key)
+            if pool is None or pool.pool is None:
+                continue
+            pools[pool.host] = {
+                "connections_opened": pool.num_connections,
+                "requests": pool.num_requests,
+                "idle": sum(conn is not None for conn in list(pool.pool.queue)),
+                "maxsize": pool.pool.maxsize,
+            }
+        return {
+            "in_flight": self.adapter.in_flight,
+            "peak_in_flight": self.adapter.peak_in_flight,
+            "requests": self.adapter.requests,
+            "pools": pools,
+        }
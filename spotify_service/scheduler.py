@@ -0,0 +1,223 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+import spotipy
+from werkzeug.exceptions import ServiceUnavailable
+
+from utils.tracing import tracer
+
+# lanes, lower is higher priority
+INTERACTIVE = 0
+BATCH = 1
+LANES = (INTERACTIVE, BATCH)
+LANE_NAMES = {INTERACTIVE: "interactive", BATCH: "batch"}
+
+# spotify doesn't publish its quota (a rolling 30 second window per app), these keep us well under it.
+# the app limits are for the whole app, each worker process gets its share (see SpotifyScheduler's workers).
+# a user's requests only reach one worker at a time, so the user limits aren't split
+APP_RATE_PER_SECOND = 20.0
+APP_BURST = 40
+USER_RATE_PER_SECOND = 5.0
+USER_BURST = 20
+# share of the app bucket only the interactive lane may spend, so playlist builds can't starve autocomplete
+INTERACTIVE_RESERVE = 0.25
+# autocomplete results are worthless after a couple seconds, playlist builds can wait
+MAX_WAIT_SECONDS = {INTERACTIVE: 2.0, BATCH: 30.0}
+# callers allowed to wait per lane before new calls are shed immediately
+MAX_WAITING = {INTERACTIVE: 100, BATCH: 50}
+MAX_RETRIES = 2
+MAX_USER_BUCKETS = 10_000
+
+
+class SpotifyOverloaded(ServiceUnavailable):
+    """Raised when a spotify call is shed instead of queued. Rendered by flask as a 503 with Retry-After."""
+
+    description = "Spotify is busy, please try again shortly"
+
+
+class TokenBucket:
+    """Refills rate tokens per second up to capacity. Not thread safe, SpotifyScheduler holds the lock."""
+
+    def __init__(self, rate: float, capacity: float, clock: Callable[[], float]):
+        self.rate = rate
+        self.capacity = capacity
+        self.clock = clock
+        self.tokens = capacity
+        self.updated_at = clock()
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def wait_time(self, tokens: float = 1, reserve: float = 0) -> float:
+        """seconds until tokens can be taken while leaving reserve tokens in the bucket"""
+        self._refill()
+        missing = tokens + reserve - self.tokens
+        return max(0.0, missing / self.rate)
+
+    def take(self, tokens: float = 1):
+        self.tokens -= tokens
+
+
+class SpotifyScheduler:
+    """Central admission control for spotify calls, shared by every client in the worker.
+
+    Each call spends a token from the app bucket and, when a user key is given, the user's bucket.
+    BATCH calls can't dip into the reserve of the app bucket held back for INTERACTIVE calls.
+    Callers that can't get a token wait up to their lane's max wait, or are shed with
+    SpotifyOverloaded when the wait would be longer or too many callers are already waiting.
+    A 429 pauses every lane for Retry-After seconds and the call is retried.
+    Buckets live in the worker process, so with workers > 1 the app rate and burst are split evenly
+    and the workers together stay within the app's limits. Each worker's burst is kept at one token
+    at least and the BATCH reserve never leaves less than one token, however many workers share
+    the limits, so no lane is shed outright.
+    """
+
+    def __init__(
+        self,
+        app_rate: float = APP_RATE_PER_SECOND,
+        app_burst: float = APP_BURST,
+        user_rate: float = USER_RATE_PER_SECOND,
+        user_burst: float = USER_BURST,
+        interactive_reserve: float = INTERACTIVE_RESERVE,
+        max_wait_seconds: Optional[Dict[int, float]] = None,
+        max_waiting: Optional[Dict[int, int]] = None,
+        max_retries: int = MAX_RETRIES,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+        workers: int = 1,
+    ):
+        if workers < 1:
+            raise ValueError("SpotifyScheduler requires workers greater than 0")
+        app_burst = max(app_burst / workers, 1)
+        self.clock = clock
+        self.sleep = sleep
+        self.app_bucket = TokenBucket(app_rate / workers, app_burst, clock)
+        self.user_rate = user_rate
+        self.user_burst = max(user_burst, 1)
+        self.reserve = {INTERACTIVE: 0.0, BATCH: min(app_burst * interactive_reserve, app_burst - 1)}
+        self.max_wait_seconds = max_wait_seconds or MAX_WAIT_SECONDS
+        self.max_waiting = max_waiting or MAX_WAITING
+        self.max_retries = max_retries
+        self.blocked_until = 0.0
+        self.waiting = {lane: 0 for lane in LANES}
+        self.admitted = {lane: 0 for lane in LANES}
+        self.shed = {lane: 0 for lane in LANES}
+        self.rate_limited = 0
+        self._user_buckets: "OrderedDict[Hashable, TokenBucket]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _user_bucket(self, user_key: Hashable) -> TokenBucket:
+        bucket = self._user_buckets.get(user_key)
+        if bucket is None:
+            bucket = TokenBucket(self.user_rate, self.user_burst, self.clock)
+            self._user_buckets[user_key] = bucket
+            if len(self._user_buckets) > MAX_USER_BUCKETS:
+                self._user_buckets.popitem(last=False)
+        self._user_buckets.move_to_end(user_key)
+        return bucket
+
+    def _shed(self, lane: int, retry_after: float):
+        self.shed[lane] += 1
+        raise SpotifyOverloaded(retry_after=max(1, math.ceil(retry_after)))
+
+    def acquire(self, lane: int = BATCH, user_key: Optional[Hashable] = None):
+        """blocks until the call may go out, or raises SpotifyOverloaded"""
+        deadline = self.clock() + self.max_wait_seconds[lane]
+        queued = False
+        try:
+            while True:
+                with self._lock:
+                    now = self.clock()
+                    user_bucket = self._user_bucket(user_key) if user_key is not None else None
+                    wait = max(
+                        self.blocked_until - now,
+                        self.app_bucket.wait_time(reserve=self.reserve[lane]),
+                        user_bucket.wait_time() if user_bucket is not None else 0.0,
+                    )
+                    if wait <= 0:
+                        self.app_bucket.take()
+                        if user_bucket is not None:
+                            user_bucket.take()
+                        self.admitted[lane] += 1
+                        return
+                    if now + wait > deadline:
+                        self._shed(lane, wait)
+                    if not queued:
+                        if self.waiting[lane] >= self.max_waiting[lane]:
+                            self._shed(lane, wait)
+                        self.waiting[lane] += 1
+                        queued = True
+                self.sleep(wait)
+        finally:
+            if queued:
+                with self._lock:
+                    self.waiting[lane] -= 1
+
+    def _rate_limited(self, e: spotipy.SpotifyException) -> float:
+        try:
+            retry_after = float(e.headers.get("Retry-After", 1))
+        except (TypeError, ValueError):
+            retry_after = 1.0
+        with self._lock:
+            self.rate_limited += 1
+            self.blocked_until = max(self.blocked_until, self.clock() + retry_after)
+        return retry_after
+
+    def call(self, lane: int, user_key: Optional[Hashable], fn: Callable[..., Any], *args, **kwargs) -> Any:
+        for attempt in range(self.max_retries + 1):
+            self.acquire(lane, user_key)
+            try:
+                return fn(*args, **kwargs)
+            except spotipy.SpotifyException as e:
+                if e.http_status != 429:
+                    raise
+                retry_after = self._rate_limited(e)
+                if attempt == self.max_retries:
+                    self._shed(lane, retry_after)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "admitted": dict(self.admitted),
+                "shed": dict(self.shed),
+                "waiting": dict(self.waiting),
+                "rate_limited": self.rate_limited,
+                "blocked_for": max(0.0, self.blocked_until - self.clock()),
+                "app_tokens": self.app_bucket.tokens,
+            }
+
+
+class ScheduledSpotify:
+    """Wraps a spotipy.Spotify client so every api call goes through a SpotifyScheduler in one lane"""
+
+    def __init__(
+        self,
+        sp: spotipy.Spotify,
+        scheduler: SpotifyScheduler,
+        lane: int = BATCH,
+        user_key: Optional[Hashable] = None,
+    ):
+        self.sp = sp
+        self.scheduler = scheduler
+        self.lane = lane
+        self.user_key = user_key
+
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(self.sp, name)
+        if not callable(attr):
+            return attr
+
+        def timed(*args, **kwargs):
+            # timed inside the scheduler so waiting for a token isn't counted as spotify latency
+            with tracer.spotify_call(name):
+                return attr(*args, **kwargs)
+
+        def scheduled(*args, **kwargs):
+            return self.scheduler.call(self.lane, self.user_key, timed, *args, **kwargs)
+
+        return scheduled
@@ -0,0 +1,119 @@
+import contextlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterator, List
+
+# kinds of entries held in the store
+TRACKS = "track"
+AUDIO_FEATURES = "audio_features"
+
+DEFAULT_MAX_ENTRIES = 200_000
+# only check the size bound every so many writes, COUNT(*) is a table scan
+EVICTION_CHECK_INTERVAL = 100
+# reads refresh accessed_at at most this often so hot rows don't turn every read into a write
+ACCESS_TOUCH_SECONDS = 60 * 60
+# sqlite caps the number of host parameters in a statement
+MAX_IDS_PER_QUERY = 500
+
+
+class TrackStore:
+    """Persistent track metadata and audio feature store shared by every gunicorn worker on the host.
+
+    Backed by sqlite in WAL mode so readers in any process never block on a writer.
+    Rows are evicted least recently used first once the store grows past max_entries.
+    Each process opens one connection and serializes its threads (or gevent greenlets) on a lock,
+    a thread local would open a connection per greenlet and never close it.
+    """
+
+    def __init__(self, path: str, max_entries: int = DEFAULT_MAX_ENTRIES):
+        if max_entries < 1:
+            raise ValueError("TrackStore requires max_entries greater than 0")
+        self.path = path
+        self.max_entries = max_entries
+        self._conn = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._writes_since_eviction_check = 0
+        with self._connection() as conn, conn:
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS entries (
+                    kind TEXT NOT NULL,
+                    id TEXT NOT NULL,
+                    body TEXT NOT NULL,
+                    accessed_at REAL NOT NULL,
+                    PRIMARY KEY (kind, id)
+                )"""
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed_at ON entries (accessed_at)")
+
+    @contextlib.contextmanager
+    def _connection(self) -> Iterator[sqlite3.Connection]:
+        if self._pid != os.getpid():
+            # a connection (or a lock held at fork time) inherited from the parent can't be used
+            self._conn = None
+            self._lock = threading.Lock()
+            self._pid = os.getpid()
+        with self._lock:
+            if self._conn is None:
+                self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+                self._conn.execute("PRAGMA journal_mode=WAL")
+                self._conn.execute("PRAGMA synchronous=NORMAL")
+            yield self._conn
+
+    def get_many(self, kind: str, ids: List[str]) -> Dict[str, Any]:
+        """returns {id: stored body} for every id that is in the store"""
+        found = {}
+        now = time.time()
+        with self._connection() as conn:
+            for start in range(0, len(ids), MAX_IDS_PER_QUERY):
+                chunk = ids[start:start + MAX_IDS_PER_QUERY]
+                placeholders = ",".join("?" * len(chunk))
+                rows = conn.execute(
+                    f"SELECT id, body, accessed_at FROM entries WHERE kind = ? AND id IN ({placeholders})",
+                    [kind, *chunk],
+                ).fetchall()
+                stale_ids = []
+                for entry_id, body, accessed_at in rows:
+                    found[entry_id] = json.loads(body)
+                    if accessed_at < now - ACCESS_TOUCH_SECONDS:
+                        stale_ids.append(entry_id)
+                if stale_ids:
+                    with conn:
+                        conn.execute(
+                            f"UPDATE entries SET accessed_at = ? WHERE kind = ? AND id IN ({','.join('?' * len(stale_ids))})",
+                            [now, kind, *stale_ids],
+                        )
+        return found
+
+    def put_many(self, kind: str, bodies: Dict[str, Any]):
+        if not bodies:
+            return
+        now = time.time()
+        with self._connection() as conn, conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO entries (kind, id, body, accessed_at) VALUES (?, ?, ?, ?)",
+                [(kind, entry_id, json.dumps(body), now) for entry_id, body in bodies.items()],
+            )
+        self._writes_since_eviction_check += len(bodies)
+        if self._writes_since_eviction_check >= EVICTION_CHECK_INTERVAL:
+            self.evict()
+
+    def evict(self):
+        """deletes the least recently used rows beyond max_entries"""
+        self._writes_since_eviction_check = 0
+        with self._connection() as conn, conn:
+            (count,) = conn.execute("SELECT COUNT(*) FROM entries").fetchone()
+            excess = count - self.max_entries
+            if excess > 0:
+                conn.execute(
+                    "DELETE FROM entries WHERE rowid IN (SELECT rowid FROM entries ORDER BY accessed_at LIMIT ?)",
+                    (excess,),
+                )
+
+    def __len__(self) -> int:
+        with self._connection() as conn:
+            (count,) = conn.execute("SELECT COUNT(*) FROM entries").fetchone()
+        return count
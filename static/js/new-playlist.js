@@ -51,6 +51,24 @@ async function submitPlaylistRequest(playlistData) {
   }
 }
 
+// spotify generates the mosaic cover a few seconds after the tracks are added
+const COVER_RETRY_DELAYS_MS = [1000, 3000, 6000];
+
+async function fetchPlaylistCover(playlistId) {
+  for (const delay of COVER_RETRY_DELAYS_MS) {
+    await new Promise(resolve => setTimeout(resolve, delay));
+    const response = await fetch(`/playlist_cover/${playlistId}`);
+    if (!response.ok) {
+      return null;
+    }
+    const { image } = await response.json();
+    if (image) {
+      return image;
+    }
+  }
+  return null;
+}
+
 // UI Components
 class PlaylistModal {
   constructor() {
@@ -93,6 +111,14 @@ class PlaylistModal {
     this.modalContainer.style.display = "none";
   }
 
+  async loadCover(playlistId, thumbnailImg) {
+    const image = await fetchPlaylistCover(playlistId).catch(() => null);
+    // skip it if the modal has moved on to another playlist
+    if (image && this.thumbnail === thumbnailImg) {
+      thumbnailImg.src = image;
+    }
+  }
+
   renderPlaylistResult(data) {
     // Show main content and hide placeholder
     this.content.style.display = "block";
@@ -104,7 +130,11 @@ class PlaylistModal {
     // Create new img element
     const thumbnailImg = document.createElement('img');
     thumbnailImg.id = 'playlist-thumbnail';
-    thumbnailImg.src = data.image;
+    // spotify may not have generated the mosaic cover yet, show the logo until it's there
+    thumbnailImg.src = data.image || 'static/images/wave_guide_logo.png';
+    if (!data.image && data.id) {
+      this.loadCover(data.id, thumbnailImg);
+    }
     thumbnailImg.alt = 'Playlist Cover';
     thumbnailImg.className = 'playlist-thumbnail';
 
@@ -159,6 +159,41 @@ describe('PlaylistModal', () => {
     expect(playlistLink).toBeVisible();
   });
 
+  test('fetches the cover when the playlist has none yet', async () => {
+    jest.useFakeTimers();
+    const mockState = {
+      getSourceMode: () => 'song',
+      getSourceTrackId: () => 'track123',
+      getSourceMood: () => '',
+      getDestinationMode: () => 'mood',
+      getDestinationTrackId: () => '',
+      getDestinationMood: () => 'happy'
+    };
+
+    fetch
+      .mockImplementationOnce(() =>
+        Promise.resolve({
+          ok: true,
+          status: 200,
+          statusText: 'OK',
+          json: () => Promise.resolve({ id: 'playlist123', name: 'Test Playlist', url: 'https://spotify.com/playlist/123', image: null })
+        })
+      )
+      .mockImplementationOnce(() =>
+        Promise.resolve({ ok: true, json: () => Promise.resolve({ image: 'mosaic.jpg' }) })
+      );
+
+    await createPlaylist(mockState);
+    // the logo until the cover is generated
+    expect(document.querySelector('img[src*="wave_guide_logo.png"]')).toBeInTheDocument();
+
+    await jest.runAllTimersAsync();
+
+    expect(fetch).toHaveBeenLastCalledWith('/playlist_cover/playlist123');
+    expect(document.querySelector('img[src*="mosaic.jpg"]')).toBeInTheDocument();
+    jest.useRealTimers();
+  });
+
   test('hideModal hides the modal', () => {
     // Set initial display states
     const modalContainer = document.getElementById('modal-container');
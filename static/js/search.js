@@ -18,11 +18,14 @@ const createElement = (tag, attributes = {}, classes = []) => {
   return element;
 };
 
+// offline search results have no album art
+const FALLBACK_IMAGE = 'static/images/wave_guide_logo.png';
+
 const createTrackResult = (item) => {
   const { track_name, artist_name, small_image } = item;
   
   const img = createElement('img', {
-    src: small_image,
+    src: small_image || FALLBACK_IMAGE,
     alt: `Album art for ${track_name}`
   }, ['search-result-thumbnail']);
   
@@ -44,7 +47,7 @@ const createSelectedTrackHTML = (trackName, artistName, imageUrl) => {
   const container = createElement('div', {}, ['selected-track-container']);
   
   const img = createElement('img', {
-    src: imageUrl,
+    src: imageUrl || FALLBACK_IMAGE,
     alt: `Album art for ${trackName}`
   }, ['selected-thumbnail']);
   
@@ -0,0 +1,104 @@
+import numpy as np
+import pytest
+from recommendation_engine.ann_index import IVFTrackIndex, train_kmeans
+from recommendation_engine.vector_index import ExactTrackIndex, COSINE, EUCLIDEAN
+
+
+@pytest.fixture
+def vectors():
+    rng = np.random.default_rng(7)
+    return rng.random((2000, 11), dtype=np.float32)
+
+
+def recall(approximate, exact):
+    return np.mean([len(set(a) & set(e)) / len(e) for a, e in zip(approximate, exact)])
+
+
+def test_train_kmeans_shape(vectors):
+    centroids = train_kmeans(vectors, 16, iterations=5)
+    assert centroids.shape == (16, 11)
+    assert centroids.dtype == np.float32
+
+
+@pytest.mark.parametrize("metric", [COSINE, EUCLIDEAN])
+def test_probing_every_list_is_exact(vectors, metric):
+    index = IVFTrackIndex.build(vectors, num_lists=16, metric=metric, iterations=5)
+    exact = ExactTrackIndex(vectors, metric=metric)
+    queries = vectors[:20] + 0.01
+
+    indices, distances = index.search(queries, k=5, nprobe=16)
+    exact_indices, exact_distances = exact.search(queries, k=5)
+
+    assert recall(indices, exact_indices) == 1.0
+    np.testing.assert_allclose(distances, exact_distances, atol=1e-4)
+
+
+def test_recall_improves_with_nprobe(vectors):
+    index = IVFTrackIndex.build(vectors, num_lists=32, metric=EUCLIDEAN, iterations=5)
+    exact_indices, _ = ExactTrackIndex(vectors, metric=EUCLIDEAN).search(vectors[:50], k=10)
+    low, _ = index.search(vectors[:50], k=10, nprobe=1)
+    high, _ = index.search(vectors[:50], k=10, nprobe=8)
+
+    assert recall(low, exact_indices) <= recall(high, exact_indices)
+    assert recall(high, exact_indices) > 0.8
+
+
+def test_incremental_insert(vectors):
+    index = IVFTrackIndex.build(vectors[:1000], num_lists=8, metric=EUCLIDEAN, iterations=5)
+    rows = index.add(vectors[1000:1010])
+
+    assert rows.tolist() == list(range(1000, 1010))
+    assert len(index) == 1010
+    indices, _ = index.search(vectors[1005], k=1, nprobe=8)
+    assert indices[0, 0] == 1005
+
+
+def test_single_adds_match_one_batch(vectors):
+    batch = IVFTrackIndex.build(vectors[:500], num_lists=8, metric=EUCLIDEAN, iterations=5)
+    single = IVFTrackIndex(batch.centroids, metric=EUCLIDEAN)
+    for vector in vectors[:500]:
+        single.add(vector)
+
+    np.testing.assert_array_equal(single.vectors, batch.vectors)
+    for single_rows, batch_rows in zip(single.lists, batch.lists):
+        np.testing.assert_array_equal(single_rows, batch_rows)
+    # buffers grow by doubling instead of by the rows added
+    assert len(single._new_vectors) == 512
+
+
+def test_exclude_mask(vectors):
+    index = IVFTrackIndex.build(vectors, num_lists=8, metric=EUCLIDEAN, iterations=5)
+    exclude = np.zeros(len(vectors), dtype=bool)
+    exclude[3] = True
+    indices, _ = index.search(vectors[3], k=3, nprobe=8, exclude=exclude)
+    assert 3 not in indices[0]
+
+
+def test_save_and_load_round_trip(vectors, tmp_path):
+    index = IVFTrackIndex.build(vectors, num_lists=8, metric=COSINE, nprobe=3, iterations=5)
+    index.save(tmp_path / "ivf")
+    loaded = IVFTrackIndex.load(tmp_path / "ivf")
+
+    assert loaded.nprobe == 3
+    assert loaded.metric == COSINE
+    np.testing.assert_array_equal(loaded.search(vectors[:5], k=4)[0], index.search(vectors[:5], k=4)[0])
+    # inserts go to a separate buffer, the loaded arrays stay memory mapped
+    row = loaded.add(vectors[:1])[0]
+    assert len(loaded) == len(vectors) + 1
+    assert isinstance(loaded._stored_vectors, np.memmap)
+    indices, _ = loaded.search(vectors[0], k=2, nprobe=8)
+    assert sorted(indices[0].tolist()) == [0, row]
+
+
+def test_distinct_search_probes_more_lists(vectors):
+    # every track in a list shares its artist, so one probe can only fill one slot
+    index = IVFTrackIndex.build(vectors, num_lists=16, iterations=5)
+    artists = np.empty(len(vectors), dtype=np.int64)
+    for list_number, rows in enumerate(index.lists):
+        artists[rows] = list_number
+
+    indices, _ = index.search(vectors[:3], k=5, nprobe=1, distinct=(artists,))
+
+    assert (indices >= 0).all()
+    for row in indices:
+        assert len(set(artists[row])) == 5
@@ -1,6 +1,6 @@
 import pytest
 from unittest.mock import Mock
-from recommendation_engine.bookend_seeds_track_finder import BookendSeedsTrackFinder
+from recommendation_engine.bookend_seeds_track_finder import BookendSeedsTrackFinder, SLOT_FILLED
 
 @pytest.fixture
 def mock_spotify():
@@ -155,4 +155,63 @@ def test_skip_duplicate_titles_and_artists_only_dupes_available():
     assert result == {
         "name": "Duplicate Track",
         "artists": [{"id": "duplicate_artist"}]
-    }
\ No newline at end of file
+    }
+
+def test_recommend_concurrent_matches_sequential(seed_track, destination_track):
+    def recommendations(limit, seed_tracks, country, **kwargs):
+        # every slot sees the same pool so de-duplication order decides the playlist
+        return {
+            "tracks": [
+                {"id": f"track{i}", "name": f"Track {i}", "artists": [{"id": f"artist{i}"}]}
+                for i in range(limit)
+            ]
+        }
+
+    playlists = []
+    for concurrent in [False, True]:
+        sp = Mock()
+        sp.audio_features.return_value = [
+            {"energy": 0.8, "danceability": 0.7, "valence": 0.6},
+            {"energy": 0.2, "danceability": 0.3, "valence": 0.4},
+        ]
+        sp.recommendations.side_effect = recommendations
+        finder = BookendSeedsTrackFinder(sp, seed_track, destination_track, concurrent=concurrent)
+        playlists.append(finder.recommend())
+        assert sp.recommendations.call_count == 5
+
+    assert playlists[0] == playlists[1]
+    assert [track["id"] for track in playlists[1][1:-1]] == ["track0", "track3", "track1", "track0", "track2"]
+
+
+def test_recommend_uses_one_waypoint_per_slot(mock_spotify, seed_track, destination_track):
+    finder = BookendSeedsTrackFinder(
+        mock_spotify,
+        seed_track,
+        destination_track,
+        target_min_multiplier={"energy": 0.5},
+        target_max_multipler={"energy": 2},
+        concurrent=False,
+        curve="linear",
+    )
+    finder.recommend()
+
+    # calls are made in r0, r2, r4, r1, r3 order
+    energy_targets = [call.kwargs["target_energy"] for call in mock_spotify.recommendations.call_args_list]
+    assert energy_targets == pytest.approx([0.7, 0.5, 0.3, 0.6, 0.4])
+    first_call = mock_spotify.recommendations.call_args_list[0].kwargs
+    assert first_call["min_energy"] == pytest.approx(0.35)
+    assert first_call["max_energy"] == pytest.approx(1.4)
+    assert first_call["min_valence"] == 0
+    assert "max_valence" not in first_call
+    # the bookend features are left untouched
+    assert finder.source_features["energy"] == 0.8
+
+
+def test_recommend_reports_each_slot(mock_spotify, seed_track, destination_track):
+    progress = Mock()
+    finder = BookendSeedsTrackFinder(mock_spotify, seed_track, destination_track, concurrent=False)
+    playlist = finder.recommend(progress=progress)
+
+    assert [call.args[0] for call in progress.call_args_list] == [SLOT_FILLED] * 5
+    assert [call.kwargs["slot"] for call in progress.call_args_list] == [1, 3, 5, 2, 4]
+    assert progress.call_args_list[0].kwargs["track"]["id"] == playlist[1]["id"]
@@ -0,0 +1,94 @@
+import time
+import pytest
+from unittest.mock import Mock
+from recommendation_engine.mood_pools import MoodCandidatePools
+from recommendation_engine.mood_track_finder import (
+    MoodTrackFinder,
+    MOOD_HAPPY,
+    MOOD_CALM,
+    SUPPORTED_MOODS,
+)
+
+
+def _track(i, artist_id):
+    return {"id": f"track_{i}", "artists": [{"id": artist_id}]}
+
+
+@pytest.fixture
+def mock_spotify():
+    mock_sp = Mock()
+    mock_sp.current_user_top_artists.return_value = {
+        "total": 5,
+        "items": [{"id": "artist_top", "name": "Top Artist"}]
+        + [{"id": f"artist_other_{i}", "name": f"Artist {i}"} for i in range(4)],
+    }
+    mock_sp.recommendations.return_value = {
+        "tracks": [_track(i, "artist_top" if i == 7 else f"artist_{i}") for i in range(10)]
+    }
+    return mock_sp
+
+
+def test_refresh_fetches_every_mood(mock_spotify):
+    pools = MoodCandidatePools(mock_spotify, pool_size=10)
+    pools.refresh()
+
+    assert mock_spotify.recommendations.call_count == len(SUPPORTED_MOODS)
+    for mood in SUPPORTED_MOODS:
+        assert len(pools.get(mood)) == 10
+    call_kwargs = mock_spotify.recommendations.call_args_list[0][1]
+    assert call_kwargs["limit"] == 10
+    assert call_kwargs["min_valence"] == 0.8
+
+
+def test_failed_refresh_keeps_previous_pool(mock_spotify):
+    pools = MoodCandidatePools(mock_spotify)
+    pools.refresh([MOOD_HAPPY])
+    mock_spotify.recommendations.side_effect = Exception("boom")
+    pools.refresh([MOOD_HAPPY])
+
+    assert len(pools.get(MOOD_HAPPY)) == 10
+
+
+def test_sample_prefers_top_artists(mock_spotify):
+    pools = MoodCandidatePools(mock_spotify)
+    pools.refresh([MOOD_HAPPY])
+    tracks = pools.sample(MOOD_HAPPY, 3, ["artist_top"])
+
+    assert len(tracks) == 3
+    assert tracks[0]["id"] == "track_7"
+    assert len({track["id"] for track in tracks}) == 3
+
+
+def test_finder_samples_from_pool(mock_spotify):
+    pools = MoodCandidatePools(mock_spotify)
+    pools.refresh([MOOD_HAPPY])
+    mock_spotify.recommendations.reset_mock()
+
+    tracks = MoodTrackFinder(mock_spotify, MOOD_HAPPY, 2, pools=pools).find()
+
+    assert len(tracks) == 2
+    assert tracks[0]["id"] == "track_7"
+    mock_spotify.recommendations.assert_not_called()
+
+
+def test_finder_falls_back_when_pool_empty(mock_spotify):
+    pools = MoodCandidatePools(mock_spotify)
+    tracks = MoodTrackFinder(mock_spotify, MOOD_CALM, 2, pools=pools).find()
+
+    mock_spotify.recommendations.assert_called_once()
+    assert len(tracks) == 10
+
+
+def test_refresh_starts_on_first_use(mock_spotify):
+    pools = MoodCandidatePools(mock_spotify, refresh_interval_seconds=3600, start_on_first_use=True)
+    assert pools._thread is None
+    mock_spotify.recommendations.assert_not_called()
+
+    pools.get(MOOD_HAPPY)
+    deadline = time.monotonic() + 5
+    while not all(pools.get(mood) for mood in SUPPORTED_MOODS) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    pools.stop()
+
+    assert mock_spotify.recommendations.call_count == len(SUPPORTED_MOODS)
+    assert len(pools.get(MOOD_HAPPY)) == 10
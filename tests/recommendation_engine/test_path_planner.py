@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+from recommendation_engine.path_planner import (
+    path_fractions,
+    plan_waypoints,
+    LINEAR,
+    EASE_IN,
+    EASE_OUT,
+    EASE_IN_OUT,
+    GEOMETRIC,
+    SUPPORTED_CURVES,
+)
+
+
+def test_linear_waypoints_are_evenly_spaced():
+    waypoints = plan_waypoints([0.0, 1.0], [1.0, 0.0], 4)
+    np.testing.assert_allclose(waypoints, [[0.2, 0.8], [0.4, 0.6], [0.6, 0.4], [0.8, 0.2]])
+
+
+def test_geometric_matches_legacy_bookend_targets():
+    # each step covered 1/num_tracks of the remaining distance
+    source, destination, expected = 0.8, 0.2, []
+    current = source
+    for _ in range(5):
+        current = current + (destination - current) / 5
+        expected.append(current)
+    np.testing.assert_allclose(plan_waypoints([source], [destination], 5, curve=GEOMETRIC)[:, 0], expected)
+
+
+@pytest.mark.parametrize("curve", SUPPORTED_CURVES)
+def test_fractions_are_increasing_and_between_bookends(curve):
+    fractions = path_fractions(7, curve)
+    assert fractions.shape == (7,)
+    assert (np.diff(fractions) > 0).all()
+    assert fractions[0] > 0 and fractions[-1] < 1
+
+
+def test_eased_curves():
+    linear = path_fractions(5, LINEAR)
+    assert (path_fractions(5, EASE_IN) <= linear).all()
+    assert (path_fractions(5, EASE_OUT) >= linear).all()
+    np.testing.assert_allclose(path_fractions(5, EASE_IN_OUT)[2], 0.5)
+
+
+def test_plans_several_legs_at_once():
+    sources = np.zeros((3, 11))
+    destinations = np.ones((3, 11))
+    waypoints = plan_waypoints(sources, destinations, 9)
+    assert waypoints.shape == (3, 9, 11)
+    np.testing.assert_allclose(waypoints[:, 4, :], 0.5)
+
+
+def test_invalid_arguments():
+    with pytest.raises(ValueError, match="Unknown curve"):
+        path_fractions(3, "bounce")
+    with pytest.raises(ValueError, match="num_waypoints"):
+        path_fractions(0)
+    with pytest.raises(ValueError, match="does not match"):
+        plan_waypoints([0, 0], [1, 1, 1], 3)
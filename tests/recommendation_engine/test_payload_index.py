@@ -0,0 +1,55 @@
+import numpy as np
+from recommendation_engine.payload_index import PayloadIndex, first_distinct, nearest_distinct
+
+
+def test_codes_and_postings():
+    index = PayloadIndex(["b", "a", "b", "c", "a"])
+
+    assert index.values == ["a", "b", "c"]
+    assert index.codes.tolist() == [1, 0, 1, 2, 0]
+    assert index.value(3) == "c"
+    assert index.rows_for(index.lookup(["a", "c"])).tolist() == [1, 3, 4]
+
+
+def test_lookup_drops_unknown_values():
+    index = PayloadIndex(["a", "b"])
+
+    assert index.lookup(["b", "z"]).tolist() == [1]
+    assert index.lookup([]).tolist() == []
+    assert PayloadIndex([]).lookup(["a"]).tolist() == []
+
+
+def test_rows_cost_a_code_not_the_longest_value():
+    index = PayloadIndex(iter(["short", "x" * 1000, "short"]))
+
+    assert index.codes.dtype == np.int32
+    assert index.rows_for(index.lookup(["short"])).tolist() == [0, 2]
+
+
+def test_mask_sets_rows_in_out():
+    index = PayloadIndex(["a", "b", "a"])
+    out = np.array([False, True, False])
+
+    mask = index.mask(index.lookup(["a"]), out=out)
+
+    assert mask is out
+    assert mask.tolist() == [True, True, True]
+
+
+def test_first_distinct_skips_taken_codes():
+    artists = np.array([0, 0, 1, 2, 3])
+    titles = np.array([0, 1, 2, 2, 3])
+
+    assert first_distinct(np.arange(5), 5, (artists, titles)).tolist() == [0, 2, 4]
+    assert first_distinct(np.arange(5), 2, (artists,)).tolist() == [0, 2]
+
+
+def test_nearest_distinct_widens_past_duplicates():
+    # the 20 nearest rows share one artist, the next ones are all distinct
+    artists = np.array([0] * 20 + list(range(1, 11)))
+    distances = np.arange(30, dtype=np.float32)
+    distances[5] = np.inf
+
+    chosen = nearest_distinct(distances, np.arange(30), 4, (artists,))
+
+    assert chosen.tolist() == [0, 20, 21, 22]
@@ -1,6 +1,6 @@
 import pytest
 from unittest.mock import Mock, patch
-from recommendation_engine.playlist import create_song_to_song_playlist, _create_spotify_playlist
+from recommendation_engine.playlist import create_playlist, create_song_to_song_playlist, playlist_cover, _create_spotify_playlist
 
 @pytest.fixture
 def mock_spotify():
@@ -30,11 +30,10 @@ def mock_playlist_response():
 def test_create_playlist(mock_spotify, mock_track_response):
     # Arrange
     mock_spotify.current_user.return_value = {"id": "test_user"}
-    mock_spotify.user_playlist_create.return_value = {"id": "playlist123"}
-    mock_spotify.user_playlist.return_value = {
+    mock_spotify.user_playlist_create.return_value = {
+        "id": "playlist123",
         "external_urls": {"spotify": "https://test-url"},
         "name": "Test Playlist",
-        "images": [{"url": "https://test-image"}]
     }
     
     recommendation_uris = ["spotify:track:1", "spotify:track:2"]
@@ -51,9 +50,41 @@ def test_create_playlist(mock_spotify, mock_track_response):
     )
     mock_spotify.playlist_add_items.assert_called_once_with("playlist123", recommendation_uris)
     
+    mock_spotify.user_playlist.assert_not_called()
+    mock_spotify.playlist_cover_image.assert_not_called()
+
     assert result["url"] == "https://test-url"
     assert result["name"] == "Test Playlist"
-    assert result["image"] == "https://test-image"
+    # no cover yet in the create response
+    assert result["image"] is None
+
+def test_create_playlist_with_known_user(mock_spotify, mock_playlist_response):
+    mock_spotify.user_playlist_create.return_value = mock_playlist_response
+
+    result = _create_spotify_playlist(mock_spotify, ["uri1"], "Point A", "Point B", user_id="test_user")
+
+    # only the create and add items calls are left on the write path
+    mock_spotify.current_user.assert_not_called()
+    mock_spotify.user_playlist_create.assert_called_once_with(
+        "test_user", "Wave Guide from Point A to Point B", public=False
+    )
+    assert result == {
+        "id": "playlist123",
+        "url": "https://open.spotify.com/playlist/123",
+        "name": "Wave Guide from Test Track A to Test Track B",
+        "image": "https://example.com/playlist-cover.jpg",
+    }
+    mock_spotify.playlist_cover_image.assert_not_called()
+
+def test_playlist_cover_requests_only_images(mock_spotify):
+    mock_spotify.playlist.return_value = {"images": [{"url": "https://example.com/mosaic.jpg"}]}
+
+    assert playlist_cover(mock_spotify, "playlist123") == "https://example.com/mosaic.jpg"
+    mock_spotify.playlist.assert_called_once_with("playlist123", fields="images")
+
+    # not generated yet
+    mock_spotify.playlist.return_value = {"images": []}
+    assert playlist_cover(mock_spotify, "playlist123") is None
 
 @patch('recommendation_engine.playlist.BookendSeedsTrackFinder')
 def test_create_song_to_song_playlist(MockBookendFinder, mock_spotify, mock_track_response):
@@ -61,10 +92,12 @@ def test_create_song_to_song_playlist(MockBookendFinder, mock_spotify, mock_trac
     seed_track_id = "track123"
     destination_track_id = "track456"
     
-    mock_spotify.track.side_effect = [
-        {"name": "Track A", "id": seed_track_id},
-        {"name": "Track B", "id": destination_track_id}
-    ]
+    mock_spotify.tracks.return_value = {
+        "tracks": [
+            {"name": "Track A", "id": seed_track_id},
+            {"name": "Track B", "id": destination_track_id}
+        ]
+    }
     
     mock_finder_instance = Mock()
     mock_finder_instance.recommend.return_value = [
@@ -73,20 +106,18 @@ def test_create_song_to_song_playlist(MockBookendFinder, mock_spotify, mock_trac
     ]
     MockBookendFinder.return_value = mock_finder_instance
     
-    mock_spotify.user_playlist_create.return_value = {"id": "playlist123"}
-    mock_spotify.current_user.return_value = {"id": "test_user"}
-    mock_spotify.user_playlist.return_value = {
+    mock_spotify.user_playlist_create.return_value = {
+        "id": "playlist123",
         "external_urls": {"spotify": "https://test-url"},
         "name": "Test Playlist",
-        "images": [{"url": "https://test-image"}]
     }
+    mock_spotify.current_user.return_value = {"id": "test_user"}
     
     # Act
     result = create_song_to_song_playlist(mock_spotify, seed_track_id, destination_track_id)
     
     # Assert
-    mock_spotify.track.assert_any_call(seed_track_id)
-    mock_spotify.track.assert_any_call(destination_track_id)
+    mock_spotify.tracks.assert_called_once_with([seed_track_id, destination_track_id])
     
     MockBookendFinder.assert_called_once_with(
         mock_spotify,
@@ -97,7 +128,7 @@ def test_create_song_to_song_playlist(MockBookendFinder, mock_spotify, mock_trac
     
     assert result["url"] == "https://test-url"
     assert result["name"] == "Test Playlist"
-    assert result["image"] == "https://test-image"
+    assert result["image"] is None
 
 def test_create_playlist_error_handling(mock_spotify):
     # Arrange
@@ -119,13 +150,12 @@ def test_create_song_to_song_playlist_empty_recommendations(
     mock_finder_instance.recommend.return_value = []
     MockBookendFinder.return_value = mock_finder_instance
     
-    mock_spotify.track.return_value = mock_track_response
+    mock_spotify.tracks.return_value = {"tracks": [mock_track_response, mock_track_response]}
     mock_spotify.current_user.return_value = {"id": "test_user"}
-    mock_spotify.user_playlist_create.return_value = {"id": "playlist123"}
-    mock_spotify.user_playlist.return_value = {
+    mock_spotify.user_playlist_create.return_value = {
+        "id": "playlist123",
         "external_urls": {"spotify": "https://test-url"},
         "name": "Test Playlist",
-        "images": [{"url": "https://test-image"}]
     }
     
     # Act
@@ -133,4 +163,22 @@ def test_create_song_to_song_playlist_empty_recommendations(
     
     # Assert
     mock_spotify.playlist_add_items.assert_called_once_with("playlist123", [])
-    assert result["url"] == "https://test-url" 
\ No newline at end of file
+    assert result["url"] == "https://test-url" 
+
+@patch('recommendation_engine.playlist.BookendSeedsTrackFinder')
+def test_create_playlist_song_to_song_uses_session_user(MockBookendFinder, mock_spotify, mock_playlist_response):
+    MockBookendFinder.return_value.recommend.return_value = [{"uri": "spotify:track:1"}]
+    mock_spotify.tracks.return_value = {"tracks": [{"name": "Track A"}, {"name": "Track B"}]}
+    mock_spotify.user_playlist_create.return_value = mock_playlist_response
+    payload = {
+        "source_mode": "song",
+        "seed_track_id": "track123",
+        "destination_mode": "song",
+        "destination_track_id": "track456",
+    }
+
+    result = create_playlist(payload, mock_spotify, session={"user_id": "session_user"})
+
+    mock_spotify.current_user.assert_not_called()
+    assert mock_spotify.user_playlist_create.call_args.args[0] == "session_user"
+    assert result["url"] == "https://open.spotify.com/playlist/123"
@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+from recommendation_engine.playlist_router import PlaylistRouter, mood_vector
+from recommendation_engine.vector_index import ExactTrackIndex, EUCLIDEAN, FEATURE_NAMES
+
+
+@pytest.fixture
+def catalog():
+    # a line of tracks from all zeros to all ones, two tracks per artist
+    rows = 41
+    vectors = np.repeat(np.linspace(0, 1, rows, dtype=np.float32)[:, None], len(FEATURE_NAMES), axis=1)
+    artists = [f"artist {i // 2}" for i in range(rows)]
+    titles = [f"title {i}" for i in range(rows)]
+    index = ExactTrackIndex(vectors, metric=EUCLIDEAN, artists=artists, titles=titles)
+    return PlaylistRouter(index, index.vectors, index.artist_index, index.title_index, pool_size=6, beam_width=8)
+
+
+def test_route_between_two_tracks(catalog):
+    route = catalog.route([0, 40], slots_per_leg=3)
+
+    assert route[0] == 0 and route[-1] == 40
+    assert len(route) == 5
+    # moves steadily along the line
+    assert route == sorted(route)
+
+
+def test_route_through_multiple_waypoints(catalog):
+    route = catalog.route([0, 40, 10], slots_per_leg=2)
+
+    assert len(route) == 7
+    assert route[0] == 0 and route[3] == 40 and route[-1] == 10
+
+
+def test_route_keeps_artists_and_titles_unique(catalog):
+    route = catalog.route([0, 40], slots_per_leg=9)
+    artists = [catalog.artist_index.value(row) for row in route]
+    assert len(set(artists)) == len(artists)
+    assert len(set(route)) == len(route)
+
+
+def test_route_fills_every_slot_when_nearest_tracks_share_an_artist():
+    # the middle of the line is one prolific artist, a plain k-NN pool would be all theirs
+    rows = 41
+    vectors = np.repeat(np.linspace(0, 1, rows, dtype=np.float32)[:, None], len(FEATURE_NAMES), axis=1)
+    artists = ["prolific" if 10 <= i <= 30 else f"artist {i}" for i in range(rows)]
+    titles = [f"title {i}" for i in range(rows)]
+    index = ExactTrackIndex(vectors, metric=EUCLIDEAN, artists=artists, titles=titles)
+    router = PlaylistRouter(index, index.vectors, index.artist_index, index.title_index, pool_size=4, beam_width=8)
+
+    route = router.route([0, 40], slots_per_leg=5)
+
+    assert len(route) == 7
+    route_artists = [router.artist_index.value(row) for row in route]
+    assert len(set(route_artists)) == len(route_artists)
+
+
+def test_route_with_mood_waypoints(catalog):
+    route = catalog.route(["calm", "happy"], slots_per_leg=2)
+    assert len(route) == 4
+    assert all(0 <= row < len(catalog.vectors) for row in route)
+
+
+def test_route_requires_two_waypoints(catalog):
+    with pytest.raises(ValueError, match="at least two"):
+        catalog.route([0], slots_per_leg=2)
+
+
+def test_mood_vector():
+    assert mood_vector("Happy").shape == (len(FEATURE_NAMES),)
+    with pytest.raises(ValueError, match="Unknown mood"):
+        mood_vector("sad")
+
+
+def test_router_shares_the_index_payload_columns(catalog):
+    assert catalog.artist_index is catalog.index.artist_index
+    assert catalog.title_index is catalog.index.title_index
@@ -0,0 +1,140 @@
+import numpy as np
+import pytest
+from recommendation_engine import quantized_index
+from recommendation_engine.quantized_index import (
+    PRODUCT,
+    SCALAR,
+    ProductQuantizer,
+    QuantizedTrackIndex,
+    ScalarQuantizer,
+)
+from recommendation_engine.track_catalog import TrackCatalog, UINT8, write_catalog
+from recommendation_engine.vector_index import COSINE, EUCLIDEAN, FEATURE_NAMES, ExactTrackIndex
+
+
+@pytest.fixture
+def vectors():
+    rng = np.random.default_rng(7)
+    return rng.random((2000, 11), dtype=np.float32)
+
+
+def recall(approximate, exact):
+    return np.mean([len(set(a) & set(e)) / len(e) for a, e in zip(approximate, exact)])
+
+
+def test_scalar_round_trip_within_half_a_step(vectors):
+    quantizer = ScalarQuantizer(11)
+    codes = quantizer.encode(vectors)
+
+    assert codes.dtype == np.uint8
+    assert np.abs(quantizer.decode(codes) - vectors).max() <= 0.5 / 255 + 1e-6
+
+
+def test_product_codes_are_one_byte_per_subspace(vectors):
+    quantizer = ProductQuantizer.train(vectors, num_subspaces=4, iterations=5)
+    codes = quantizer.encode(vectors)
+
+    assert codes.shape == (2000, 4)
+    assert codes.dtype == np.uint8
+    assert quantizer.decode(codes).shape == vectors.shape
+
+
+def test_product_scan_matches_decoded_distances(vectors):
+    quantizer = ProductQuantizer.train(vectors, num_subspaces=3, iterations=5)
+    codes = quantizer.encode(vectors[:100])
+    queries = vectors[100:105]
+
+    decoded = quantizer.decode(codes)
+    expected = ((queries[:, None, :] - decoded[None, :, :]) ** 2).sum(axis=2)
+    np.testing.assert_allclose(quantizer.scan(quantizer.prepare_queries(queries), codes), expected, rtol=1e-4, atol=1e-5)
+
+
+@pytest.mark.parametrize("metric", [COSINE, EUCLIDEAN])
+@pytest.mark.parametrize("quantizer", [SCALAR, PRODUCT])
+def test_rerank_recovers_exact_results(vectors, metric, quantizer):
+    index = QuantizedTrackIndex.build(vectors, quantizer=quantizer, metric=metric, iterations=5)
+    queries = vectors[:30] + 0.01
+
+    indices, distances = index.search(queries, k=5)
+    exact_indices, exact_distances = ExactTrackIndex(vectors, metric=metric).search(queries, k=5)
+
+    assert recall(indices, exact_indices) > 0.95
+    # re-ranked distances come from the float vectors
+    matched = indices == exact_indices
+    np.testing.assert_allclose(distances[matched], exact_distances[matched], atol=1e-4)
+
+
+def test_scalar_recall_without_rerank(vectors):
+    index = QuantizedTrackIndex.build(vectors, metric=EUCLIDEAN, rerank=False)
+    exact_indices, _ = ExactTrackIndex(vectors, metric=EUCLIDEAN).search(vectors[:50], k=10)
+    indices, _ = index.search(vectors[:50], k=10)
+
+    assert index.rerank_vectors is None
+    assert recall(indices, exact_indices) > 0.9
+
+
+def test_chunked_scan_matches_single_chunk(vectors, monkeypatch):
+    index = QuantizedTrackIndex.build(vectors, metric=EUCLIDEAN, rerank=False)
+    expected = index.search(vectors[:10], k=7)
+
+    monkeypatch.setattr(quantized_index, "SCAN_CHUNK_SIZE", 300)
+    indices, distances = index.search(vectors[:10], k=7)
+
+    np.testing.assert_array_equal(indices, expected[0])
+    np.testing.assert_allclose(distances, expected[1])
+
+
+def test_exclude_mask_and_unfilled_slots(vectors):
+    index = QuantizedTrackIndex.build(vectors[:4], metric=EUCLIDEAN)
+    exclude = np.array([True, False, False, True])
+
+    indices, distances = index.search(vectors[0], k=3, exclude=exclude)
+
+    assert sorted(indices[0, :2].tolist()) == [1, 2]
+    assert indices[0, 2] == -1
+    assert np.isinf(distances[0, 2])
+
+
+@pytest.mark.parametrize("rerank", [True, False])
+def test_distinct_rescans_past_repeated_artists(vectors, rerank):
+    index = QuantizedTrackIndex.build(vectors, metric=EUCLIDEAN, rerank=rerank)
+    # the 100 nearest tracks to the query share one artist
+    nearest, _ = ExactTrackIndex(vectors, metric=EUCLIDEAN).search(vectors[0], k=100)
+    artists = np.arange(len(vectors))
+    artists[nearest[0]] = -1
+
+    indices, _ = index.search(vectors[0], k=5, distinct=(artists,))
+
+    assert (indices >= 0).all()
+    assert len(set(artists[indices[0]])) == 5
+
+
+def test_codes_are_all_that_is_held(vectors):
+    scalar = QuantizedTrackIndex.build(vectors, rerank=False)
+    product = QuantizedTrackIndex.build(vectors, quantizer=PRODUCT, num_subspaces=4, iterations=5)
+
+    assert scalar.nbytes == 2000 * 11
+    assert product.nbytes == 2000 * 4 + sum(codebook.nbytes for codebook in product.quantizer.codebooks)
+
+
+@pytest.mark.parametrize("quantizer", [SCALAR, PRODUCT])
+def test_save_and_load(vectors, tmp_path, quantizer):
+    index = QuantizedTrackIndex.build(vectors, quantizer=quantizer, iterations=5)
+    index.save(tmp_path / "index")
+    loaded = QuantizedTrackIndex.load(tmp_path / "index", rerank_vectors=vectors)
+
+    assert isinstance(loaded.codes, np.memmap)
+    for expected, actual in zip(index.search(vectors[:5], k=4), loaded.search(vectors[:5], k=4)):
+        np.testing.assert_array_equal(expected, actual)
+
+
+def test_uint8_catalog_codes_are_used_in_place(vectors, tmp_path):
+    tracks = [dict(zip(FEATURE_NAMES, vector.tolist())) for vector in vectors[:50]]
+    write_catalog(tmp_path / "catalog", [tracks], vector_dtype=UINT8)
+    catalog = TrackCatalog(tmp_path / "catalog")
+
+    index = QuantizedTrackIndex.from_catalog(catalog, metric=EUCLIDEAN)
+
+    assert index.codes is catalog.raw_vectors
+    indices, _ = index.search(catalog.vectors()[7], k=1)
+    assert indices[0, 0] == 7
@@ -0,0 +1,107 @@
+import threading
+import time
+import pytest
+from unittest.mock import Mock
+from recommendation_engine.mood_track_finder import MoodTrackFinder, MOOD_HAPPY
+from recommendation_engine.top_artists_cache import TopArtistsCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def mock_spotify():
+    mock_sp = Mock()
+    mock_sp.current_user_top_artists.return_value = {
+        "total": 5,
+        "items": [{"id": f"artist_{i}", "name": f"Artist {i}"} for i in range(5)],
+    }
+    return mock_sp
+
+
+def test_fresh_entry_is_served_from_cache(clock):
+    cache = TopArtistsCache(ttl_seconds=10, stale_ttl_seconds=100, clock=clock)
+    fetch = Mock(return_value="artists")
+
+    assert cache.get("user", fetch) == "artists"
+    assert cache.get("user", fetch) == "artists"
+    assert fetch.call_count == 1
+    assert cache.stats()["hits"] == 1
+
+
+def test_stale_entry_is_served_and_refreshed(clock):
+    cache = TopArtistsCache(ttl_seconds=10, stale_ttl_seconds=100, clock=clock)
+    cache.get("user", Mock(return_value="old"))
+    clock.now = 50
+    refreshed = threading.Event()
+
+    def fetch():
+        refreshed.set()
+        return "new"
+
+    assert cache.get("user", fetch) == "old"
+    assert refreshed.wait(1)
+    for _ in range(100):
+        if not cache._refreshing:
+            break
+        time.sleep(0.01)
+    assert cache.get("user", Mock()) == "new"
+    assert cache.stats()["stale_hits"] == 1
+
+
+def test_expired_entry_is_fetched_inline(clock):
+    cache = TopArtistsCache(ttl_seconds=10, stale_ttl_seconds=100, clock=clock)
+    cache.get("user", Mock(return_value="old"))
+    clock.now = 200
+
+    assert cache.get("user", Mock(return_value="new")) == "new"
+    assert cache.stats()["misses"] == 2
+
+
+def test_entries_are_per_user(clock):
+    cache = TopArtistsCache(clock=clock)
+    cache.get("a", Mock(return_value="artists a"))
+
+    assert cache.get("b", Mock(return_value="artists b")) == "artists b"
+
+
+def test_least_recently_used_users_are_evicted(clock):
+    cache = TopArtistsCache(max_entries=2, clock=clock)
+    cache.get("a", Mock(return_value="artists a"))
+    cache.get("b", Mock(return_value="artists b"))
+    cache.get("a", Mock())
+    cache.get("c", Mock(return_value="artists c"))
+
+    fetch = Mock(return_value="artists b again")
+    assert cache.get("b", fetch) == "artists b again"
+    fetch.assert_called_once()
+    assert cache.stats()["entries"] == 2
+    assert cache.stats()["evictions"] == 2
+
+
+def test_finders_share_cache(mock_spotify):
+    cache = TopArtistsCache()
+    first = MoodTrackFinder(mock_spotify, MOOD_HAPPY, 3, top_artists_cache=cache, user_key="user")
+    second = MoodTrackFinder(mock_spotify, MOOD_HAPPY, 3, top_artists_cache=cache, user_key="user")
+
+    assert first.top_artists == second.top_artists
+    assert len(first.top_artists["long_term"]) == 5
+    # one call per time range, only for the first finder
+    assert mock_spotify.current_user_top_artists.call_count == 3
+
+
+def test_finder_without_user_key_skips_cache(mock_spotify):
+    cache = TopArtistsCache()
+    MoodTrackFinder(mock_spotify, MOOD_HAPPY, 3, top_artists_cache=cache)
+
+    assert cache.stats()["entries"] == 0
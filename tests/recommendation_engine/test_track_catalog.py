@@ -0,0 +1,91 @@
+import numpy as np
+import pytest
+from recommendation_engine.track_catalog import (
+    TrackCatalog,
+    TrackCatalogWriter,
+    write_catalog,
+    FLOAT16,
+    FLOAT32,
+    UINT8,
+)
+from recommendation_engine.vector_index import ExactTrackIndex, FEATURE_NAMES, EUCLIDEAN
+
+
+def make_track(i):
+    track = {feature: (i * 7 + j) % 10 / 10 for j, feature in enumerate(FEATURE_NAMES)}
+    track.update({
+        "musicbrainz_recordingid": f"{i:08d}-1111-2222-3333-444444444444",
+        "musicbrainz_artistid": "",
+        "title": f"Tïtle {i}",
+        "artist": f"Artist {i % 2}",
+        "album": "" if i % 3 else f"Album {i}",
+    })
+    return track
+
+
+@pytest.fixture
+def tracks():
+    return [make_track(i) for i in range(10)]
+
+
+def test_round_trip_across_batches(tracks, tmp_path):
+    count = write_catalog(tmp_path / "catalog", [tracks[:4], [], tracks[4:]])
+    catalog = TrackCatalog(tmp_path / "catalog")
+
+    assert count == len(catalog) == 10
+    assert isinstance(catalog.raw_vectors, np.memmap)
+    assert catalog.vectors().dtype == np.float32
+    for i, track in enumerate(tracks):
+        assert catalog.track(i) == pytest.approx(track)
+    assert catalog.column("title") == [track["title"] for track in tracks]
+    assert catalog.column("musicbrainz_recordingid")[3] == tracks[3]["musicbrainz_recordingid"]
+
+
+@pytest.mark.parametrize("vector_dtype, tolerance", [(FLOAT16, 1e-3), (UINT8, 1 / 255)])
+def test_quantized_vectors(tracks, tmp_path, vector_dtype, tolerance):
+    write_catalog(tmp_path / "catalog", [tracks], vector_dtype=vector_dtype)
+    catalog = TrackCatalog(tmp_path / "catalog")
+
+    assert catalog.raw_vectors.dtype == np.dtype(vector_dtype)
+    expected = np.array([[track[f] for f in FEATURE_NAMES] for track in tracks], dtype=np.float32)
+    np.testing.assert_allclose(catalog.vectors(), expected, atol=tolerance)
+
+
+def test_uint8_catalog_is_compact(tracks, tmp_path):
+    write_catalog(tmp_path / "catalog", [tracks], vector_dtype=UINT8)
+    assert (tmp_path / "catalog" / "vectors.bin").stat().st_size == len(tracks) * len(FEATURE_NAMES)
+
+
+def test_empty_catalog(tmp_path):
+    with TrackCatalogWriter(tmp_path / "catalog"):
+        pass
+    catalog = TrackCatalog(tmp_path / "catalog")
+    assert len(catalog) == 0
+    assert catalog.column("artist") == []
+
+
+def test_failed_rewrite_can_not_be_opened(tracks, tmp_path):
+    write_catalog(tmp_path / "catalog", [tracks])
+
+    def batches():
+        yield tracks[:3]
+        raise RuntimeError("ingest failed")
+
+    with pytest.raises(RuntimeError):
+        write_catalog(tmp_path / "catalog", batches())
+    # neither the old counts nor the truncated columns are left to open
+    with pytest.raises(FileNotFoundError):
+        TrackCatalog(tmp_path / "catalog")
+
+
+def test_unknown_vector_dtype(tmp_path):
+    with pytest.raises(ValueError, match="Unknown vector dtype"):
+        TrackCatalogWriter(tmp_path / "catalog", vector_dtype="int4")
+
+
+def test_index_from_catalog(tracks, tmp_path):
+    write_catalog(tmp_path / "catalog", [tracks], vector_dtype=FLOAT32)
+    index = ExactTrackIndex.from_catalog(TrackCatalog(tmp_path / "catalog"), metric=EUCLIDEAN)
+    exclude = index.exclusion_mask(artists=["artist 1"])
+    indices, _ = index.search(index.vectors[2], k=1, exclude=exclude)
+    assert indices[0, 0] == 2
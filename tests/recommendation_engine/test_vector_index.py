@@ -0,0 +1,95 @@
+import numpy as np
+import pytest
+from recommendation_engine.vector_index import (
+    ExactTrackIndex,
+    FEATURE_NAMES,
+    COSINE,
+    EUCLIDEAN,
+    track_vectors,
+)
+
+
+def make_track(i, value, artist="Artist", title=None):
+    track = {feature: value for feature in FEATURE_NAMES}
+    track["acoustic"] = float(i) / 10
+    track.update({"musicbrainz_recordingid": f"mbid-{i}", "title": title or f"Track {i}", "artist": artist, "album": ""})
+    return track
+
+
+@pytest.fixture
+def tracks():
+    return [make_track(i, 0.5, artist=f"Artist {i % 3}") for i in range(10)]
+
+
+def test_track_vectors_shape_and_dtype(tracks):
+    vectors = track_vectors(tracks)
+    assert vectors.shape == (10, len(FEATURE_NAMES))
+    assert vectors.dtype == np.float32
+    assert vectors.flags["C_CONTIGUOUS"]
+
+
+def test_euclidean_search_matches_brute_force(tracks):
+    index = ExactTrackIndex.from_tracks(tracks, metric=EUCLIDEAN)
+    query = track_vectors([tracks[4]])[0]
+
+    indices, distances = index.search(query, k=3)
+
+    assert indices.shape == (1, 3)
+    assert indices[0, 0] == 4
+    assert set(indices[0, 1:]) == {3, 5}
+    assert distances[0, 0] == pytest.approx(0.0, abs=1e-6)
+
+
+def test_batched_queries(tracks):
+    index = ExactTrackIndex.from_tracks(tracks, metric=EUCLIDEAN)
+    indices, _ = index.search(track_vectors([tracks[0], tracks[9]]), k=1)
+    assert indices[:, 0].tolist() == [0, 9]
+
+
+def test_cosine_ignores_magnitude():
+    vectors = np.array([[1, 0] + [0] * 9, [0, 1] + [0] * 9, [5, 5] + [0] * 9], dtype=np.float32)
+    index = ExactTrackIndex(vectors, metric=COSINE)
+    indices, distances = index.search(np.array([2, 2] + [0] * 9), k=1)
+    assert indices[0, 0] == 2
+    assert distances[0, 0] == pytest.approx(0.0, abs=1e-6)
+
+
+def test_exclusion_mask_filters_artists_and_titles(tracks):
+    index = ExactTrackIndex.from_tracks(tracks, metric=EUCLIDEAN)
+    mask = index.exclusion_mask(artists=["artist 1"], titles=["TRACK 3"])
+    indices, _ = index.search(track_vectors([tracks[4]])[0], k=1, exclude=mask)
+
+    assert mask.nonzero()[0].tolist() == [1, 3, 4, 7]  # 1, 4, 7 by artist 1 plus track 3 by title
+    assert indices[0].tolist() == [5]
+
+
+def test_unfillable_slots_are_marked(tracks):
+    index = ExactTrackIndex.from_tracks(tracks[:3], metric=EUCLIDEAN)
+    mask = np.array([True, False, True])
+    indices, distances = index.search(track_vectors([tracks[0]]), k=5, exclude=mask)
+
+    assert indices[0].tolist() == [1, -1, -1, -1, -1]
+    assert np.isinf(distances[0, 1:]).all()
+
+
+def test_unknown_metric():
+    with pytest.raises(ValueError, match="Unknown metric"):
+        ExactTrackIndex(np.zeros((1, len(FEATURE_NAMES))), metric="manhattan")
+
+
+def test_distinct_results_skip_repeated_artists(tracks):
+    index = ExactTrackIndex.from_tracks(tracks, metric=EUCLIDEAN)
+    indices, distances = index.search(index.vectors[0], k=4, distinct=(index.artist_index.codes,))
+
+    # only three artists, so the last slot is unfilled
+    artists = [index.artist_index.value(row) for row in indices[0, :3]]
+    assert len(set(artists)) == 3
+    assert indices[0, 0] == 0
+    assert indices[0, 3] == -1 and np.isinf(distances[0, 3])
+
+
+def test_metadata_is_kept_as_codes_only(tracks):
+    index = ExactTrackIndex.from_tracks(tracks)
+
+    assert not hasattr(index, "artists") and not hasattr(index, "titles")
+    assert index.artist_index.codes.dtype == np.int32
@@ -0,0 +1,53 @@
+from unittest.mock import Mock
+import pytest
+from recommendation_engine.track_catalog import TrackCatalog, write_catalog
+from scripts.build_local_search_index import SpotifyIdResolver, build_index, read_spotify_ids, resolve_missing
+from scripts.get_acoustic_brainz_data import extract_track
+from search.local_index import LocalTrackSearchIndex
+from tests.scripts.test_get_acoustic_brainz_data import make_document
+
+
+@pytest.fixture
+def catalog(tmp_path):
+    write_catalog(str(tmp_path / "catalog"), [[extract_track(make_document(i)) for i in range(4)]])
+    return TrackCatalog(str(tmp_path / "catalog"))
+
+
+def search_result(spotify_id, name, artists, popularity=50):
+    return {"id": spotify_id, "name": name, "artists": [{"name": a} for a in artists], "popularity": popularity}
+
+
+def test_resolver_only_accepts_the_same_title_and_artist():
+    sp = Mock()
+    sp.search.return_value = {
+        "tracks": {"items": [search_result("cover", "Track 1", ["Someone Else"]), search_result("spotify-1", "track  1", ["ARTIST"], 70)]}
+    }
+
+    assert SpotifyIdResolver(sp).resolve("Track 1", "Artist") == ("spotify-1", 70.0)
+    sp.search.return_value = {"tracks": {"items": [search_result("cover", "Track 1 (Live)", ["Artist"])]}}
+    assert SpotifyIdResolver(sp).resolve("Track 1", "Artist") is None
+
+
+def test_resolve_missing_skips_known_recordings_and_records_misses(catalog):
+    resolver = Mock()
+    resolver.resolve.side_effect = [("spotify-1", 10.0), None]
+    spotify_ids = {"mbid-0": ("spotify-0", 5.0)}
+
+    rows = list(resolve_missing(catalog, spotify_ids, resolver, max_lookups=2))
+
+    assert [row["musicbrainz_recordingid"] for row in rows] == ["mbid-1", "mbid-2"]
+    assert spotify_ids["mbid-2"] == ("", 0.0)
+
+
+def test_built_index_serves_spotify_ids_ranked_by_popularity(catalog, tmp_path):
+    spotify_ids_path = tmp_path / "spotify_ids.csv"
+    spotify_ids_path.write_text(
+        "musicbrainz_recordingid,spotify_id,popularity\nmbid-0,spotify-0,10\nmbid-2,spotify-2,90\nmbid-3,,0\n"
+    )
+
+    index = build_index(catalog, read_spotify_ids(str(spotify_ids_path)))
+    index.save(tmp_path / "search")
+    loaded = LocalTrackSearchIndex.load(tmp_path / "search")
+
+    assert loaded.has_spotify_ids
+    assert [r["id"] for r in loaded.search("track")] == ["spotify-2", "spotify-0"]
@@ -0,0 +1,98 @@
+import io
+import json
+import tarfile
+import pytest
+import zstandard
+from scripts import get_acoustic_brainz_data
+from scripts.get_acoustic_brainz_data import Checkpoint, extract_track, iter_archive_members, stream_archives
+
+FEATURES = {
+    "danceability": "danceable",
+    "mood_aggressive": "aggressive",
+    "mood_electronic": "electronic",
+    "mood_acoustic": "acoustic",
+    "mood_happy": "happy",
+    "mood_party": "party",
+    "mood_relaxed": "relaxed",
+    "mood_sad": "sad",
+    "timbre": "dark",
+    "tonal_atonal": "tonal",
+    "voice_instrumental": "voice",
+}
+
+
+def make_document(i):
+    return {
+        "metadata": {"tags": {"musicbrainz_recordingid": [f"mbid-{i}"], "title": [f"Track {i}"], "artist": ["Artist"]}},
+        "highlevel": {model: {"all": {label: i / 100}} for model, label in FEATURES.items()},
+    }
+
+
+def write_archive(path, documents):
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w") as tar:
+        tar.addfile(tarfile.TarInfo("highlevel"))  # non file members are skipped
+        for i, document in enumerate(documents):
+            raw = json.dumps(document).encode()
+            info = tarfile.TarInfo(f"highlevel/00/{i}.json")
+            info.size = len(raw)
+            tar.addfile(info, io.BytesIO(raw))
+    path.write_bytes(zstandard.ZstdCompressor().compress(buffer.getvalue()))
+    return str(path)
+
+
+@pytest.fixture
+def archives(tmp_path):
+    first = write_archive(tmp_path / "dump-0.tar.zst", [make_document(i) for i in range(7)])
+    # a document without high level features is skipped
+    second = write_archive(tmp_path / "dump-1.tar.zst", [make_document(i) for i in range(7, 12)] + [{"metadata": {}}])
+    return [first, second]
+
+
+def test_extract_track():
+    track = extract_track(make_document(5))
+    assert track["musicbrainz_recordingid"] == "mbid-5"
+    assert track["musicbrainz_artistid"] == ""
+    assert track["album"] == ""
+    assert track["happy"] == 0.05
+
+
+def test_iter_archive_members_skips_to_start(archives):
+    members = list(iter_archive_members(archives[0], start_member=3))
+    assert [number for number, _ in members] == [3, 4, 5, 6, 7]
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_stream_archives_emits_fixed_size_batches(archives, workers):
+    batches = list(stream_archives(archives, batch_size=5, workers=workers))
+
+    assert [len(batch) for batch in batches] == [5, 5, 2]
+    ids = [track["musicbrainz_recordingid"] for batch in batches for track in batch]
+    assert ids == [f"mbid-{i}" for i in range(12)]
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_stream_archives_pipelines_many_chunks(archives, monkeypatch, workers):
+    # every archive spans several parse chunks, one parsed while the next is read
+    monkeypatch.setattr(get_acoustic_brainz_data, "PARSE_CHUNK_SIZE", 1)
+    batches = list(stream_archives(archives, batch_size=4, workers=workers))
+
+    ids = [track["musicbrainz_recordingid"] for batch in batches for track in batch]
+    assert ids == [f"mbid-{i}" for i in range(12)]
+    assert [len(batch) for batch in batches] == [4, 4, 4]
+
+
+def test_stream_archives_resumes_from_checkpoint(archives, tmp_path):
+    checkpoint_path = str(tmp_path / "checkpoint.json")
+    stream = stream_archives(archives, batch_size=5, workers=1, checkpoint_path=checkpoint_path)
+    next(stream)
+    next(stream)  # the first batch is checkpointed once the second is requested
+    stream.close()
+
+    resumed = list(stream_archives(archives, batch_size=5, workers=1, checkpoint_path=checkpoint_path))
+    ids = [track["musicbrainz_recordingid"] for batch in resumed for track in batch]
+    # the second batch was never acknowledged so it is ingested again
+    assert ids == [f"mbid-{i}" for i in range(5, 12)]
+
+    assert Checkpoint(checkpoint_path).is_done("dump-1.tar.zst")
+    assert list(stream_archives(archives, batch_size=5, workers=1, checkpoint_path=checkpoint_path)) == []
@@ -0,0 +1,123 @@
+import threading
+import time
+import uuid
+from unittest.mock import Mock
+import pytest
+from scripts.get_acoustic_brainz_data import extract_track, stream_archives
+from scripts.load_vector_db import InMemoryVectorStore, QdrantVectorStore, VectorLoader, point_id, track_point
+from tests.scripts.test_get_acoustic_brainz_data import make_document, write_archive
+
+
+@pytest.fixture
+def archives(tmp_path):
+    return [
+        write_archive(tmp_path / "dump-0.tar.zst", [make_document(i) for i in range(7)]),
+        write_archive(tmp_path / "dump-1.tar.zst", [make_document(i) for i in range(7, 12)]),
+    ]
+
+
+class FlakyStore(InMemoryVectorStore):
+    """fails failures upserts once the first succeed have gone through"""
+
+    def __init__(self, failures, succeed=0):
+        super().__init__()
+        self.failures = failures
+        self.succeed = succeed
+
+    def upsert(self, name, points):
+        if self.upserts >= self.succeed and self.failures:
+            self.failures -= 1
+            raise ConnectionError("vector db unavailable")
+        super().upsert(name, points)
+
+
+def test_point_ids_are_stable_uuids():
+    assert point_id("mbid-1") == point_id("mbid-1") != point_id("mbid-2")
+    assert uuid.UUID(point_id("mbid-1")).version == 5
+
+
+def test_track_point():
+    point = track_point(extract_track(make_document(5)))
+
+    assert point.vector == [0.05] * 11
+    assert point.payload["title"] == "Track 5"
+    assert point.payload["musicbrainz_recordingid"] == "mbid-5"
+
+
+def test_loads_batches_in_upsert_chunks(archives):
+    store = InMemoryVectorStore()
+    loader = VectorLoader(store, upsert_size=2, threads=3)
+
+    loaded = loader.load(stream_archives(archives, batch_size=5, workers=1))
+
+    assert loaded == 12
+    # batches of 5, 5 and 2 in chunks of 2
+    assert store.upserts == 7
+    assert set(store.collections["tracks"]) == {point_id(f"mbid-{i}") for i in range(12)}
+
+
+def test_failed_upserts_are_retried(archives):
+    store = FlakyStore(failures=2)
+    sleep = Mock()
+    loader = VectorLoader(store, upsert_size=5, threads=1, sleep=sleep)
+
+    assert loader.load(stream_archives(archives, batch_size=5, workers=1)) == 12
+    assert loader.retries == 2
+    assert [call.args[0] for call in sleep.call_args_list] == [0.5, 1.0]
+
+
+def test_gives_up_after_max_retries():
+    loader = VectorLoader(FlakyStore(failures=3), max_retries=2, sleep=Mock())
+
+    with pytest.raises(ConnectionError):
+        loader.load_batch([extract_track(make_document(1))])
+
+
+def test_in_flight_chunks_are_bounded():
+    active = []
+    peak = []
+    lock = threading.Lock()
+
+    class SlowStore(InMemoryVectorStore):
+        def upsert(self, name, points):
+            with lock:
+                active.append(1)
+                peak.append(len(active))
+            time.sleep(0.01)
+            with lock:
+                active.pop()
+            super().upsert(name, points)
+
+    loader = VectorLoader(SlowStore(), upsert_size=1, threads=8, max_in_flight=2)
+    loader.load_batch([extract_track(make_document(i)) for i in range(10)])
+
+    assert max(peak) <= 2
+    assert loader.points == 10
+
+
+def test_rerun_skips_loaded_batches(archives, tmp_path):
+    checkpoint_path = str(tmp_path / "checkpoint.json")
+    # the second batch fails, the first is stored and checkpointed
+    store = FlakyStore(failures=1, succeed=1)
+    with pytest.raises(ConnectionError):
+        VectorLoader(store, upsert_size=5, max_retries=0).load(
+            stream_archives(archives, batch_size=5, workers=1, checkpoint_path=checkpoint_path)
+        )
+
+    loader = VectorLoader(store, upsert_size=5)
+    assert loader.load(stream_archives(archives, batch_size=5, workers=1, checkpoint_path=checkpoint_path)) == 7
+    assert store.upserts == 3
+    assert len(store.collections["tracks"]) == 12
+
+
+def test_qdrant_store_upserts_are_idempotent():
+    qdrant_client = pytest.importorskip("qdrant_client")
+    client = qdrant_client.QdrantClient(":memory:")
+    loader = VectorLoader(QdrantVectorStore(client))
+    tracks = [extract_track(make_document(i)) for i in range(3)]
+
+    loader.load([tracks, tracks])
+
+    assert client.count("tracks").count == 3
+    stored = client.retrieve("tracks", [point_id("mbid-2")], with_payload=True)
+    assert stored[0].payload["title"] == "Track 2"
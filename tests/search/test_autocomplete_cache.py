@@ -0,0 +1,93 @@
+import pytest
+from unittest.mock import Mock
+from search.autocomplete import search_tracks
+from search.autocomplete_cache import AutocompleteCache, matches_query, normalize_query
+
+
+def make_result(track_name, artist_name):
+    return {
+        "id": track_name,
+        "artist_name": artist_name,
+        "track_name": track_name,
+        "large_image": "large.jpg",
+        "small_image": "small.jpg",
+    }
+
+
+@pytest.fixture
+def radiohead_results():
+    return [
+        make_result("Creep", "Radiohead"),
+        make_result("Karma Police", "Radiohead"),
+        make_result("No Surprises", "Radiohead"),
+        make_result("Radio Ga Ga", "Queen"),
+    ]
+
+
+def test_normalize_query():
+    assert normalize_query("  RadioHead   Creep ") == "radiohead creep"
+
+
+def test_matches_query():
+    result = make_result("Karma Police", "Radiohead, Someone Else")
+    assert matches_query(result, "radiohe kar")
+    assert matches_query(result, "some")
+    assert not matches_query(result, "creep")
+
+
+def test_exact_hit_ignores_case_and_whitespace(radiohead_results):
+    cache = AutocompleteCache()
+    cache.set("Radio", 4, radiohead_results)
+    assert cache.get(" radio ", 4) == radiohead_results
+    assert cache.stats()["exact_hits"] == 1
+
+
+def test_prefix_reuse_when_enough_results_still_match(radiohead_results):
+    cache = AutocompleteCache()
+    cache.set("radio", 3, radiohead_results[:3])
+    assert cache.get("radiohe", 3) == radiohead_results[:3]
+    assert cache.stats()["prefix_hits"] == 1
+
+
+def test_prefix_reuse_when_prefix_results_are_complete(radiohead_results):
+    cache = AutocompleteCache()
+    # fewer results than the limit means spotify had nothing else for the prefix
+    cache.set("radio", 5, radiohead_results)
+    assert cache.get("radio ga", 5) == [radiohead_results[3]]
+
+
+def test_no_prefix_reuse_when_results_may_be_missing(radiohead_results):
+    cache = AutocompleteCache()
+    cache.set("radio", 4, radiohead_results)
+    # only 3 of the 4 match and the prefix had a full page, so spotify may know a better 4th
+    assert cache.get("radiohead", 4) is None
+    assert cache.stats()["misses"] == 1
+
+
+def test_short_prefixes_are_not_reused(radiohead_results):
+    cache = AutocompleteCache()
+    cache.set("ra", 5, radiohead_results)
+    assert cache.get("rad", 5) is None
+
+
+def test_search_tracks_uses_cache():
+    mock_sp = Mock()
+    mock_sp.search.return_value = {
+        "tracks": {
+            "items": [
+                {
+                    "id": "track123",
+                    "name": "Creep",
+                    "artists": [{"name": "Radiohead"}],
+                    "album": {"images": [{"url": "only_image.jpg"}]},
+                }
+            ]
+        }
+    }
+    cache = AutocompleteCache()
+    typed = ["rad", "radi", "radio", "radioh", "radiohe", "radiohea", "radiohead"]
+    results = [search_tracks(mock_sp, query, 4, cache=cache) for query in typed]
+
+    mock_sp.search.assert_called_once_with("rad", type="track", offset=0, limit=4)
+    assert all(result == results[0] for result in results)
+    assert cache.stats()["hit_ratio"] == pytest.approx(6 / 7)
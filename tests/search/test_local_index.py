@@ -0,0 +1,82 @@
+import pytest
+from search.local_index import LocalTrackSearchIndex, tokenize
+
+
+def make_track(i, title, artist):
+    return {"musicbrainz_recordingid": f"mbid-{i}", "title": title, "artist": artist, "album": ""}
+
+
+@pytest.fixture
+def tracks():
+    return [
+        make_track(0, "Creep", "Radiohead"),
+        make_track(1, "Karma Police", "Radiohead"),
+        make_track(2, "Radio Ga Ga", "Queen"),
+        make_track(3, "Video Killed the Radio Star", "The Buggles"),
+        make_track(4, "No Surprises", "Radiohead"),
+        make_track(5, "Creep", "TLC"),
+    ]
+
+
+@pytest.fixture
+def index(tracks):
+    # popularity decides the ranking
+    return LocalTrackSearchIndex.build(tracks, popularity=[5, 4, 6, 1, 3, 2])
+
+
+def test_tokenize():
+    assert tokenize("Video Killed the Radio-Star!") == ["video", "killed", "the", "radio", "star"]
+
+
+def test_prefix_query_ranked_by_popularity(index):
+    results = index.search("radio", limit=4)
+    assert [r["track_name"] for r in results] == ["Radio Ga Ga", "Creep", "Karma Police", "No Surprises"]
+
+
+def test_result_shape_matches_search_tracks(index):
+    result = index.search("karma", limit=4)[0]
+    assert result == {
+        "id": "mbid-1",
+        "artist_name": "Radiohead",
+        "track_name": "Karma Police",
+        "large_image": "",
+        "small_image": "",
+    }
+
+
+def test_multi_word_query_matches_every_word(index):
+    assert [r["id"] for r in index.search("creep radioh")] == ["mbid-0"]
+    assert [r["id"] for r in index.search("cre")] == ["mbid-0", "mbid-5"]
+    assert index.search("creep queen") == []
+
+
+def test_no_match(index):
+    assert index.search("zzz") == []
+    assert index.search("   ") == []
+
+
+def test_deep_candidates_are_found_past_the_first_page():
+    # the only match for both words is the least popular record
+    tracks = [make_track(i, f"Song {i}", "Common") for i in range(50)] + [make_track(50, "Rare Song", "Common")]
+    index = LocalTrackSearchIndex.build(tracks, popularity=list(range(51, 0, -1)))
+    assert [r["id"] for r in index.search("common rare", limit=4)] == ["mbid-50"]
+
+
+def test_save_and_load(index, tmp_path):
+    index.save(tmp_path / "search")
+    loaded = LocalTrackSearchIndex.load(tmp_path / "search")
+    assert len(loaded) == 6
+    assert loaded.search("radio") == index.search("radio")
+
+
+def test_results_carry_spotify_ids_when_every_track_has_one(tracks, tmp_path):
+    assert not LocalTrackSearchIndex.build(tracks).has_spotify_ids
+
+    for i, track in enumerate(tracks):
+        track["spotify_id"] = f"spotify-{i}"
+    index = LocalTrackSearchIndex.build(tracks)
+    index.save(tmp_path / "search")
+    loaded = LocalTrackSearchIndex.load(tmp_path / "search")
+
+    assert loaded.has_spotify_ids
+    assert loaded.search("karma")[0]["id"] == "spotify-1"
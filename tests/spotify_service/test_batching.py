@@ -0,0 +1,92 @@
+import threading
+import time
+import pytest
+from unittest.mock import Mock
+from spotify_service.batching import InFlightRequests, SpotifyBatchLoader
+from spotify_service.cache import CachingSpotify, SpotifyResponseCache
+
+
+@pytest.fixture
+def mock_spotify():
+    mock_sp = Mock()
+    mock_sp.tracks.side_effect = lambda ids: {"tracks": [{"id": track_id} for track_id in ids]}
+    mock_sp.audio_features.side_effect = lambda ids: [{"id": track_id} for track_id in ids]
+    return mock_sp
+
+
+def test_primed_ids_ride_along_with_next_lookup(mock_spotify):
+    loader = SpotifyBatchLoader(mock_spotify)
+    loader.prime_tracks(["t2", "t3"])
+
+    assert loader.track("t1") == {"id": "t1"}
+    assert loader.tracks(["t2", "t3"]) == {"tracks": [{"id": "t2"}, {"id": "t3"}]}
+    mock_spotify.tracks.assert_called_once_with(["t2", "t3", "t1"])
+
+
+def test_lookups_are_memoized_and_deduplicated(mock_spotify):
+    loader = SpotifyBatchLoader(mock_spotify)
+    features = loader.audio_features(["t1", "t1", "t2"])
+    loader.audio_features(["t2"])
+
+    assert [f["id"] for f in features] == ["t1", "t1", "t2"]
+    mock_spotify.audio_features.assert_called_once_with(["t1", "t2"])
+
+
+def test_splits_at_batch_limits(mock_spotify):
+    loader = SpotifyBatchLoader(mock_spotify)
+    loader.tracks([f"t{i}" for i in range(120)])
+    loader.audio_features([f"t{i}" for i in range(120)])
+
+    assert [len(call.args[0]) for call in mock_spotify.tracks.call_args_list] == [50, 50, 20]
+    assert [len(call.args[0]) for call in mock_spotify.audio_features.call_args_list] == [100, 20]
+
+
+def test_concurrent_loaders_share_in_flight_calls(mock_spotify):
+    started = threading.Event()
+
+    def slow_tracks(ids):
+        started.set()
+        time.sleep(0.05)
+        return {"tracks": [{"id": track_id} for track_id in ids]}
+
+    mock_spotify.tracks.side_effect = slow_tracks
+    in_flight = InFlightRequests()
+    results = []
+    first = threading.Thread(target=lambda: results.append(SpotifyBatchLoader(mock_spotify, in_flight).track("t1")))
+    first.start()
+    started.wait()
+    results.append(SpotifyBatchLoader(mock_spotify, in_flight).track("t1"))
+    first.join()
+
+    assert results == [{"id": "t1"}, {"id": "t1"}]
+    mock_spotify.tracks.assert_called_once_with(["t1"])
+
+
+def test_failed_fetch_releases_claimed_ids(mock_spotify):
+    mock_spotify.tracks.side_effect = Exception("API Error")
+    in_flight = InFlightRequests()
+    with pytest.raises(Exception, match="API Error"):
+        SpotifyBatchLoader(mock_spotify, in_flight).track("t1")
+
+    mock_spotify.tracks.side_effect = lambda ids: {"tracks": [{"id": track_id} for track_id in ids]}
+    assert SpotifyBatchLoader(mock_spotify, in_flight).track("t1") == {"id": "t1"}
+
+
+def test_ids_missing_from_a_short_response_resolve_to_none(mock_spotify):
+    # spotify left out t2 and t3
+    mock_spotify.tracks.side_effect = lambda ids: {"tracks": [{"id": "t1"}, None]}
+    in_flight = InFlightRequests()
+
+    assert SpotifyBatchLoader(mock_spotify, in_flight).tracks(["t1", "t2", "t3"]) == {"tracks": [{"id": "t1"}, None, None]}
+    # nothing is left claimed for other requests to wait on
+    assert in_flight.claim("tracks", ["t2", "t3"])[0] == ["t2", "t3"]
+
+
+def test_caching_spotify_tracks_shares_entries_with_track(mock_spotify):
+    sp = CachingSpotify(mock_spotify, SpotifyResponseCache())
+    sp.tracks(["t1", "t2"])
+    assert sp.track("t1") == {"id": "t1"}
+    assert sp.tracks(["t2", "t1"]) == {"tracks": [{"id": "t2"}, {"id": "t1"}]}
+
+    mock_spotify.track.assert_not_called()
+    mock_spotify.tracks.assert_called_once_with(["t1", "t2"])
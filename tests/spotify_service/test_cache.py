@@ -0,0 +1,99 @@
+import pytest
+from unittest.mock import Mock
+from spotify_service.cache import TTLCache, SpotifyResponseCache, CachingSpotify
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def mock_spotify():
+    mock_sp = Mock()
+    mock_sp.track.side_effect = lambda track_id, market=None: {"id": track_id}
+    mock_sp.audio_features.side_effect = lambda ids: [{"id": track_id, "energy": 0.5} for track_id in ids]
+    mock_sp.current_user_top_artists.return_value = {"total": 0, "items": []}
+    return mock_sp
+
+
+def test_ttl_cache_expires_entries():
+    clock = FakeClock()
+    cache = TTLCache(max_entries=10, ttl_seconds=5, clock=clock)
+    cache.set("a", 1)
+    assert cache.get("a") == 1
+    clock.now = 5
+    assert cache.get("a") is None
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_ttl_cache_evicts_least_recently_used():
+    cache = TTLCache(max_entries=2, ttl_seconds=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")  # a is now more recent than b
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.stats()["evictions"] == 1
+
+
+def test_ttl_cache_requires_positive_size():
+    with pytest.raises(ValueError):
+        TTLCache(max_entries=0, ttl_seconds=1)
+
+
+def test_track_is_cached(mock_spotify):
+    sp = CachingSpotify(mock_spotify, SpotifyResponseCache())
+    assert sp.track("t1") == {"id": "t1"}
+    assert sp.track("t1") == {"id": "t1"}
+    mock_spotify.track.assert_called_once_with("t1", market=None)
+
+
+def test_audio_features_only_fetches_missing_ids(mock_spotify):
+    sp = CachingSpotify(mock_spotify, SpotifyResponseCache())
+    sp.audio_features(["t1", "t2"])
+    features = sp.audio_features(["t2", "t3", "t1"])
+
+    assert [f["id"] for f in features] == ["t2", "t3", "t1"]
+    assert mock_spotify.audio_features.call_count == 2
+    mock_spotify.audio_features.assert_called_with(["t3"])
+
+
+def test_audio_features_does_not_cache_unknown_ids(mock_spotify):
+    mock_spotify.audio_features.side_effect = lambda ids: [None for _ in ids]
+    sp = CachingSpotify(mock_spotify, SpotifyResponseCache())
+    assert sp.audio_features(["bad"]) == [None]
+    assert sp.audio_features(["bad"]) == [None]
+    assert mock_spotify.audio_features.call_count == 2
+
+
+def test_user_scoped_entries_are_separated_per_user(mock_spotify):
+    cache = SpotifyResponseCache()
+    CachingSpotify(mock_spotify, cache, user_key="user_a").current_user_top_artists(limit=10, time_range="short_term")
+    CachingSpotify(mock_spotify, cache, user_key="user_a").current_user_top_artists(limit=10, time_range="short_term")
+    CachingSpotify(mock_spotify, cache, user_key="user_b").current_user_top_artists(limit=10, time_range="short_term")
+
+    assert mock_spotify.current_user_top_artists.call_count == 2
+
+
+def test_user_scoped_entries_not_cached_without_user(mock_spotify):
+    sp = CachingSpotify(mock_spotify, SpotifyResponseCache())
+    sp.current_user_top_artists(limit=10, time_range="short_term")
+    sp.current_user_top_artists(limit=10, time_range="short_term")
+
+    assert mock_spotify.current_user_top_artists.call_count == 2
+
+
+def test_uncached_endpoints_pass_through(mock_spotify):
+    mock_spotify.recommendations.return_value = {"tracks": []}
+    sp = CachingSpotify(mock_spotify, SpotifyResponseCache())
+    assert sp.recommendations(limit=1) == {"tracks": []}
+    assert sp.recommendations(limit=1) == {"tracks": []}
+    assert mock_spotify.recommendations.call_count == 2
@@ -0,0 +1,75 @@
+import gc
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from spotify_service.client_factory import SpotifyClientFactory
+
+
+class MeHandler(BaseHTTPRequestHandler):
+    # keep-alive so connections can be reused
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        body = json.dumps({"id": "user", "path": self.path}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def api_url():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), MeHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/v1/"
+    server.shutdown()
+
+
+def _client(factory, api_url):
+    sp = factory.client(auth="token")
+    sp.prefix = api_url
+    return sp
+
+
+def test_clients_share_connections(api_url):
+    factory = SpotifyClientFactory()
+    for _ in range(5):
+        assert _client(factory, api_url).me()["id"] == "user"
+        # spotipy closes its session when a client is collected, the shared pool must survive that
+        gc.collect()
+
+    stats = factory.stats()
+    pool_stats = stats["pools"]["127.0.0.1"]
+    assert stats["requests"] == 5
+    assert stats["in_flight"] == 0
+    assert pool_stats["connections_opened"] == 1
+    assert pool_stats["requests"] == 5
+    assert pool_stats["idle"] == 1
+
+
+def test_close_drops_pool(api_url):
+    factory = SpotifyClientFactory()
+    _client(factory, api_url).me()
+    factory.close()
+
+    assert factory.stats()["pools"] == {}
+
+
+def test_invalid_pool_maxsize():
+    with pytest.raises(ValueError, match="pool_maxsize greater than 0"):
+        SpotifyClientFactory(pool_maxsize=0)
+
+
+def test_api_url_overrides_prefix(api_url):
+    factory = SpotifyClientFactory(api_url=api_url[: -len("/v1/")])
+    try:
+        assert factory.client(auth="token").me()["path"] == "/v1/me/"
+    finally:
+        factory.close()
@@ -0,0 +1,152 @@
+import pytest
+import spotipy
+from unittest.mock import Mock
+from spotify_service.scheduler import (
+    BATCH,
+    INTERACTIVE,
+    ScheduledSpotify,
+    SpotifyOverloaded,
+    SpotifyScheduler,
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.slept = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+def _scheduler(clock, **kwargs):
+    return SpotifyScheduler(clock=clock, sleep=clock.sleep, **kwargs)
+
+
+def _rate_limited(retry_after):
+    return spotipy.SpotifyException(429, -1, "rate limited", headers={"Retry-After": str(retry_after)})
+
+
+def test_burst_is_admitted_without_waiting(clock):
+    scheduler = _scheduler(clock, app_rate=1, app_burst=5)
+    for _ in range(5):
+        scheduler.acquire(INTERACTIVE)
+
+    assert clock.slept == []
+    assert scheduler.stats()["admitted"][INTERACTIVE] == 5
+
+
+def test_waits_for_refill(clock):
+    scheduler = _scheduler(clock, app_rate=2, app_burst=1)
+    scheduler.acquire(INTERACTIVE)
+    scheduler.acquire(INTERACTIVE)
+
+    assert clock.slept == [pytest.approx(0.5)]
+
+
+def test_workers_split_the_app_limits(clock):
+    scheduler = _scheduler(clock, app_rate=4, app_burst=2, workers=2)
+    scheduler.acquire(INTERACTIVE)
+    scheduler.acquire(INTERACTIVE)
+
+    # one token of burst and two per second in this worker
+    assert clock.slept == [pytest.approx(0.5)]
+
+
+def test_many_workers_still_admit_every_lane(clock):
+    for lane in (INTERACTIVE, BATCH):
+        scheduler = _scheduler(clock, max_wait_seconds={INTERACTIVE: 0, BATCH: 0}, workers=64)
+        scheduler.acquire(lane, "a")
+
+        assert scheduler.stats()["shed"] == {INTERACTIVE: 0, BATCH: 0}
+        # a user's requests reach one worker at a time, their bucket isn't split
+        assert scheduler.user_burst == 20
+
+
+def test_batch_lane_leaves_reserve_for_interactive(clock):
+    scheduler = _scheduler(clock, app_rate=1, app_burst=4, interactive_reserve=0.5, max_wait_seconds={INTERACTIVE: 0, BATCH: 0})
+    scheduler.acquire(BATCH)
+    scheduler.acquire(BATCH)
+    with pytest.raises(SpotifyOverloaded):
+        scheduler.acquire(BATCH)
+    # interactive can still spend the reserve
+    scheduler.acquire(INTERACTIVE)
+    scheduler.acquire(INTERACTIVE)
+
+    assert scheduler.stats()["shed"] == {INTERACTIVE: 0, BATCH: 1}
+
+
+def test_per_user_bucket(clock):
+    scheduler = _scheduler(clock, user_rate=1, user_burst=1, max_wait_seconds={INTERACTIVE: 0, BATCH: 0})
+    scheduler.acquire(INTERACTIVE, "a")
+    with pytest.raises(SpotifyOverloaded):
+        scheduler.acquire(INTERACTIVE, "a")
+    # other users have their own budget
+    scheduler.acquire(INTERACTIVE, "b")
+
+
+def test_shed_when_too_many_waiting(clock):
+    scheduler = _scheduler(clock, app_rate=1, app_burst=1, max_waiting={INTERACTIVE: 0, BATCH: 0})
+    scheduler.acquire(INTERACTIVE)
+    with pytest.raises(SpotifyOverloaded) as e:
+        scheduler.acquire(INTERACTIVE)
+
+    assert e.value.retry_after == 1
+    assert e.value.code == 503
+
+
+def test_retries_after_429(clock):
+    scheduler = _scheduler(clock)
+    fn = Mock(side_effect=[_rate_limited(3), "ok"])
+
+    assert scheduler.call(BATCH, None, fn, "arg") == "ok"
+    assert clock.slept == [pytest.approx(3)]
+    assert scheduler.stats()["rate_limited"] == 1
+
+
+def test_gives_up_after_max_retries(clock):
+    scheduler = _scheduler(clock, max_retries=1)
+    fn = Mock(side_effect=_rate_limited(2))
+
+    with pytest.raises(SpotifyOverloaded):
+        scheduler.call(BATCH, None, fn)
+    assert fn.call_count == 2
+
+
+def test_long_retry_after_is_shed(clock):
+    scheduler = _scheduler(clock)
+    fn = Mock(side_effect=[_rate_limited(60), "ok"])
+
+    with pytest.raises(SpotifyOverloaded) as e:
+        scheduler.call(INTERACTIVE, None, fn)
+    assert e.value.retry_after == 60
+    assert fn.call_count == 1
+
+
+def test_other_errors_are_not_retried(clock):
+    scheduler = _scheduler(clock)
+    fn = Mock(side_effect=spotipy.SpotifyException(404, -1, "not found"))
+
+    with pytest.raises(spotipy.SpotifyException):
+        scheduler.call(BATCH, None, fn)
+    assert fn.call_count == 1
+
+
+def test_scheduled_spotify_routes_calls(clock):
+    scheduler = _scheduler(clock)
+    sp = Mock()
+    sp.track.return_value = {"id": "t1"}
+    scheduled = ScheduledSpotify(sp, scheduler, INTERACTIVE, user_key="a")
+
+    assert scheduled.track("t1") == {"id": "t1"}
+    sp.track.assert_called_once_with("t1")
+    assert scheduler.stats()["admitted"][INTERACTIVE] == 1
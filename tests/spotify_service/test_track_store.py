@@ -0,0 +1,80 @@
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import Mock
+from spotify_service.cache import CachingSpotify, SpotifyResponseCache
+from spotify_service.track_store import TrackStore, TRACKS, AUDIO_FEATURES
+
+
+@pytest.fixture
+def store_path(tmp_path):
+    return str(tmp_path / "tracks.sqlite3")
+
+
+def test_put_and_get_many(store_path):
+    store = TrackStore(store_path)
+    store.put_many(TRACKS, {"t1": {"id": "t1", "name": "Track 1"}, "t2": {"id": "t2"}})
+
+    assert store.get_many(TRACKS, ["t1", "t3"]) == {"t1": {"id": "t1", "name": "Track 1"}}
+    assert store.get_many(AUDIO_FEATURES, ["t1"]) == {}
+
+
+def test_entries_are_shared_between_store_instances(store_path):
+    # each gunicorn worker opens its own store on the same file
+    TrackStore(store_path).put_many(AUDIO_FEATURES, {"t1": {"energy": 0.5}})
+    assert TrackStore(store_path).get_many(AUDIO_FEATURES, ["t1"]) == {"t1": {"energy": 0.5}}
+
+
+def test_threads_share_one_connection(store_path):
+    store = TrackStore(store_path)
+
+    def put_and_get(i):
+        store.put_many(TRACKS, {f"t{i}": {"id": f"t{i}"}})
+        with store._connection() as conn:
+            connection = id(conn)
+        return connection, store.get_many(TRACKS, [f"t{i}"])
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(put_and_get, range(32)))
+
+    assert len({connection for connection, _ in results}) == 1
+    assert [found for _, found in results] == [{f"t{i}": {"id": f"t{i}"}} for i in range(32)]
+
+
+def test_evicts_least_recently_used(store_path):
+    store = TrackStore(store_path, max_entries=2)
+    store.put_many(TRACKS, {"t1": {}})
+    store.put_many(TRACKS, {"t2": {}})
+    store.put_many(TRACKS, {"t3": {}})
+    store.evict()
+
+    assert len(store) == 2
+    assert store.get_many(TRACKS, ["t1", "t2", "t3"]).keys() == {"t2", "t3"}
+
+
+def test_caching_spotify_reads_store_before_network(store_path):
+    store = TrackStore(store_path)
+    store.put_many(TRACKS, {"t1": {"id": "t1"}})
+    store.put_many(AUDIO_FEATURES, {"t1": {"id": "t1", "energy": 0.1}})
+    mock_sp = Mock()
+    mock_sp.audio_features.side_effect = lambda ids: [{"id": track_id, "energy": 0.9} for track_id in ids]
+
+    sp = CachingSpotify(mock_sp, SpotifyResponseCache(), store=store)
+    assert sp.track("t1") == {"id": "t1"}
+    features = sp.audio_features(["t1", "t2"])
+
+    mock_sp.track.assert_not_called()
+    mock_sp.audio_features.assert_called_once_with(["t2"])
+    assert [f["energy"] for f in features] == [0.1, 0.9]
+
+
+def test_caching_spotify_writes_through_to_store(store_path):
+    store = TrackStore(store_path)
+    mock_sp = Mock()
+    mock_sp.track.return_value = {"id": "t1"}
+
+    CachingSpotify(mock_sp, SpotifyResponseCache(), store=store).track("t1")
+
+    # a fresh worker cache still avoids the network
+    CachingSpotify(mock_sp, SpotifyResponseCache(), store=store).track("t1")
+    mock_sp.track.assert_called_once()
+    assert store.get_many(TRACKS, ["t1"]) == {"t1": {"id": "t1"}}
@@ -0,0 +1,189 @@
+import threading
+import time
+from unittest.mock import patch
+
+import pytest
+from werkzeug.exceptions import BadRequest, ServiceUnavailable
+from utils.jobs import FAILED, RUNNING, STORE_SWEEP_SECONDS, JobQueue, JobStore, SUCCEEDED
+
+
+def _wait_until_finished(queue, job):
+    events = []
+    finished = False
+    while not finished:
+        new_events, finished = queue.wait_for_events(job, len(events), timeout=5)
+        events.extend(new_events)
+    return events
+
+
+def test_job_reports_progress_and_result():
+    queue = JobQueue()
+
+    def build(progress):
+        progress("source_chosen", track="a")
+        progress("slot_filled", slot=1)
+        return {"url": "https://playlist"}
+
+    job = queue.submit(build, owner="user")
+    events = _wait_until_finished(queue, job)
+
+    assert [event["stage"] for event in events] == ["queued", "running", "source_chosen", "slot_filled", "succeeded"]
+    assert events[2] == {"stage": "source_chosen", "track": "a"}
+    assert events[-1]["result"] == {"url": "https://playlist"}
+    assert job.status == SUCCEEDED
+    assert queue.get(job.id).to_dict()["result"] == {"url": "https://playlist"}
+
+
+def test_failed_job_hides_internal_errors():
+    queue = JobQueue()
+
+    def build(progress):
+        raise KeyError("secret")
+
+    job = queue.submit(build)
+    events = _wait_until_finished(queue, job)
+
+    assert job.status == FAILED
+    assert events[-1] == {"stage": "failed", "error": "internal error"}
+
+
+def test_failed_job_passes_on_http_errors():
+    queue = JobQueue()
+
+    def build(progress):
+        raise BadRequest("bad mood")
+
+    job = queue.submit(build)
+    _wait_until_finished(queue, job)
+
+    assert job.error == "bad mood"
+
+
+def test_rejects_jobs_past_max_pending():
+    queue = JobQueue(max_workers=1, max_pending=1)
+    release = threading.Event()
+    running = threading.Event()
+
+    def blocked(progress):
+        running.set()
+        release.wait(5)
+
+    queue.submit(blocked)
+    assert running.wait(5)
+    # waits for the busy worker
+    queue.submit(blocked)
+    with pytest.raises(ServiceUnavailable):
+        queue.submit(blocked)
+    release.set()
+
+
+def test_finished_jobs_expire():
+    now = [0.0]
+    queue = JobQueue(ttl_seconds=10, clock=lambda: now[0])
+    job = queue.submit(lambda progress: None)
+    _wait_until_finished(queue, job)
+
+    now[0] = 20
+    queue.submit(lambda progress: None)
+
+    assert queue.get(job.id) is None
+
+
+def test_finished_jobs_expire_on_reads():
+    now = [0.0]
+    queue = JobQueue(ttl_seconds=10, clock=lambda: now[0])
+    job = queue.submit(lambda progress: None)
+    _wait_until_finished(queue, job)
+
+    now[0] = 20
+
+    assert queue.get(job.id) is None
+    assert queue._jobs == {}
+
+
+def test_other_workers_read_jobs_from_the_store(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    running = JobQueue(store=JobStore(path))
+    # a second gunicorn worker on the same host
+    polling = JobQueue(store=JobStore(path))
+    release = threading.Event()
+
+    def build(progress):
+        progress("source_chosen", track="a")
+        release.wait(5)
+        return {"url": "https://playlist"}
+
+    job = running.submit(build, owner="user")
+    snapshot = polling.get(job.id)
+    assert snapshot.owner == "user"
+
+    release.set()
+    events = _wait_until_finished(polling, snapshot)
+
+    assert [event["stage"] for event in events] == ["queued", "running", "source_chosen", "succeeded"]
+    assert polling.get(job.id).to_dict()["result"] == {"url": "https://playlist"}
+
+
+def test_store_expires_finished_jobs(tmp_path):
+    now = [0.0]
+    store = JobStore(str(tmp_path / "jobs.sqlite3"), clock=lambda: now[0])
+    queue = JobQueue(ttl_seconds=10, store=store)
+    job = queue.submit(lambda progress: None)
+    _wait_until_finished(queue, job)
+
+    now[0] = 20
+    store.expire(10)
+
+    assert store.load(job.id) is None
+
+
+def test_store_sweeps_are_throttled(tmp_path):
+    now = [0.0]
+    store = JobStore(str(tmp_path / "jobs.sqlite3"))
+    queue = JobQueue(clock=lambda: now[0], store=store)
+    with patch.object(store, "expire", wraps=store.expire) as expire:
+        for _ in range(3):
+            queue.get("missing")
+        assert expire.call_count == 1
+
+        now[0] = STORE_SWEEP_SECONDS
+        queue.get("missing")
+        assert expire.call_count == 2
+
+
+def test_jobs_of_a_dead_worker_fail(tmp_path):
+    now = [0.0]
+    store = JobStore(str(tmp_path / "jobs.sqlite3"), clock=lambda: now[0], stale_seconds=30)
+    release = threading.Event()
+    # the worker dies without recording anything after running, and never touches the job
+    queue = JobQueue(store=store, heartbeat_seconds=3600)
+    job = queue.submit(lambda progress: release.wait(5))
+    try:
+        deadline = time.monotonic() + 5
+        while store.load(job.id).status != RUNNING and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        now[0] = 31
+        assert store.load(job.id).status == FAILED
+        store.expire(ttl_seconds=10)
+        now[0] = 40
+        failed = store.load(job.id)
+        assert failed.status == FAILED
+        assert failed.events[-1]["stage"] == FAILED
+    finally:
+        release.set()
+        queue.shutdown()
+
+
+def test_heartbeat_keeps_running_jobs_alive(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.sqlite3"), stale_seconds=0.2)
+    release = threading.Event()
+    queue = JobQueue(store=store, heartbeat_seconds=0.02)
+    job = queue.submit(lambda progress: release.wait(5))
+    try:
+        time.sleep(0.5)
+        store.expire(ttl_seconds=60)
+        assert store.load(job.id).status == RUNNING
+    finally:
+        release.set()
+        queue.shutdown()
@@ -0,0 +1,16 @@
+from utils.request_log import RequestLog, read_request_log
+
+
+def test_records_replayable_requests(tmp_path):
+    path = tmp_path / "requests.log"
+    log = RequestLog(str(path))
+
+    log.record("POST", "/autocomplete", {}, {"query": "daft"})
+    log.record("GET", "/tracks", {"mood": "calm"}, None)
+    log.record("GET", "/", {"code": "secret"}, None)
+
+    entries = list(read_request_log(str(path)))
+    assert [(entry["method"], entry["path"]) for entry in entries] == [("POST", "/autocomplete"), ("GET", "/tracks")]
+    assert entries[0]["json"] == {"query": "daft"}
+    assert entries[1]["args"] == {"mood": "calm"}
+    assert entries[0]["ts"] <= entries[1]["ts"]
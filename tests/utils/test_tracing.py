@@ -0,0 +1,129 @@
+import contextvars
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from utils.tracing import Tracer, configure_trace_logging
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+def test_disabled_tracer_records_nothing(clock):
+    tracer = Tracer(enabled=False, clock=clock)
+
+    @tracer.traced("fn")
+    def fn():
+        return 1
+
+    with tracer.span("outer"), tracer.spotify_call("track"):
+        assert fn() == 1
+
+    assert tracer.metrics() == {"spans": {}, "spotify_calls": {}}
+
+
+def test_root_span_logs_nested_spans_and_calls(clock, caplog):
+    tracer = Tracer(enabled=True, clock=clock)
+    with caplog.at_level(logging.INFO, logger="utils.tracing"):
+        with tracer.span("create_playlist", mode="song"):
+            clock.now += 0.1
+            with tracer.span("recommend"):
+                with tracer.spotify_call("recommendations"):
+                    clock.now += 0.2
+                with tracer.spotify_call("recommendations"):
+                    clock.now += 0.2
+
+    logged = json.loads(caplog.records[-1].getMessage())
+    assert logged["trace"] == "create_playlist"
+    assert logged["duration_ms"] == pytest.approx(500)
+    assert logged["spotify_calls"] == {"recommendations": 2}
+    assert [(span["name"], span["depth"]) for span in logged["spans"]] == [("create_playlist", 0), ("recommend", 1)]
+    assert logged["spans"][0]["mode"] == "song"
+    assert logged["spans"][1]["start_ms"] == pytest.approx(100)
+
+    metrics = tracer.metrics()
+    assert metrics["spans"]["recommend"] == {"count": 1, "mean_ms": pytest.approx(400)}
+    assert metrics["spotify_calls"]["recommendations"] == {"count": 2, "mean_ms": pytest.approx(200), "errors": 0}
+
+
+def test_spans_follow_copied_context_into_threads(clock, caplog):
+    tracer = Tracer(enabled=True, clock=clock)
+
+    @tracer.traced("slot")
+    def slot():
+        with tracer.spotify_call("recommendations"):
+            pass
+
+    with caplog.at_level(logging.INFO, logger="utils.tracing"):
+        with tracer.span("recommend"):
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                futures = [executor.submit(contextvars.copy_context().run, slot) for _ in range(2)]
+                [future.result() for future in futures]
+
+    logged = json.loads(caplog.records[-1].getMessage())
+    assert len(caplog.records) == 1
+    assert logged["spotify_calls"] == {"recommendations": 2}
+    assert [span["name"] for span in logged["spans"]].count("slot") == 2
+
+
+def test_errors_are_counted(clock):
+    tracer = Tracer(enabled=True, clock=clock)
+    with pytest.raises(ValueError):
+        with tracer.spotify_call("track"):
+            raise ValueError()
+
+    assert tracer.metrics()["spotify_calls"]["track"]["errors"] == 1
+
+
+def test_prometheus_histogram(clock):
+    tracer = Tracer(enabled=True, clock=clock)
+    with tracer.spotify_call("search"):
+        clock.now += 0.03
+
+    text = tracer.prometheus()
+    assert 'waveguide_spotify_call_seconds_bucket{endpoint="search",le="0.025"} 0' in text
+    assert 'waveguide_spotify_call_seconds_bucket{endpoint="search",le="0.05"} 1' in text
+    assert 'waveguide_spotify_call_seconds_bucket{endpoint="search",le="+Inf"} 1' in text
+    assert 'waveguide_spotify_call_seconds_count{endpoint="search"} 1' in text
+
+
+def test_nested_only_spans_do_not_start_a_trace(clock, caplog):
+    tracer = Tracer(enabled=True, clock=clock)
+
+    @tracer.traced("search_tracks", root=False)
+    def search():
+        clock.now += 0.05
+
+    with caplog.at_level(logging.INFO, logger="utils.tracing"):
+        search()
+        assert caplog.records == []
+        with tracer.span("create_playlist"):
+            search()
+
+    logged = json.loads(caplog.records[-1].getMessage())
+    assert [span["name"] for span in logged["spans"]] == ["create_playlist", "search_tracks"]
+    assert tracer.metrics()["spans"]["search_tracks"]["count"] == 2
+
+
+def test_configure_trace_logging(monkeypatch):
+    trace_logger = logging.getLogger("utils.tracing")
+    monkeypatch.setattr(trace_logger, "handlers", [])
+    monkeypatch.setattr(trace_logger, "propagate", True)
+    monkeypatch.setattr(trace_logger, "level", logging.NOTSET)
+
+    configure_trace_logging()
+    configure_trace_logging()
+
+    assert len(trace_logger.handlers) == 1
+    assert trace_logger.isEnabledFor(logging.INFO)
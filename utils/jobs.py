@@ -0,0 +1,295 @@
+import contextlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Hashable, Iterator, List, Optional, Tuple
+
+from werkzeug.exceptions import HTTPException, ServiceUnavailable
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+FINISHED = {SUCCEEDED, FAILED}
+
+DEFAULT_MAX_WORKERS = 4
+# jobs allowed to wait for a worker before new ones are rejected
+DEFAULT_MAX_PENDING = 32
+# finished jobs are kept around this long for clients polling the result
+DEFAULT_TTL_SECONDS = 60 * 60
+# how often a worker that doesn't run a job checks the store for its new events
+STORE_POLL_SECONDS = 0.5
+# finished jobs are deleted from the store at most this often, not on every poll
+STORE_SWEEP_SECONDS = 60
+# the worker running a job touches it this often, an unfinished job not touched for
+# DEFAULT_STALE_SECONDS belonged to a worker that died and is reported as failed
+HEARTBEAT_SECONDS = 10
+DEFAULT_STALE_SECONDS = 60
+STALE_ERROR = "the server restarted while building this playlist, please try again"
+
+# called by a running job to report a stage, e.g. progress("slot_filled", slot=2)
+Progress = Callable[..., None]
+
+
+@dataclass
+class Job:
+    id: str
+    owner: Optional[Hashable]
+    created_at: float
+    status: str = QUEUED
+    events: List[Dict[str, Any]] = field(default_factory=list)
+    result: Any = None
+    error: Optional[str] = None
+    finished_at: Optional[float] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "status": self.status,
+            "events": self.events,
+            "result": self.result,
+            "error": self.error,
+        }
+
+
+class JobStore:
+    """Job state in sqlite, shared by every gunicorn worker on the host.
+
+    The worker running a job writes it through on every event, so a poll or events stream
+    that lands on another worker reads it from here. One connection per process, like TrackStore.
+    The running worker also touches its unfinished jobs, one that goes untouched for stale_seconds
+    was lost with its worker and reads as failed.
+    """
+
+    def __init__(self, path: str, clock: Callable[[], float] = time.time, stale_seconds: float = DEFAULT_STALE_SECONDS):
+        self.path = path
+        self.clock = clock
+        self.stale_seconds = stale_seconds
+        self._conn = None
+        self._pid = None
+        self._lock = threading.Lock()
+        with self._connection() as conn, conn:
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    body TEXT NOT NULL,
+                    finished INTEGER NOT NULL,
+                    updated_at REAL NOT NULL
+                )"""
+            )
+
+    @contextlib.contextmanager
+    def _connection(self) -> Iterator[sqlite3.Connection]:
+        if self._pid != os.getpid():
+            self._conn = None
+            self._lock = threading.Lock()
+            self._pid = os.getpid()
+        with self._lock:
+            if self._conn is None:
+                self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+                self._conn.execute("PRAGMA journal_mode=WAL")
+                self._conn.execute("PRAGMA synchronous=NORMAL")
+            yield self._conn
+
+    def save(self, job: Job):
+        body = json.dumps({**job.to_dict(), "owner": job.owner})
+        with self._connection() as conn, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO jobs (id, body, finished, updated_at) VALUES (?, ?, ?, ?)",
+                (job.id, body, job.status in FINISHED, self.clock()),
+            )
+
+    def touch(self, job_ids: List[str]):
+        """marks unfinished jobs as still alive"""
+        with self._connection() as conn, conn:
+            conn.executemany(
+                "UPDATE jobs SET updated_at = ? WHERE id = ? AND NOT finished", [(self.clock(), job_id) for job_id in job_ids]
+            )
+
+    @staticmethod
+    def _failed_body(body: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            **body,
+            "status": FAILED,
+            "error": STALE_ERROR,
+            "events": body["events"] + [{"stage": FAILED, "error": STALE_ERROR}],
+        }
+
+    def load(self, job_id: str) -> Optional[Job]:
+        """a snapshot of the job, later events are only seen by loading it again"""
+        with self._connection() as conn:
+            row = conn.execute("SELECT body, finished, updated_at FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        body = json.loads(row[0])
+        if not row[1] and row[2] <= self.clock() - self.stale_seconds:
+            body = self._failed_body(body)
+        return Job(
+            id=body["id"],
+            owner=body["owner"],
+            created_at=0.0,
+            status=body["status"],
+            events=body["events"],
+            result=body["result"],
+            error=body["error"],
+        )
+
+    def expire(self, ttl_seconds: float):
+        """fails stale unfinished jobs, they're kept ttl_seconds from now like any finished job,
+        and deletes the finished jobs older than ttl_seconds"""
+        now = self.clock()
+        with self._connection() as conn, conn:
+            stale = conn.execute(
+                "SELECT id, body FROM jobs WHERE NOT finished AND updated_at <= ?", (now - self.stale_seconds,)
+            ).fetchall()
+            conn.executemany(
+                "UPDATE jobs SET body = ?, finished = 1, updated_at = ? WHERE id = ?",
+                [(json.dumps(self._failed_body(json.loads(body))), now, job_id) for job_id, body in stale],
+            )
+            conn.execute("DELETE FROM jobs WHERE finished AND updated_at <= ?", (now - ttl_seconds,))
+
+
+class JobQueue:
+    """Runs jobs on a bounded worker pool and records the progress events they report.
+
+    A job is fn(progress). Every call to progress appends an event, and the queue adds
+    queued, running, succeeded and failed events around them.
+    Clients poll get() or block in wait_for_events() for a stream of events.
+    Jobs run on the worker that submitted them. With a store, any worker can read them, and
+    a heartbeat thread started with the first job keeps the store from failing them as stale.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = DEFAULT_MAX_WORKERS,
+        max_pending: int = DEFAULT_MAX_PENDING,
+        ttl_seconds: float = DEFAULT_TTL_SECONDS,
+        clock: Callable[[], float] = time.monotonic,
+        store: Optional[JobStore] = None,
+        heartbeat_seconds: float = HEARTBEAT_SECONDS,
+    ):
+        self.max_pending = max_pending
+        self.ttl_seconds = ttl_seconds
+        self.clock = clock
+        self.store = store
+        self.heartbeat_seconds = heartbeat_seconds
+        self._jobs: Dict[str, Job] = {}
+        self._pending = 0
+        self._swept_at: Optional[float] = None
+        self._heartbeat: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+        self._changed = threading.Condition()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+
+    def submit(self, fn: Callable[[Progress], Any], owner: Optional[Hashable] = None) -> Job:
+        """raises ServiceUnavailable when max_pending jobs are already waiting for a worker"""
+        with self._changed:
+            self._expire()
+            if self._pending >= self.max_pending:
+                raise ServiceUnavailable("Too many playlists are being built, please try again shortly", retry_after=5)
+            job = Job(id=uuid.uuid4().hex, owner=owner, created_at=self.clock())
+            self._jobs[job.id] = job
+            self._pending += 1
+            self._record(job, QUEUED)
+            if self.store is not None and self._heartbeat is None:
+                self._heartbeat = threading.Thread(target=self._touch_unfinished, name="job-heartbeat", daemon=True)
+                self._heartbeat.start()
+        self._executor.submit(self._run, job, fn)
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        """the job, or a snapshot from the store when another worker runs it"""
+        with self._changed:
+            self._expire()
+            job = self._jobs.get(job_id)
+        if job is None and self.store is not None:
+            job = self.store.load(job_id)
+        return job
+
+    def wait_for_events(self, job: Job, since: int, timeout: float) -> Tuple[List[Dict[str, Any]], bool]:
+        """events after the first since, blocking up to timeout for new ones.
+        The flag is set once the job has finished and every event has been returned."""
+        with self._changed:
+            local = self._jobs.get(job.id) is job
+            if local:
+                self._changed.wait_for(lambda: len(job.events) > since or job.status in FINISHED, timeout)
+                events = job.events[since:]
+                return events, job.status in FINISHED
+        # another worker runs it, poll the store
+        deadline = time.monotonic() + timeout
+        while len(job.events) <= since and job.status not in FINISHED:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or self.store is None:
+                break
+            time.sleep(min(STORE_POLL_SECONDS, remaining))
+            job = self.store.load(job.id) or job
+        return job.events[since:], job.status in FINISHED
+
+    def shutdown(self):
+        self._stopped.set()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _touch_unfinished(self):
+        while not self._stopped.wait(self.heartbeat_seconds):
+            with self._changed:
+                unfinished = [job_id for job_id, job in self._jobs.items() if job.status not in FINISHED]
+            if unfinished:
+                try:
+                    self.store.touch(unfinished)
+                except sqlite3.Error:
+                    logger.exception("job heartbeat failed")
+
+    def _record(self, job: Job, stage: str, **details):
+        # callers hold self._changed
+        job.events.append({"stage": stage, **details})
+        if self.store is not None:
+            self.store.save(job)
+        self._changed.notify_all()
+
+    def _run(self, job: Job, fn: Callable[[Progress], Any]):
+        def progress(stage: str, **details):
+            with self._changed:
+                self._record(job, stage, **details)
+
+        with self._changed:
+            self._pending -= 1
+            job.status = RUNNING
+            self._record(job, RUNNING)
+        try:
+            result = fn(progress)
+        except Exception as e:
+            logger.exception(f"job {job.id} failed")
+            with self._changed:
+                job.status = FAILED
+                # only user facing messages are passed on to the client
+                job.error = e.description if isinstance(e, HTTPException) else "internal error"
+                job.finished_at = self.clock()
+                self._record(job, FAILED, error=job.error)
+            return
+        with self._changed:
+            job.status = SUCCEEDED
+            job.result = result
+            job.finished_at = self.clock()
+            self._record(job, SUCCEEDED, result=result)
+
+    def _expire(self):
+        # callers hold self._changed
+        now = self.clock()
+        expired = [
+            job_id
+            for job_id, job in self._jobs.items()
+            if job.finished_at is not None and now - job.finished_at >= self.ttl_seconds
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+        if self.store is not None and (self._swept_at is None or now - self._swept_at >= STORE_SWEEP_SECONDS):
+            self._swept_at = now
+            self.store.expire(self.ttl_seconds)
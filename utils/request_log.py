@@ -0,0 +1,33 @@
+import json
+import threading
+import time
+from typing import Any, Dict, Iterator, Optional
+
+# endpoints worth replaying, the rest are page loads and auth redirects
+REPLAYABLE_PATHS = ("/autocomplete", "/new_playlist/", "/tracks")
+
+
+class RequestLog:
+    """Appends one json line per replayable request so benchmarks.replay can reproduce the traffic mix.
+
+    Each line is {"ts", "method", "path", "args", "json"}. ts is seconds since the epoch.
+    Only the request is recorded, no user or session data.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def record(self, method: str, path: str, args: Dict[str, Any], body: Optional[Any]):
+        if path not in REPLAYABLE_PATHS:
+            return
+        line = json.dumps({"ts": time.time(), "method": method, "path": path, "args": args, "json": body})
+        with self._lock, open(self.path, "a") as f:
+            f.write(line + "\n")
+
+
+def read_request_log(path: str) -> Iterator[Dict[str, Any]]:
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
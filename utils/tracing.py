@@ -0,0 +1,229 @@
+import bisect
+import contextlib
+import contextvars
+import functools
+import json
+import logging
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# histogram bucket upper bounds in seconds, same for spans and spotify calls
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram in the prometheus style. Not thread safe, Tracer holds the lock."""
+
+    def __init__(self, buckets: Tuple[float, ...] = BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds: float):
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        total = 0
+        result = []
+        for bound, count in zip(list(self.buckets) + ["+Inf"], self.counts):
+            total += count
+            result.append((str(bound), total))
+        return result
+
+
+@dataclass
+class _Trace:
+    """spans recorded under one root span, logged as one structured line when the root ends"""
+
+    name: str
+    started_at: float
+    spans: List[Dict[str, Any]] = field(default_factory=list)
+    spotify_calls: Dict[str, int] = field(default_factory=dict)
+
+
+_current_trace: contextvars.ContextVar[Optional[_Trace]] = contextvars.ContextVar("trace", default=None)
+_current_depth: contextvars.ContextVar[int] = contextvars.ContextVar("trace_depth", default=0)
+
+
+class Tracer:
+    """Timing spans and spotify call metrics for the request hot path.
+
+    span() times a block and feeds a per span name histogram. The outermost span of a request
+    also collects every nested span and spotify call, and logs them as one json line.
+    Spans follow contextvars, so work handed to threads with copy_context lands in the same trace.
+    When disabled, span() and spotify_call() return a shared no-op context manager.
+    """
+
+    def __init__(self, enabled: bool = False, clock: Callable[[], float] = time.perf_counter):
+        self.enabled = enabled
+        self.clock = clock
+        self._span_latency: Dict[str, Histogram] = {}
+        self._call_latency: Dict[str, Histogram] = {}
+        self._call_errors: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def span(self, name: str, root: bool = True, **attributes):
+        """root=False spans only join a trace that is already open, on their own they just feed the histogram"""
+        if not self.enabled:
+            return _NOOP
+        return self._span(name, attributes, root)
+
+    @contextlib.contextmanager
+    def _span(self, name: str, attributes: Dict[str, Any], can_root: bool = True) -> Iterator[None]:
+        trace = _current_trace.get()
+        if trace is None and not can_root:
+            start = self.clock()
+            try:
+                yield
+            finally:
+                with self._lock:
+                    self._span_latency.setdefault(name, Histogram()).observe(self.clock() - start)
+            return
+        root = trace is None
+        if root:
+            trace = _Trace(name, self.clock())
+            trace_token = _current_trace.set(trace)
+        depth = _current_depth.get()
+        depth_token = _current_depth.set(depth + 1)
+        start = self.clock()
+        error = None
+        try:
+            yield
+        except BaseException as e:
+            error = type(e).__name__
+            raise
+        finally:
+            seconds = self.clock() - start
+            _current_depth.reset(depth_token)
+            span = {
+                "name": name,
+                "depth": depth,
+                "start_ms": round((start - trace.started_at) * 1000, 3),
+                "duration_ms": round(seconds * 1000, 3),
+                **attributes,
+            }
+            if error is not None:
+                span["error"] = error
+            trace.spans.append(span)
+            with self._lock:
+                self._span_latency.setdefault(name, Histogram()).observe(seconds)
+            if root:
+                _current_trace.reset(trace_token)
+                self._log_trace(trace, seconds, error)
+
+    def _log_trace(self, trace: _Trace, seconds: float, error: Optional[str]):
+        # nested spans finish first, list them in start order
+        spans = sorted(trace.spans, key=lambda span: (span["start_ms"], span["depth"]))
+        logger.info(
+            json.dumps(
+                {
+                    "trace": trace.name,
+                    "duration_ms": round(seconds * 1000, 3),
+                    "error": error,
+                    "spotify_calls": trace.spotify_calls,
+                    "spans": spans,
+                }
+            )
+        )
+
+    def spotify_call(self, endpoint: str):
+        if not self.enabled:
+            return _NOOP
+        return self._spotify_call(endpoint)
+
+    @contextlib.contextmanager
+    def _spotify_call(self, endpoint: str) -> Iterator[None]:
+        start = self.clock()
+        failed = False
+        try:
+            yield
+        except BaseException:
+            failed = True
+            raise
+        finally:
+            seconds = self.clock() - start
+            trace = _current_trace.get()
+            with self._lock:
+                self._call_latency.setdefault(endpoint, Histogram()).observe(seconds)
+                if failed:
+                    self._call_errors[endpoint] = self._call_errors.get(endpoint, 0) + 1
+                if trace is not None:
+                    trace.spotify_calls[endpoint] = trace.spotify_calls.get(endpoint, 0) + 1
+
+    def traced(self, name: str, root: bool = True) -> Callable:
+        """decorator form of span(), only checks enabled when tracing is off"""
+
+        def decorator(fn: Callable) -> Callable:
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return fn(*args, **kwargs)
+                with self._span(name, {}, root):
+                    return fn(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    def reset(self):
+        with self._lock:
+            self._span_latency.clear()
+            self._call_latency.clear()
+            self._call_errors.clear()
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "spans": {name: _summary(h) for name, h in self._span_latency.items()},
+                "spotify_calls": {
+                    endpoint: {**_summary(h), "errors": self._call_errors.get(endpoint, 0)}
+                    for endpoint, h in self._call_latency.items()
+                },
+            }
+
+    def prometheus(self) -> str:
+        """metrics in the prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            for metric, label, histograms in [
+                ("waveguide_span_seconds", "span", self._span_latency),
+                ("waveguide_spotify_call_seconds", "endpoint", self._call_latency),
+            ]:
+                lines.append(f"# TYPE {metric} histogram")
+                for name, h in sorted(histograms.items()):
+                    for bound, count in h.cumulative():
+                        lines.append(f'{metric}_bucket{{{label}="{name}",le="{bound}"}} {count}')
+                    lines.append(f'{metric}_sum{{{label}="{name}"}} {h.sum}')
+                    lines.append(f'{metric}_count{{{label}="{name}"}} {h.count}')
+            lines.append("# TYPE waveguide_spotify_call_errors_total counter")
+            for endpoint, errors in sorted(self._call_errors.items()):
+                lines.append(f'waveguide_spotify_call_errors_total{{endpoint="{endpoint}"}} {errors}')
+        return "\n".join(lines) + "\n"
+
+
+def _summary(h: Histogram) -> Dict[str, float]:
+    return {"count": h.count, "mean_ms": round(h.sum / h.count * 1000, 3) if h.count else 0.0}
+
+
+_NOOP = contextlib.nullcontext()
+
+
+def configure_trace_logging(level: int = logging.INFO):
+    """Sends the per trace json lines to stderr. Without it the logger falls back to python's
+    last resort handler, which drops anything under WARNING."""
+    if not logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+        logger.propagate = False
+    logger.setLevel(level)
+
+# shared by the whole worker, enabled in create_app
+tracer = Tracer()